@@ -0,0 +1,149 @@
+import copy
+import os
+import threading
+
+from collections import OrderedDict
+from functools import wraps
+
+MAX_CACHED_QUERIES = 256
+
+# Files in the .kart folder whose changes can alter the result of a query.
+# Refs are covered by the modification times of the folders that contain them,
+# since Kart updates refs by renaming a lock file into place.
+STATE_FILES = ["HEAD", "index", "packed-refs", "config", "MERGE_HEAD"]
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, maxSize=MAX_CACHED_QUERIES):
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last=False)
+
+    def remove(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self)}
+
+
+def repoState(path):
+    kartFolder = os.path.join(path, ".kart")
+    state = []
+    for name in STATE_FILES:
+        try:
+            stat = os.stat(os.path.join(kartFolder, name))
+            state.append((name, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            state.append((name, None, None))
+    for root, dirs, files in os.walk(os.path.join(kartFolder, "refs")):
+        try:
+            state.append((root, os.stat(root).st_mtime_ns, len(files)))
+        except OSError:
+            pass
+    return tuple(state)
+
+
+class QueryCache:
+    def __init__(self, path, maxSize=MAX_CACHED_QUERIES):
+        self.path = path
+        self.entries = LRUCache(maxSize)
+        self._state = None
+        self._lock = threading.RLock()
+
+    def _checkState(self):
+        state = repoState(self.path)
+        with self._lock:
+            if state != self._state:
+                self.entries.clear()
+                self._state = state
+
+    def get(self, key, default=None):
+        self._checkState()
+        return self.entries.get(key, default)
+
+    def set(self, key, value):
+        if self._state is None:
+            self._checkState()
+        self.entries.set(key, value)
+
+    def invalidate(self):
+        with self._lock:
+            self.entries.clear()
+            self._state = None
+
+    def stats(self):
+        return self.entries.stats()
+
+
+_caches = {}
+_cachesLock = threading.Lock()
+
+
+def queryCache(path):
+    key = os.path.normcase(os.path.abspath(path))
+    with _cachesLock:
+        if key not in _caches:
+            _caches[key] = QueryCache(path)
+        return _caches[key]
+
+
+def cachedQuery(method):
+    # For methods of objects with a 'path' attribute pointing to a Kart repo.
+    # A copy of the cached value is returned, so callers can modify it freely.
+    @wraps(method)
+    def inner(self, *args, **kwargs):
+        cache = queryCache(self.path)
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = method(self, *args, **kwargs)
+            cache.set(key, value)
+        return copy.deepcopy(value)
+
+    return inner
+
+
+def invalidatesQueryCache(method):
+    @wraps(method)
+    def inner(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            queryCache(self.path).invalidate()
+
+    return inner
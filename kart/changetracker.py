@@ -0,0 +1,133 @@
+import copy
+import os
+import threading
+
+# Tracking of the changes in the working copy of a repo, so they don't have to
+# be computed by running 'kart status' each time. The status is read once, and
+# the features edited in QGIS afterwards are added to it as the edits are
+# saved. The status is read again when the state of the repo or the working
+# copy changes in any other way.
+#
+# Edited features are identified by their primary key. The status only has the
+# number of changed features, so edits to a dataset that already had changes
+# can't be merged with it without counting some features twice. In that case
+# the tracker is invalidated and the status read again.
+
+INSERTS, UPDATES, DELETES = "inserts", "updates", "deletes"
+
+
+class ChangeTracker:
+    def __init__(self):
+        # Changes for each dataset, as returned by 'kart status'
+        self.baseline = None
+        self.stamp = None
+        # Ids of the features edited in QGIS since the baseline was read
+        self.edited = {}
+        self._lock = threading.RLock()
+
+    def isValid(self, stamp):
+        with self._lock:
+            return self.baseline is not None and stamp == self.stamp
+
+    def reset(self, baseline, stamp):
+        with self._lock:
+            self.baseline = copy.deepcopy(baseline)
+            self.stamp = stamp
+            self.edited = {}
+
+    def restamp(self, stamp):
+        # For changes to the working copy that have been tracked already
+        with self._lock:
+            if self.baseline is not None:
+                self.stamp = stamp
+
+    def invalidate(self):
+        with self._lock:
+            self.baseline = None
+            self.stamp = None
+            self.edited = {}
+
+    def _edited(self, dataset):
+        # Returns None if the edits can't be tracked
+        if self.baseline is None or self.baseline.get(dataset):
+            self.invalidate()
+            return None
+        return self.edited.setdefault(
+            dataset, {INSERTS: set(), UPDATES: set(), DELETES: set()}
+        )
+
+    def featuresAdded(self, dataset, keys):
+        with self._lock:
+            edited = self._edited(dataset)
+            if edited is None:
+                return
+            for key in keys:
+                if key in edited[DELETES]:
+                    # Deleted and added again
+                    edited[DELETES].discard(key)
+                    edited[UPDATES].add(key)
+                else:
+                    edited[INSERTS].add(key)
+
+    def featuresChanged(self, dataset, keys):
+        with self._lock:
+            edited = self._edited(dataset)
+            if edited is None:
+                return
+            edited[UPDATES].update(key for key in keys if key not in edited[INSERTS])
+
+    def featuresRemoved(self, dataset, keys):
+        with self._lock:
+            edited = self._edited(dataset)
+            if edited is None:
+                return
+            for key in keys:
+                if key in edited[INSERTS]:
+                    edited[INSERTS].discard(key)
+                else:
+                    edited[UPDATES].discard(key)
+                    edited[DELETES].add(key)
+
+    def changes(self):
+        # Features edited since the baseline was read are added to its counts
+        with self._lock:
+            if self.baseline is None:
+                return None
+            changes = copy.deepcopy(self.baseline)
+            for dataset, edited in self.edited.items():
+                counts = {name: len(keys) for name, keys in edited.items() if keys}
+                if counts:
+                    changes[dataset] = {"feature": counts}
+            return changes
+
+    def datasetChanges(self, dataset):
+        changes = self.changes()
+        return None if changes is None else changes.get(dataset)
+
+    def isClean(self):
+        changes = self.changes()
+        return None if changes is None else not changes
+
+
+def fileStamp(path):
+    # SQLite-based working copies might only write to the WAL file
+    stamp = []
+    for filename in [path, f"{path}-wal"]:
+        try:
+            stat = os.stat(filename)
+            stamp.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+_trackers = {}
+_trackersLock = threading.Lock()
+
+
+def changeTracker(path):
+    key = os.path.normcase(os.path.abspath(path))
+    with _trackersLock:
+        if key not in _trackers:
+            _trackers[key] = ChangeTracker()
+        return _trackers[key]
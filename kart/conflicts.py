@@ -0,0 +1,292 @@
+import json
+import os
+import tempfile
+
+from kart.cache import LRUCache
+
+# Loading and resolution of merge conflicts. Only the ids of the conflicting
+# features are loaded upfront, and the versions of each conflict are fetched
+# from Kart when needed.
+#
+# Conflicts where ours and theirs changed different fields of the feature can
+# be merged automatically, leaving only the rest to be solved by the user.
+#
+# Conflicts solved with one of the existing
+# versions (or by deleting the feature) are grouped by that version, and each
+# group is passed to Kart in as few 'kart resolve' calls as the length of a
+# command line allows. Conflicts solved with a new feature need a call each.
+
+OURS, THEIRS, ANCESTOR, DELETE = "ours", "theirs", "ancestor", "delete"
+STRATEGIES = [OURS, THEIRS, ANCESTOR, DELETE]
+
+# Kept well below the command line limit on Windows
+MAX_COMMAND_LENGTH = 8000
+
+# Conflicts whose versions are kept in memory after being fetched
+MAX_CACHED_CONFLICTS = 200
+
+VERSIONS = [ANCESTOR, OURS, THEIRS]
+
+GEOMETRY = "geometry"
+
+# Kinds of automatic merges, as counted in the summary of autoMerge
+IDENTICAL = "identical"
+ONE_SIDED = "oneSided"
+ATTRIBUTES = "attributes"
+GEOMETRY_AND_ATTRIBUTES = "geometryAndAttributes"
+UNRESOLVED = "unresolved"
+
+
+class ConflictsNotSupportedError(Exception):
+    # For conflicts other than feature conflicts, such as in metadata
+    pass
+
+
+class MultipleLabelsNotSupportedError(Exception):
+    # For Kart versions that only resolve one conflict in each call
+    pass
+
+
+def parseConflictSummary(summary):
+    # Takes the output of 'kart conflicts -s -ojson' and returns the ids of the
+    # conflicting features in each dataset
+    conflicts = {}
+    for dataset, elements in list(summary.values())[0].items():
+        for elementtype, fids in elements.items():
+            if elementtype != "feature":
+                raise ConflictsNotSupportedError(f"{dataset}:{elementtype}")
+            conflicts[dataset] = [str(fid) for fid in fids]
+    return conflicts
+
+
+def conflictVersions(features):
+    # Takes the GeoJSON features of the versions of a single conflict, with ids
+    # like 'dataset:feature:fid:version'. Missing versions are None.
+    versions = {version: None for version in VERSIONS}
+    for feature in features:
+        dataset, elementtype, fid, version = feature["id"].split(":")
+        if elementtype != "feature":
+            raise ConflictsNotSupportedError(feature["id"])
+        versions[version] = feature
+    return versions
+
+
+class ConflictStore:
+    # The ids of the conflicting features of a merge, by dataset. The versions
+    # of each conflict are fetched with 'fetch' when they are first needed,
+    # and only the most recently used ones are kept.
+
+    def __init__(self, conflicts, fetch, maxSize=MAX_CACHED_CONFLICTS):
+        self.conflicts = conflicts
+        self.fetch = fetch
+        self.cache = LRUCache(maxSize)
+
+    def __len__(self):
+        return sum(len(fids) for fids in self.conflicts.values())
+
+    def __bool__(self):
+        return any(self.conflicts.values())
+
+    def items(self):
+        return self.conflicts.items()
+
+    def exclude(self, labels):
+        # Returns a store without the given conflicts, sharing the cache
+        labels = set(labels)
+        conflicts = {}
+        for dataset, fids in self.conflicts.items():
+            fids = [fid for fid in fids if f"{dataset}:feature:{fid}" not in labels]
+            if fids:
+                conflicts[dataset] = fids
+        store = ConflictStore(conflicts, self.fetch)
+        store.cache = self.cache
+        return store
+
+    def seed(self, dataset, fid, versions):
+        # Adds versions fetched elsewhere while there is room for them, so the
+        # first conflicts are the ones kept
+        if len(self.cache) < self.cache.maxSize:
+            self.cache.set((dataset, fid), versions)
+
+    def versions(self, dataset, fid):
+        key = (dataset, fid)
+        versions = self.cache.get(key)
+        if versions is None:
+            versions = conflictVersions(self.fetch(f"{dataset}:feature:{fid}"))
+            self.cache.set(key, versions)
+        return versions
+
+
+def changedFields(old, new):
+    # Names of the properties that differ between two versions of a feature,
+    # and GEOMETRY if the geometry does
+    oldProps = old.get("properties") or {}
+    newProps = new.get("properties") or {}
+    changed = {
+        name
+        for name in set(oldProps) | set(newProps)
+        if oldProps.get(name) != newProps.get(name)
+    }
+    if old.get("geometry") != new.get("geometry"):
+        changed.add(GEOMETRY)
+    return changed
+
+
+def mergeConflict(label, versions):
+    # Three-way merge of the versions of a conflict. Returns the kind of merge
+    # and the resolution, or UNRESOLVED and None if both sides changed the same
+    # field or one of them deleted the feature.
+    ancestor, ours, theirs = (versions[v] for v in VERSIONS)
+    if ancestor is None or ours is None or theirs is None:
+        return UNRESOLVED, None
+    oursChanged = changedFields(ancestor, ours)
+    theirsChanged = changedFields(ancestor, theirs)
+    if not changedFields(ours, theirs):
+        return IDENTICAL, OURS
+    if not oursChanged:
+        return ONE_SIDED, THEIRS
+    if not theirsChanged:
+        return ONE_SIDED, OURS
+    if oursChanged & theirsChanged:
+        return UNRESOLVED, None
+    merged = {
+        "type": "Feature",
+        "id": label,
+        "geometry": ours.get("geometry"),
+        "properties": dict(ours.get("properties") or {}),
+    }
+    for name in theirsChanged:
+        if name == GEOMETRY:
+            merged["geometry"] = theirs.get("geometry")
+        else:
+            merged["properties"][name] = (theirs.get("properties") or {}).get(name)
+    if GEOMETRY in oursChanged or GEOMETRY in theirsChanged:
+        return GEOMETRY_AND_ATTRIBUTES, merged
+    return ATTRIBUTES, merged
+
+
+def autoMerge(features, store=None):
+    # Takes the GeoJSON features from 'kart conflicts', with the versions of
+    # each conflict next to each other, in a single pass. Returns the
+    # resolutions of the conflicts that could be merged, and the number of
+    # conflicts of each kind. The versions of the conflicts left to the user
+    # are added to the ConflictStore, if given, so they are not fetched again.
+    resolved = {}
+    summary = {
+        kind: 0 for kind in [IDENTICAL, ONE_SIDED, ATTRIBUTES, GEOMETRY_AND_ATTRIBUTES]
+    }
+    summary[UNRESOLVED] = 0
+    kinds = {}
+    label = None
+    group = []
+
+    def flush():
+        if label is None:
+            return
+        dataset, fid = label.rsplit(":feature:", 1)
+        if label in kinds:
+            # Not next to the rest of its versions, so it's left to the user
+            summary[kinds[label]] -= 1
+            summary[UNRESOLVED] += 1
+            kinds[label] = UNRESOLVED
+            resolved.pop(label, None)
+            if store is not None:
+                store.cache.remove((dataset, fid))
+            return
+        versions = conflictVersions(group)
+        kind, resolution = mergeConflict(label, versions)
+        kinds[label] = kind
+        summary[kind] += 1
+        if resolution is not None:
+            resolved[label] = resolution
+        elif store is not None:
+            store.seed(dataset, fid, versions)
+
+    for feature in features:
+        featureLabel = feature["id"].rsplit(":", 1)[0]
+        if featureLabel != label:
+            flush()
+            label = featureLabel
+            group = []
+        group.append(feature)
+    flush()
+    return resolved, summary
+
+
+def groupResolutions(resolved):
+    # Takes a dict with the resolution for each conflict label: the name of a
+    # version, None to delete the feature, or a GeoJSON feature. Returns the
+    # labels for each version, and (label, feature) tuples for the rest.
+    groups = {strategy: [] for strategy in STRATEGIES}
+    features = []
+    for label, resolution in resolved.items():
+        if resolution is None:
+            groups[DELETE].append(label)
+        elif isinstance(resolution, str):
+            groups[resolution].append(label)
+        else:
+            features.append((label, resolution))
+    return groups, features
+
+
+def labelBatches(labels, maxLength=MAX_COMMAND_LENGTH):
+    batch = []
+    length = 0
+    for label in labels:
+        if batch and length + len(label) + 1 > maxLength:
+            yield batch
+            batch = []
+            length = 0
+        batch.append(label)
+        length += len(label) + 1
+    if batch:
+        yield batch
+
+
+def resolveAll(resolved, resolve, feedback=None):
+    # 'resolve' runs 'kart resolve' with the given arguments. Kart versions
+    # that take a single conflict label in each call fail with several, which
+    # 'resolve' reports with MultipleLabelsNotSupportedError. Conflicts are
+    # then resolved one by one.
+    groups, features = groupResolutions(resolved)
+    total = len(resolved)
+    done = 0
+    multiple = True
+    calls = 0
+
+    def progress(count):
+        nonlocal done
+        done += count
+        if feedback is not None and total:
+            feedback(done * 100 // total)
+
+    for strategy, labels in groups.items():
+        for batch in labelBatches(labels):
+            if multiple and len(batch) > 1:
+                try:
+                    resolve(["--with", strategy] + batch)
+                    calls += 1
+                    progress(len(batch))
+                    continue
+                except MultipleLabelsNotSupportedError:
+                    # This is always the case with Kart 0.10.6, the version
+                    # currently supported, so batches are only used with
+                    # later versions
+                    multiple = False
+            for label in batch:
+                resolve(["--with", strategy, label])
+                calls += 1
+                progress(1)
+
+    if features:
+        # The same file is used for all features
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "resolution.geojson")
+            for label, feature in features:
+                fc = {"type": "FeatureCollection", "features": [feature]}
+                with open(path, "w") as f:
+                    json.dump(fc, f)
+                resolve(["--with-file", path, label])
+                calls += 1
+                progress(1)
+    return calls
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+from kart.diffstore import DiffStore
+
+# Disk cache of the diffs between two commits, which never change. Each diff
+# is kept as a DiffStore file named after a hash of the commit ids and
+# filters used to compute it. When the cache grows above its maximum size,
+# the least recently used files are removed.
+
+DEFAULT_MAX_SIZE_MB = 512
+EXTENSION = ".sqlite"
+
+
+def diffKey(refa, refb, dataset=None, featureid=None):
+    text = "\n".join(str(v) for v in [refa, refb, dataset, featureid])
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class DiffCache:
+    def __init__(self, folder, maxSize=DEFAULT_MAX_SIZE_MB * 1024 * 1024):
+        self.folder = folder
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + EXTENSION)
+
+    def get(self, key):
+        path = self._path(key)
+        with self._lock:
+            if not os.path.exists(path):
+                self.misses += 1
+                return None
+            self.hits += 1
+        try:
+            # Used files are the most recent ones when evicting
+            os.utime(path)
+        except OSError:
+            pass
+        return DiffStore(path)
+
+    def put(self, key, changes):
+        # Writes the (dataset, feature) tuples to a new entry and returns it
+        os.makedirs(self.folder, exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(suffix=".tmp", dir=self.folder)
+        os.close(fd)
+        store = DiffStore(tmpname)
+        try:
+            try:
+                store.addAll(changes)
+            finally:
+                store.close()
+            os.replace(tmpname, self._path(key))
+        except BaseException:
+            try:
+                os.remove(tmpname)
+            except OSError:
+                pass
+            raise
+        self.evict(keep=key)
+        return DiffStore(self._path(key))
+
+    def _entries(self):
+        entries = []
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return entries
+        for name in names:
+            if name.endswith(EXTENSION):
+                try:
+                    stat = os.stat(os.path.join(self.folder, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def evict(self, keep=None):
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for mtime, size, name in entries)
+            for mtime, size, name in entries:
+                if total <= self.maxSize:
+                    break
+                if keep is not None and name == keep + EXTENSION:
+                    continue
+                try:
+                    os.remove(os.path.join(self.folder, name))
+                    total -= size
+                except OSError:
+                    # Still open somewhere (on Windows)
+                    pass
+
+    def clear(self):
+        with self._lock:
+            for mtime, size, name in self._entries():
+                try:
+                    os.remove(os.path.join(self.folder, name))
+                except OSError:
+                    pass
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "size": sum(size for mtime, size, name in entries),
+        }
+
+
+_caches = {}
+_cachesLock = threading.Lock()
+
+
+def diffCache(folder, maxSize):
+    key = os.path.normcase(os.path.abspath(folder))
+    with _cachesLock:
+        if key not in _caches:
+            _caches[key] = DiffCache(folder, maxSize)
+        cache = _caches[key]
+        cache.maxSize = maxSize
+        return cache
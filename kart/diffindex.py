@@ -0,0 +1,68 @@
+from collections import OrderedDict
+
+# Index of the features in a Kart diff, with the two halves of each update
+# ("U-" and "U+") paired by feature id. Features are added in a single pass
+# and looked up by id in constant time.
+
+ADDED, MODIFIED, REMOVED = "I", "U", "D"
+CHANGE_TYPES = [ADDED, MODIFIED, REMOVED]
+
+
+def splitFeatureId(featureId):
+    changetype, fid = featureId.split("::", 1)
+    return changetype, fid
+
+
+class ChangeIndex:
+    def __init__(self, features=None):
+        # For each change type, the [old, new] versions of each feature by id
+        self.buckets = {changetype: OrderedDict() for changetype in CHANGE_TYPES}
+        if features is not None:
+            self.addAll(features)
+
+    def add(self, feature):
+        changetype, fid = splitFeatureId(feature["id"])
+        if changetype == "I":
+            self.buckets[ADDED][fid] = [{}, feature]
+        elif changetype == "D":
+            self.buckets[REMOVED][fid] = [feature, {}]
+        else:
+            pair = self.buckets[MODIFIED].setdefault(fid, [{}, {}])
+            pair[0 if changetype == "U-" else 1] = feature
+
+    def addAll(self, features):
+        for feature in features:
+            self.add(feature)
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def count(self, changetype):
+        return len(self.buckets[changetype])
+
+    def fids(self, changetype):
+        return list(self.buckets[changetype].keys())
+
+    def get(self, fid):
+        # Returns (changetype, old, new) for a feature id, or None
+        for changetype, bucket in self.buckets.items():
+            pair = bucket.get(fid)
+            if pair is not None:
+                return changetype, pair[0], pair[1]
+        return None
+
+    def changes(self, changetype=None):
+        # Yields (changetype, fid, old, new) for all features, or for those of
+        # a single change type
+        changetypes = CHANGE_TYPES if changetype is None else [changetype]
+        for changetype in changetypes:
+            for fid, (old, new) in self.buckets[changetype].items():
+                yield changetype, fid, old, new
+
+
+def indexChanges(changes):
+    # Takes the result of Repository.diff, with a list of features for each
+    # dataset. Diff stores have their changes indexed already.
+    if hasattr(changes, "changeIndex"):
+        return {dataset: changes.changeIndex(dataset) for dataset in changes}
+    return {dataset: ChangeIndex(features) for dataset, features in changes.items()}
@@ -0,0 +1,263 @@
+import json
+import os
+import tempfile
+
+from functools import partial
+
+from qgis.PyQt.QtCore import QTimer, QVariant
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsProject,
+    QgsVectorFileWriter,
+    QgsVectorLayer,
+    QgsWkbTypes,
+)
+
+from kart.refs import isOid
+from kart.utils import DIFFLAYERSCACHESIZE, cacheFolder, setting
+from kart.wkb import geojsonToWkb
+
+# Diffs saved as layers are written to a GeoPackage in the cache folder, with a
+# table for each dataset. Files for diffs between two commits are kept, and
+# reused when the same diff is requested again, up to their own size limit,
+# separate from the one of the diff cache. Files for other refs are removed
+# with their layers.
+
+FEATURE_CHUNK_SIZE = 10000
+# Name of the FID column, so it doesn't clash with a 'fid' field of a dataset
+FID_COLUMN = "kart_diff_fid"
+ID_FIELD = "id"
+TEMP_PREFIX = "tmp"
+DEFAULT_MAX_SIZE_MB = 512
+
+# Number of loaded layers using each file
+_layerCount = {}
+
+
+def geometryFromGeojson(geometry):
+    if geometry is None:
+        return None
+    geom = QgsGeometry()
+    geom.fromWkb(geojsonToWkb(geometry))
+    return geom
+
+
+# Types of the fields in the schema of a dataset
+FIELD_TYPES = {
+    "boolean": QVariant.Bool,
+    "integer": QVariant.LongLong,
+    "float": QVariant.Double,
+    "date": QVariant.Date,
+    "time": QVariant.Time,
+    "timestamp": QVariant.DateTime,
+}
+
+
+def _fields(info):
+    fields = QgsFields()
+    # Diff styles use the change type in the 'id' field
+    fields.append(QgsField(ID_FIELD, QVariant.String))
+    for field in info["fields"]:
+        name = field["name"]
+        if name != ID_FIELD and name != info["geometryField"]:
+            fieldType = FIELD_TYPES.get(field["dataType"], QVariant.String)
+            fields.append(QgsField(name, fieldType))
+    return fields
+
+
+def _wkbType(info):
+    geometryType = info["geometryType"]
+    if info["geometryField"] is None:
+        return QgsWkbTypes.NoGeometry
+    if geometryType is None:
+        return QgsWkbTypes.Unknown
+    # Kart uses names like 'MULTIPOLYGON ZM'
+    return QgsWkbTypes.parseType(geometryType.replace(" ", ""))
+
+
+def writeDiffLayer(features, path, dataset, info):
+    # Returns False if there is nothing to write. The fields, geometry type and
+    # CRS are taken from the dataset info in the metadata.
+    if not features:
+        return False
+    fields = _fields(info)
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = "GPKG"
+    options.layerName = dataset
+    options.layerOptions = [f"FID={FID_COLUMN}"]
+    if os.path.exists(path):
+        options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer
+    writer = QgsVectorFileWriter.create(
+        path,
+        fields,
+        _wkbType(info),
+        QgsCoordinateReferenceSystem(info["crs"] or ""),
+        QgsProject.instance().transformContext(),
+        options,
+    )
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        raise IOError(writer.errorMessage())
+    names = fields.names()
+    batch = []
+    for geojson in features:
+        feature = QgsFeature(fields)
+        props = geojson["properties"]
+        feature.setAttributes([geojson["id"]] + [props.get(name) for name in names[1:]])
+        geom = geometryFromGeojson(geojson.get("geometry"))
+        if geom is not None:
+            feature.setGeometry(geom)
+        batch.append(feature)
+        if len(batch) >= FEATURE_CHUNK_SIZE:
+            writer.addFeatures(batch)
+            batch = []
+    if batch:
+        writer.addFeatures(batch)
+    # The file is only complete once the writer is deleted
+    del writer
+    return True
+
+
+def _cacheSize():
+    size = setting(DIFFLAYERSCACHESIZE)
+    if size is None:
+        size = DEFAULT_MAX_SIZE_MB
+    return size * 1024 * 1024
+
+
+def _removeFile(path):
+    for filename in [path, path + "-wal", path + "-shm"]:
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+
+def _cachedFiles(folder):
+    # Returns (mtime, size, path, indexPath) tuples for the reusable files
+    entries = []
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return entries
+    for name in names:
+        if name.endswith(".gpkg") and not name.startswith(TEMP_PREFIX):
+            path = os.path.join(folder, name)
+            indexPath = os.path.splitext(path)[0] + ".json"
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path, indexPath))
+    return entries
+
+
+def evictDiffLayers(folder, maxSize, keep=None):
+    # Removes the least recently used files above the size limit, and the
+    # temporary files of layers that are not loaded anymore
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if name.startswith(TEMP_PREFIX) and name.endswith(".gpkg"):
+            if path != keep and path not in _layerCount:
+                try:
+                    _removeFile(path)
+                except OSError:
+                    pass
+    entries = sorted(_cachedFiles(folder))
+    total = sum(size for mtime, size, path, indexPath in entries)
+    for mtime, size, path, indexPath in entries:
+        if total <= maxSize:
+            break
+        if path == keep or path in _layerCount:
+            continue
+        try:
+            _removeFile(indexPath)
+            _removeFile(path)
+            total -= size
+        except OSError:
+            # Still open somewhere (on Windows)
+            pass
+
+
+def diffLayersFile(repo, refa, refb):
+    # Returns the GeoPackage with the changes between refb and refa, and the
+    # datasets it has a table for
+    folder = cacheFolder("difflayers")
+    os.makedirs(folder, exist_ok=True)
+    reusable = isOid(refa) and isOid(refb)
+    if reusable:
+        path = os.path.join(folder, f"{refa}_{refb}.gpkg")
+        indexPath = os.path.join(folder, f"{refa}_{refb}.json")
+        if os.path.exists(indexPath) and os.path.exists(path):
+            try:
+                # Used files are the most recent ones when evicting
+                os.utime(path)
+            except OSError:
+                pass
+            with open(indexPath) as f:
+                return path, json.load(f)
+        if os.path.exists(path):
+            # Left by an interrupted write
+            _removeFile(path)
+    else:
+        fd, path = tempfile.mkstemp(prefix=TEMP_PREFIX, suffix=".gpkg", dir=folder)
+        os.close(fd)
+        os.remove(path)
+
+    changes = repo.diff(refb, refa)
+    datasets = []
+    try:
+        for dataset in changes:
+            info = repo.datasetInfo(dataset, refa) or repo.datasetInfo(dataset, refb)
+            if writeDiffLayer(changes[dataset], path, dataset, info):
+                datasets.append(dataset)
+    except Exception:
+        _removeFile(path)
+        raise
+    finally:
+        if hasattr(changes, "close"):
+            changes.close()
+    if reusable:
+        with open(indexPath, "w") as f:
+            json.dump(datasets, f)
+    evictDiffLayers(folder, _cacheSize(), keep=path)
+    return path, datasets
+
+
+def _layerDeleted(path, temporary):
+    _layerCount[path] -= 1
+    if _layerCount[path] == 0:
+        del _layerCount[path]
+        if temporary:
+            # Once the layer has closed the file
+            QTimer.singleShot(0, partial(_removeTempFile, path))
+
+
+def _removeTempFile(path):
+    if path not in _layerCount:
+        try:
+            _removeFile(path)
+        except OSError:
+            # Removed when evicting files later
+            pass
+
+
+def diffLayers(repo, refa, refb):
+    path, datasets = diffLayersFile(repo, refa, refb)
+    temporary = os.path.basename(path).startswith(TEMP_PREFIX)
+    layers = []
+    for dataset in datasets:
+        layer = QgsVectorLayer(
+            f"{path}|layername={dataset}", f"{dataset}_diff_{refa[:7]}", "ogr"
+        )
+        # Files used by layers are not evicted, and temporary ones are removed
+        # with their last layer
+        _layerCount[path] = _layerCount.get(path, 0) + 1
+        layer.willBeDeleted.connect(partial(_layerDeleted, path, temporary))
+        layers.append(layer)
+    if temporary and not layers:
+        _removeFile(path)
+    return layers
@@ -0,0 +1,234 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+from collections.abc import Mapping, Sequence
+
+from kart.diffindex import CHANGE_TYPES, splitFeatureId
+
+# Storage of the features of a Kart diff in a SQLite file, so diffs don't have
+# to fit in memory. A DiffStore behaves as a read-only dict with a list of
+# GeoJSON features for each dataset, the same as the result of
+# Repository.diff used to be, and features are read from disk as needed.
+#
+# Each row holds both versions of a changed feature, with the two halves of
+# an update paired when they are stored.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY,
+    dataset TEXT NOT NULL,
+    changetype TEXT NOT NULL,
+    fid TEXT NOT NULL,
+    old TEXT,
+    new TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS changes_fid_idx
+    ON changes (dataset, changetype, fid);
+CREATE INDEX IF NOT EXISTS changes_dataset_idx ON changes (dataset);
+CREATE INDEX IF NOT EXISTS changes_type_idx ON changes (dataset, changetype);
+"""
+
+BATCH_SIZE = 10000
+
+
+def _decode(text):
+    return json.loads(text) if text is not None else {}
+
+
+class DiffStore(Mapping):
+    def __init__(self, path=None):
+        # Without a path, the store is written to a temporary file that is
+        # deleted when the store is closed
+        self.temporary = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(suffix=".sqlite", prefix="kartdiff")
+            os.close(fd)
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._datasets = None
+
+    def _rows(self, feature):
+        changetype, fid = splitFeatureId(feature["id"])
+        text = json.dumps(feature)
+        if changetype in ("U-", "D"):
+            return changetype[0], fid, text, None
+        else:
+            return changetype[0], fid, None, text
+
+    def addAll(self, changes):
+        # Takes (dataset, feature) tuples, as returned by Repository.iterDiff
+        sql = (
+            "INSERT INTO changes (dataset, changetype, fid, old, new) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT (dataset, changetype, fid) DO "
+            "UPDATE SET old = COALESCE(excluded.old, old), "
+            "new = COALESCE(excluded.new, new)"
+        )
+        batch = []
+        with self._lock:
+            for dataset, feature in changes:
+                batch.append((dataset,) + self._rows(feature))
+                if len(batch) >= BATCH_SIZE:
+                    self._conn.executemany(sql, batch)
+                    batch = []
+            if batch:
+                self._conn.executemany(sql, batch)
+            self._conn.commit()
+            self._datasets = None
+
+    def add(self, dataset, feature):
+        self.addAll([(dataset, feature)])
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def iterRows(self, columns, where, params=(), batchSize=1000):
+        # Yields the rows matching a condition in the order they were added.
+        # Rows are fetched in batches, releasing the lock in between so other
+        # queries can run while iterating.
+        last = -1
+        while True:
+            rows = self.query(
+                f"SELECT seq, {columns} FROM changes WHERE {where} AND seq > ? "
+                "ORDER BY seq LIMIT ?",
+                params + (last, batchSize),
+            )
+            for row in rows:
+                yield row[1:]
+            if len(rows) < batchSize:
+                return
+            last = rows[-1][0]
+
+    def datasets(self):
+        if self._datasets is None:
+            rows = self.query(
+                "SELECT dataset FROM changes GROUP BY dataset ORDER BY MIN(seq)"
+            )
+            self._datasets = [row[0] for row in rows]
+        return self._datasets
+
+    def __getitem__(self, dataset):
+        if dataset not in self.datasets():
+            raise KeyError(dataset)
+        return DatasetFeatures(self, dataset)
+
+    def __iter__(self):
+        return iter(self.datasets())
+
+    def __len__(self):
+        return len(self.datasets())
+
+    def changeIndex(self, dataset):
+        return StoredChangeIndex(self, dataset)
+
+    def close(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.close()
+            self._conn = None
+        if self.temporary:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class DatasetFeatures(Sequence):
+    # The GeoJSON features of a dataset, in the order returned by Kart, with
+    # "U-" and "U+" features for each update
+
+    def __init__(self, store, dataset):
+        self.store = store
+        self.dataset = dataset
+
+    def __iter__(self):
+        rows = self.store.iterRows("old, new", "dataset = ?", (self.dataset,))
+        for old, new in rows:
+            if old is not None:
+                yield json.loads(old)
+            if new is not None:
+                yield json.loads(new)
+
+    def __len__(self):
+        rows = self.store.query(
+            "SELECT COUNT(old) + COUNT(new) FROM changes WHERE dataset = ?",
+            (self.dataset,),
+        )
+        return rows[0][0]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return list(self)[i]
+        if i < 0:
+            i += len(self)
+        for j, feature in enumerate(self):
+            if j == i:
+                return feature
+        raise IndexError(i)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, DatasetFeatures)):
+            return list(self) == list(other)
+        return NotImplemented
+
+
+class StoredChangeIndex:
+    # Same interface as kart.diffindex.ChangeIndex, reading from a DiffStore
+
+    def __init__(self, store, dataset):
+        self.store = store
+        self.dataset = dataset
+        rows = store.query(
+            "SELECT changetype, COUNT(*) FROM changes WHERE dataset = ? "
+            "GROUP BY changetype",
+            (dataset,),
+        )
+        self.counts = dict(rows)
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def count(self, changetype):
+        return self.counts.get(changetype, 0)
+
+    def fids(self, changetype):
+        rows = self.store.query(
+            "SELECT fid FROM changes WHERE dataset = ? AND changetype = ? "
+            "ORDER BY seq",
+            (self.dataset, changetype),
+        )
+        return [row[0] for row in rows]
+
+    def get(self, fid):
+        rows = self.store.query(
+            "SELECT changetype, old, new FROM changes WHERE dataset = ? AND "
+            "changetype IN ('I', 'U', 'D') AND fid = ?",
+            (self.dataset, fid),
+        )
+        if not rows:
+            return None
+        changetype, old, new = rows[0]
+        return changetype, _decode(old), _decode(new)
+
+    def changes(self, changetype=None):
+        changetypes = CHANGE_TYPES if changetype is None else [changetype]
+        for changetype in changetypes:
+            rows = self.store.iterRows(
+                "fid, old, new",
+                "dataset = ? AND changetype = ?",
+                (self.dataset, changetype),
+            )
+            for fid, old, new in rows:
+                yield changetype, fid, _decode(old), _decode(new)
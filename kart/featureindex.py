@@ -0,0 +1,103 @@
+from qgis.core import (
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsPointXY,
+    QgsSpatialIndex,
+    QgsVectorLayerFeatureSource,
+)
+
+from kart.tasks import runInBackground
+
+# Spatial index of the features of a layer, used to pick the feature closest to
+# a point without querying the layer. The index stores the geometries, so
+# distances are computed to the actual geometries and not to their bounding
+# boxes. It is built in the background from a snapshot of the layer, and the
+# features edited in the layer are updated in it the next time it is used.
+
+MAX_CANDIDATES = 16
+# Features closer than this to the nearest one (relative to the search radius)
+# are considered to be at the same distance
+TIE_TOLERANCE = 1e-6
+
+
+def _buildIndex(source):
+    request = QgsFeatureRequest().setNoAttributes()
+    return QgsSpatialIndex(
+        source.getFeatures(request), None, QgsSpatialIndex.FlagStoreFeatureGeometries
+    )
+
+
+class FeatureIndex:
+    def __init__(self, layer, idField, stamp=None):
+        self.layer = layer
+        self.idField = idField
+        # State of the working copy the index was built from
+        self.stamp = stamp
+        # Ids of the features edited since the index was last updated
+        self.edited = set()
+        # Feature sources can be read from other threads, unlike layers
+        source = QgsVectorLayerFeatureSource(layer)
+        self.future = runInBackground(_buildIndex, source)
+        self.connections = [
+            (layer.featureAdded, self.featureEdited),
+            (layer.featureDeleted, self.featureEdited),
+            (layer.geometryChanged, self.featureEdited),
+        ]
+        for signal, slot in self.connections:
+            signal.connect(slot)
+
+    def disconnect(self):
+        for signal, slot in self.connections:
+            signal.disconnect(slot)
+        self.connections = []
+
+    def featureEdited(self, fid, *args):
+        self.edited.add(fid)
+
+    def index(self):
+        index = self.future.result()
+        if self.edited:
+            fids = list(self.edited)
+            request = QgsFeatureRequest().setFilterFids(fids).setNoAttributes()
+            for fid in fids:
+                geom = index.geometry(fid)
+                if not geom.isNull():
+                    feature = QgsFeature(fid)
+                    feature.setGeometry(geom)
+                    index.deleteFeature(feature)
+            for feature in self.layer.getFeatures(request):
+                if feature.hasGeometry():
+                    index.addFeature(feature)
+            self.edited.clear()
+        return index
+
+    def nearest(self, point, radius):
+        # Returns the ids of the features closest to a point, in layer
+        # coordinates, and within the search radius. There is more than one if
+        # they are at the same distance, like overlapping polygons.
+        index = self.index()
+        point = QgsPointXY(point)
+        candidates = index.nearestNeighbor(point, MAX_CANDIDATES, radius)
+        if not candidates:
+            return []
+        pointGeom = QgsGeometry.fromPointXY(point)
+        distances = sorted(
+            (index.geometry(fid).distance(pointGeom), fid) for fid in candidates
+        )
+        closest = distances[0][0]
+        if closest > radius:
+            return []
+        tolerance = radius * TIE_TOLERANCE
+        return [fid for distance, fid in distances if distance - closest <= tolerance]
+
+    def primaryKeys(self, fids):
+        # Returns the primary key of each of the given features, by feature id
+        fields = self.layer.fields()
+        request = (
+            QgsFeatureRequest()
+            .setFilterFids(fids)
+            .setSubsetOfAttributes([self.idField], fields)
+            .setFlags(QgsFeatureRequest.NoGeometry)
+        )
+        return {f.id(): f[self.idField] for f in self.layer.getFeatures(request)}
@@ -0,0 +1,87 @@
+# Lane assignment for drawing the commit graph of a log, computed from the
+# parents of each commit in a single pass. Commits must be added in the order
+# returned by 'kart log' (children before their parents).
+#
+# Each commit gets a 'commitColumn' and a 'graph' dict with the edges to draw
+# in the upper ('top') and lower ('bottom') halves of its row. Top edges go
+# from a column at the top of the row to a column at its centre, and bottom
+# edges from a column at the centre to a column at the bottom. Lanes keep
+# their column from one row to the next, so consecutive rows connect.
+
+
+class GraphLayout:
+    def __init__(self, simplify=False):
+        # When the log is filtered (for instance by dataset), parents might not
+        # be part of it. In that case, a commit that no lane is waiting for
+        # continues the leftmost lane instead of starting a new one.
+        self.simplify = simplify
+        self.lanes = []
+
+    def _freeLane(self):
+        for i, lane in enumerate(self.lanes):
+            if lane is None:
+                return i
+        self.lanes.append(None)
+        return len(self.lanes) - 1
+
+    def add(self, commit):
+        oid = commit["commit"]
+        parents = commit["parents"]
+        lanes = self.lanes
+        incoming = [i for i, lane in enumerate(lanes) if lane == oid]
+        if incoming:
+            col = incoming[0]
+        elif self.simplify and any(lane is not None for lane in lanes):
+            col = next(i for i, lane in enumerate(lanes) if lane is not None)
+            incoming = [col]
+        else:
+            col = self._freeLane()
+
+        top = []
+        for i, lane in enumerate(lanes):
+            if i in incoming:
+                top.append([i, col])
+            elif lane is not None:
+                top.append([i, i])
+
+        for i in incoming:
+            lanes[i] = None
+        targets = []
+        if parents:
+            lanes[col] = parents[0]
+            targets.append(col)
+        for parent in parents[1:]:
+            if parent in lanes:
+                targets.append(lanes.index(parent))
+            else:
+                i = self._freeLane()
+                lanes[i] = parent
+                targets.append(i)
+
+        bottom = []
+        for i, lane in enumerate(lanes):
+            if i in targets:
+                bottom.append([col, i])
+            elif lane is not None:
+                bottom.append([i, i])
+
+        while lanes and lanes[-1] is None:
+            lanes.pop()
+
+        commit["commitColumn"] = col
+        commit["graph"] = {"top": top, "bottom": bottom}
+        return commit
+
+    def layout(self, commits):
+        for commit in commits:
+            self.add(commit)
+        return commits
+
+
+def maxColumn(commits):
+    columns = [0]
+    for commit in commits:
+        columns.append(commit["commitColumn"])
+        for edges in commit["graph"].values():
+            columns.extend(max(edge) for edge in edges)
+    return max(columns)
@@ -1,11 +1,12 @@
 import os
+from collections import deque
 
 from qgis.utils import iface
 from qgis.core import Qgis
 from qgis.gui import QgsMessageBar
 
 from qgis.PyQt import uic
-from qgis.PyQt.QtCore import QSize, Qt
+from qgis.PyQt.QtCore import QSize, Qt, QTimer
 from qgis.PyQt.QtGui import QIcon, QFont
 from qgis.PyQt.QtWidgets import (
     QDialog,
@@ -15,8 +16,11 @@ from qgis.PyQt.QtWidgets import (
     QHeaderView,
     QSizePolicy,
     QTreeWidgetItemIterator,
+    QMenu,
 )
 
+from kart.conflicts import OURS, THEIRS, ANCESTOR
+
 pluginPath = os.path.split(os.path.dirname(__file__))[0]
 
 
@@ -27,13 +31,17 @@ def icon(f):
 layerIcon = icon("layer.png")
 featureIcon = icon("layer.png")
 
+# Conflicts solved at once are removed from the tree in chunks of this size, so
+# the dialog stays responsive
+SOLVE_CHUNK_SIZE = 500
+
 WIDGET, BASE = uic.loadUiType(
     os.path.join(os.path.dirname(__file__), "conflictsdialog.ui")
 )
 
 
 class ConflictsDialog(BASE, WIDGET):
-    def __init__(self, conflicts):
+    def __init__(self, conflicts, resolved=None):
         super(QDialog, self).__init__(iface.mainWindow())
         self.okToMerge = False
         self.conflicts = conflicts
@@ -45,13 +53,16 @@ class ConflictsDialog(BASE, WIDGET):
 
         self.resize(1024, 768)
 
-        self.resolvedFeatures = {}
+        # Conflicts solved before opening the dialog are kept
+        self.resolvedFeatures = dict(resolved or {})
 
         self.tableAttributes.setSortingEnabled(False)
         self.treeConflicts.itemClicked.connect(self.updateFromCurrentSelectedItem)
         self.tableAttributes.cellClicked.connect(self.cellClicked)
         self.btnSolveAllOurs.clicked.connect(self.solveAllOurs)
         self.btnSolveAllTheirs.clicked.connect(self.solveAllTheirs)
+        self.treeConflicts.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.treeConflicts.customContextMenuRequested.connect(self.showPopupMenu)
         self.btnSolveOurs.clicked.connect(self.solveOurs)
         self.btnSolveTheirs.clicked.connect(self.solveTheirs)
         self.btnSolveFeature.clicked.connect(self.solveFeature)
@@ -60,6 +71,8 @@ class ConflictsDialog(BASE, WIDGET):
         self.btnDeleteFeature.clicked.connect(self.solveWithDeleted)
 
         self.lastSelectedItem = None
+        # (path, version, conflicts) for each dataset being solved
+        self.pendingSolve = deque()
 
         self.btnSolveOurs.setEnabled(False)
         self.btnSolveTheirs.setEnabled(False)
@@ -81,16 +94,17 @@ class ConflictsDialog(BASE, WIDGET):
 
     def fillConflictsTree(self):
         self.treeItems = {}
+        self.datasetItems = {}
         for path, conflicts in self.conflicts.items():
             topItem = QTreeWidgetItem()
             topItem.setText(0, path)
             topItem.setIcon(0, layerIcon)
             self.treeConflicts.addTopLevelItem(topItem)
-            self.treeItems[path] = {}
-            for fid, conflict in conflicts.items():
-                conflictItem = ConflictItem(path, fid, conflict)
-                topItem.addChild(conflictItem)
-                self.treeItems[path][fid] = conflictItem
+            self.datasetItems[path] = topItem
+            self.treeItems[path] = {
+                fid: ConflictItem(path, fid, self.conflicts) for fid in conflicts
+            }
+            topItem.addChildren(list(self.treeItems[path].values()))
 
     def cellClicked(self, row, col):
         if col > 2:
@@ -122,27 +136,77 @@ class ConflictsDialog(BASE, WIDGET):
             self.btnSolveOurs.setEnabled(False)
             self.btnSolveFeature.setEnabled(False)
 
+    def showPopupMenu(self, point):
+        item = self.treeConflicts.itemAt(point)
+        if item is None or isinstance(item, ConflictItem) or self.pendingSolve:
+            return
+        path = item.text(0)
+        menu = QMenu()
+        oursAction = menu.addAction("Solve all conflicts in dataset using 'ours'")
+        oursAction.triggered.connect(lambda: self.solveAll(OURS, path))
+        theirsAction = menu.addAction("Solve all conflicts in dataset using 'theirs'")
+        theirsAction.triggered.connect(lambda: self.solveAll(THEIRS, path))
+        menu.exec_(self.treeConflicts.viewport().mapToGlobal(point))
+
     def solveAllOurs(self):
-        ret = QMessageBox.warning(
-            self,
-            "Solve conflicts",
-            "Are you sure you want to solve all conflicts using the 'ours' version?",
-            QMessageBox.Yes | QMessageBox.No,
-            QMessageBox.Yes,
-        )
-        if ret == QMessageBox.Yes:
-            pass
+        self.solveAll(OURS)
 
     def solveAllTheirs(self):
+        self.solveAll(THEIRS)
+
+    def solveAll(self, version, path=None):
+        if path is None:
+            target = "all conflicts"
+            paths = [p for p in self.treeItems if self.treeItems[p]]
+        else:
+            target = f"all conflicts in dataset '{path}'"
+            paths = [path]
         ret = QMessageBox.warning(
             self,
             "Solve conflicts",
-            "Are you sure you want to solve all conflicts using the 'theirs' version?",
+            f"Are you sure you want to solve {target} using the '{version}' version?",
             QMessageBox.Yes | QMessageBox.No,
             QMessageBox.Yes,
         )
-        if ret == QMessageBox.Yes:
-            pass
+        if ret != QMessageBox.Yes or not paths:
+            return
+        for p in paths:
+            self.pendingSolve.append((p, version, deque(self.treeItems[p].items())))
+        self.setSolvingEnabled(False)
+        QTimer.singleShot(0, self.solveNextChunk)
+
+    def setSolvingEnabled(self, enabled):
+        for widget in [
+            self.treeConflicts,
+            self.stackedWidget,
+            self.btnSolveAllOurs,
+            self.btnSolveAllTheirs,
+        ]:
+            widget.setEnabled(enabled)
+
+    def solveNextChunk(self):
+        # Conflicts are removed from the start of the dataset, where removing
+        # tree items is cheapest
+        if not self.pendingSolve:
+            return
+        path, version, pending = self.pendingSolve[0]
+        items = self.treeItems[path]
+        topItem = self.datasetItems[path]
+        for i in range(min(SOLVE_CHUNK_SIZE, len(pending))):
+            fid, item = pending.popleft()
+            del items[fid]
+            self.resolvedFeatures[f"{path}:feature:{fid}"] = version
+            topItem.removeChild(item)
+        if not pending:
+            self.pendingSolve.popleft()
+            idx = self.treeConflicts.indexOfTopLevelItem(topItem)
+            if idx != -1:
+                self.treeConflicts.takeTopLevelItem(idx)
+        if self.pendingSolve:
+            QTimer.singleShot(0, self.solveNextChunk)
+        else:
+            self.setSolvingEnabled(True)
+            self.updateAfterSolving()
 
     def solveFeature(self):
         conflict = self.lastSelectedItem.conflict
@@ -178,42 +242,39 @@ class ConflictsDialog(BASE, WIDGET):
         self.updateAfterSolvingCurrentItem()
 
     def updateAfterSolvingCurrentItem(self):
-        parent = self.lastSelectedItem.parent()
-        parent.removeChild(self.lastSelectedItem)
+        item = self.lastSelectedItem
+        parent = item.parent()
+        parent.removeChild(item)
+        self.treeItems[item.path].pop(item.fid, None)
         if not parent.childCount():
             idx = self.treeConflicts.indexOfTopLevelItem(parent)
             self.treeConflicts.takeTopLevelItem(idx)
-            if not self.treeConflicts.topLevelItemCount():
-                QMessageBox.warning(
-                    self,
-                    "Solve conflicts",
-                    "All conflicts are solved. The merge operation will now be closed",
-                    QMessageBox.Ok,
-                    QMessageBox.Ok,
-                )
-                self.okToMerge = True
-                self.close()
-                return
+        self.updateAfterSolving()
+
+    def updateAfterSolving(self):
+        if not self.treeConflicts.topLevelItemCount():
+            QMessageBox.warning(
+                self,
+                "Solve conflicts",
+                "All conflicts are solved. The merge operation will now be closed",
+                QMessageBox.Ok,
+                QMessageBox.Ok,
+            )
+            self.okToMerge = True
+            self.close()
+            return
 
         self.treeConflicts.setCurrentItem(self.treeConflicts.topLevelItem(0))
         self.updateFromCurrentSelectedItem()
 
     def solveOurs(self):
-        conflict = self.lastSelectedItem.conflict
-        feature = dict(conflict["ours"])
-        feature[
-            "id"
-        ] = f"{self.lastSelectedItem.path}:feature:{self.lastSelectedItem.fid}"
-        self.resolvedFeatures[feature["id"]] = feature
+        fid = f"{self.lastSelectedItem.path}:feature:{self.lastSelectedItem.fid}"
+        self.resolvedFeatures[fid] = OURS
         self.updateAfterSolvingCurrentItem()
 
     def solveTheirs(self):
-        conflict = self.lastSelectedItem.conflict
-        feature = dict(conflict["theirs"])
-        feature[
-            "id"
-        ] = f"{self.lastSelectedItem.path}:feature:{self.lastSelectedItem.fid}"
-        self.resolvedFeatures[feature["id"]] = feature
+        fid = f"{self.lastSelectedItem.path}:feature:{self.lastSelectedItem.fid}"
+        self.resolvedFeatures[fid] = THEIRS
         self.updateAfterSolvingCurrentItem()
 
     def solveWithDeleted(self):
@@ -223,21 +284,13 @@ class ConflictsDialog(BASE, WIDGET):
 
     def solveWithModified(self):
         conflict = self.lastSelectedItem.conflict
-        feature = conflict["ours"] or conflict["theirs"]
-        feature = dict(feature)
-        feature[
-            "id"
-        ] = f"{self.lastSelectedItem.path}:feature:{self.lastSelectedItem.fid}"
-        self.resolvedFeatures[feature["id"]] = feature
+        fid = f"{self.lastSelectedItem.path}:feature:{self.lastSelectedItem.fid}"
+        self.resolvedFeatures[fid] = OURS if conflict["ours"] else THEIRS
         self.updateAfterSolvingCurrentItem()
 
     def solveWithAncestor(self):
-        conflict = self.lastSelectedItem.conflict
-        feature = dict(conflict["ancestor"])
-        feature[
-            "id"
-        ] = f"{self.lastSelectedItem.path}:feature:{self.lastSelectedItem.fid}"
-        self.resolvedFeatures[feature["id"]] = feature
+        fid = f"{self.lastSelectedItem.path}:feature:{self.lastSelectedItem.fid}"
+        self.resolvedFeatures[fid] = ANCESTOR
         self.updateAfterSolvingCurrentItem()
 
     def showSolveDeleted(self):
@@ -305,6 +358,7 @@ class ConflictsDialog(BASE, WIDGET):
             if ret == QMessageBox.No:
                 evnt.ignore()
             else:
+                self.pendingSolve.clear()
                 self.resolvedFeatures = None
 
 
@@ -349,11 +403,16 @@ class FinalValueItem(QTableWidgetItem):
 
 
 class ConflictItem(QTreeWidgetItem):
-    def __init__(self, path, fid, conflict):
+    def __init__(self, path, fid, conflicts):
         QTreeWidgetItem.__init__(self)
         self.setText(0, fid)
         self.setIcon(0, featureIcon)
         self.setSizeHint(0, QSize(self.sizeHint(0).width(), 25))
-        self.conflict = conflict
+        self.conflicts = conflicts
         self.fid = fid
         self.path = path
+
+    @property
+    def conflict(self):
+        # Versions are fetched when the conflict is shown or solved
+        return self.conflicts.versions(self.path, self.fid)
@@ -1,19 +1,18 @@
 # -*- coding: utf-8 -*-
 
 import os
-import json
 import difflib
 
+from itertools import islice
+
 from qgis.PyQt import uic
-from qgis.PyQt.QtCore import Qt, pyqtSignal
+from qgis.PyQt.QtCore import Qt, QAbstractItemModel, QModelIndex, pyqtSignal
 from qgis.PyQt.QtGui import QIcon, QColor, QBrush
 from qgis.PyQt.QtWidgets import (
     QVBoxLayout,
     QTableWidgetItem,
     QHeaderView,
-    QTreeWidgetItem,
     QDialog,
-    QTreeWidgetItemIterator,
     QSizePolicy,
 )
 
@@ -23,7 +22,6 @@ from qgis.core import (
     QgsFeature,
     QgsRasterLayer,
     QgsVectorLayer,
-    QgsJsonUtils,
     QgsSymbol,
     Qgis,
     QgsGeometry,
@@ -36,9 +34,15 @@ from qgis.gui import QgsMapCanvas, QgsMessageBar, QgsMapToolPan
 
 from .mapswipetool import MapSwipeTool
 from kart.utils import setting, DIFFSTYLES
+from kart.diffindex import indexChanges, CHANGE_TYPES
+from kart.difflayers import geometryFromGeojson
 
 ADDED, MODIFIED, REMOVED, UNCHANGED = 0, 1, 2, 3
 
+FEATURE_CHUNK_SIZE = 10000
+# Number of features added to the tree each time the view needs more
+FETCH_SIZE = 500
+
 OSM_BASEMAP = 0
 PROJECT_LAYERS = 1
 NO_LAYERS = 2
@@ -64,6 +68,12 @@ addedIcon = icon("add.png")
 removedIcon = icon("remove.png")
 modifiedIcon = icon("edit.png")
 
+BUCKETS = {
+    "I": ("Added", addedIcon),
+    "U": ("Modified", modifiedIcon),
+    "D": ("Removed", removedIcon),
+}
+
 pointsStyle = os.path.join(
     pluginPath, "resources", "diff_styles", "geomdiff_points.qml"
 )
@@ -106,6 +116,7 @@ class DiffViewerWidget(WIDGET, BASE):
     def __init__(self, changes, repo):
         super(DiffViewerWidget, self).__init__()
         self.changes = changes
+        self.changeIndex = indexChanges(changes)
         self.repo = repo
         self.oldLayer = None
         self.newLayer = None
@@ -135,23 +146,32 @@ class DiffViewerWidget(WIDGET, BASE):
         self.comboAdditionalLayers.currentIndexChanged.connect(self.fillCanvas)
         self.btnRecoverOldVersion.clicked.connect(self.recoverOldVersion)
         self.btnRecoverNewVersion.clicked.connect(self.recoverNewVersion)
-        self.featuresTree.currentItemChanged.connect(self.treeItemChanged)
         self.featuresTree.header().hide()
 
         self.featuresTree.header().setStretchLastSection(True)
 
         self.fillTree()
+        self.featuresTree.selectionModel().currentChanged.connect(
+            self._currentIndexChanged
+        )
 
         self.selectFirstChangedFeature()
 
     def selectFirstChangedFeature(self):
-        iterator = QTreeWidgetItemIterator(self.featuresTree)
-        while iterator.value():
-            item = iterator.value()
-            if isinstance(item, FeatureItem):
-                self.featuresTree.setCurrentItem(item)
-                return
-            iterator += 1
+        model = self.featuresTree.model()
+        datasetIndex = model.index(0, 0)
+        bucketIndex = model.index(0, 0, datasetIndex)
+        if not bucketIndex.isValid():
+            return
+        if model.canFetchMore(bucketIndex):
+            model.fetchMore(bucketIndex)
+        featureIndex = model.index(0, 0, bucketIndex)
+        if featureIndex.isValid():
+            self.featuresTree.setCurrentIndex(featureIndex)
+
+    def _currentIndexChanged(self, current, previous):
+        model = self.featuresTree.model()
+        self.treeItemChanged(model.item(current), model.item(previous))
 
     def _hasGeometry(self, item):
         if isinstance(item, FeatureItem):
@@ -160,7 +180,7 @@ class DiffViewerWidget(WIDGET, BASE):
             ref = old or new
             return ref["geometry"] is not None
         else:
-            oldLayer, newLayer = self.layerDiffLayers[item.dataset]
+            oldLayer, newLayer = self._datasetDiffLayers(item.dataset)
             return oldLayer.wkbType() != QgsWkbTypes.NoGeometry
 
     def treeItemChanged(self, current, previous):
@@ -298,78 +318,63 @@ class DiffViewerWidget(WIDGET, BASE):
             header.setSectionResizeMode(column, QHeaderView.Interactive)
 
     def fillTree(self):
-        self.featuresTree.clear()
-        for dataset, changes in self.changes.items():
+        datasetItems = []
+        for dataset, index in self.changeIndex.items():
+            if not len(index):
+                continue
             if dataset not in self.workingCopyLayerCrs:
                 self.workingCopyLayerCrs[dataset] = self.repo.workingCopyLayerCrs(
                     dataset
                 )
             crs = self.workingCopyLayerCrs[dataset]
-            datasetItem = DatasetItem(dataset, crs is None)
-            addedItem = QTreeWidgetItem()
-            addedItem.setText(0, "Added")
-            addedItem.setIcon(0, addedIcon)
-            removedItem = QTreeWidgetItem()
-            removedItem.setText(0, "Removed")
-            removedItem.setIcon(0, removedIcon)
-            modifiedItem = QTreeWidgetItem()
-            modifiedItem.setText(0, "Modified")
-            modifiedItem.setIcon(0, modifiedIcon)
-
-            subItems = {"I": addedItem, "U": modifiedItem, "D": removedItem}
-            changes = {feat["id"]: feat for feat in changes}
-            usedids = []
-            for feat in changes.values():
-                changetype, featid = feat["id"].split("::")
-                changetype = changetype[0]
-                if featid not in usedids:
-                    if changetype == "I":
-                        old = {}
-                        new = feat
-                    elif changetype == "D":
-                        old = feat
-                        new = {}
-                    else:
-                        old = changes[f"U-::{featid}"]
-                        new = changes[f"U+::{featid}"]
-                    usedids.append(featid)
-                    item = FeatureItem(featid, old, new, dataset)
-                    subItems[changetype].addChild(item)
-                if dataset not in self.layerDiffLayers:
-                    ref = new or old
-                    geom = ref["geometry"]
-                    if geom is not None:
-                        geomtype = geom["type"]
-                        oldLayer = QgsVectorLayer(
-                            f"{geomtype}?crs={crs}", "old", "memory"
-                        )
-                        newLayer = QgsVectorLayer(
-                            f"{geomtype}?crs={crs}", "new", "memory"
-                        )
-                    else:
-                        oldLayer = QgsVectorLayer("None", "old", "memory")
-                        newLayer = QgsVectorLayer("None", "new", "memory")
-                    self.layerDiffLayers[dataset] = (oldLayer, newLayer)
-
-                if old and old["geometry"] is not None:
-                    oldFeature = QgsFeature()
-                    oldFeature.setGeometry(self._geomFromGeojson(old))
-                    oldLayer.dataProvider().addFeatures([oldFeature])
-                if new and new["geometry"] is not None:
-                    newFeature = QgsFeature()
-                    newFeature.setGeometry(self._geomFromGeojson(new))
-                    newLayer.dataProvider().addFeatures([newFeature])
-            for subItem in subItems.values():
-                if subItem.childCount():
-                    datasetItem.addChild(subItem)
-            if datasetItem.childCount():
-                self.featuresTree.addTopLevelItem(datasetItem)
+            datasetItems.append(
+                DatasetItem(dataset, crs is None, index, len(datasetItems))
+            )
+        model = DiffTreeModel(datasetItems, self)
+        self.featuresTree.setModel(model)
 
         self.attributesTable.clear()
         self.attributesTable.verticalHeader().hide()
         self.attributesTable.horizontalHeader().hide()
 
-        self.featuresTree.expandAll()
+        # Features are only loaded when the view needs them, so this just
+        # expands the datasets and change types
+        for row in range(model.rowCount()):
+            datasetIndex = model.index(row, 0)
+            self.featuresTree.expand(datasetIndex)
+            for subrow in range(model.rowCount(datasetIndex)):
+                self.featuresTree.expand(model.index(subrow, 0, datasetIndex))
+
+    def _datasetDiffLayers(self, dataset):
+        if dataset not in self.layerDiffLayers:
+            self.layerDiffLayers[dataset] = self._createDatasetDiffLayers(
+                self.changeIndex[dataset], self.workingCopyLayerCrs[dataset]
+            )
+        return self.layerDiffLayers[dataset]
+
+    def _createDatasetDiffLayers(self, index, crs):
+        changetype, fid, old, new = next(index.changes())
+        ref = new or old
+        geom = ref["geometry"]
+        if geom is not None:
+            geomtype = geom["type"]
+            oldLayer = QgsVectorLayer(f"{geomtype}?crs={crs}", "old", "memory")
+            newLayer = QgsVectorLayer(f"{geomtype}?crs={crs}", "new", "memory")
+        else:
+            return (
+                QgsVectorLayer("None", "old", "memory"),
+                QgsVectorLayer("None", "new", "memory"),
+            )
+        oldFeatures = FeatureBatch(oldLayer)
+        newFeatures = FeatureBatch(newLayer)
+        for changetype, fid, old, new in index.changes():
+            if old and old["geometry"] is not None:
+                oldFeatures.addGeometry(old["geometry"])
+            if new and new["geometry"] is not None:
+                newFeatures.addGeometry(new["geometry"])
+        oldFeatures.close()
+        newFeatures.close()
+        return oldLayer, newLayer
 
     def fillCanvas(self):
         layers = []
@@ -445,15 +450,14 @@ class DiffViewerWidget(WIDGET, BASE):
         self.canvas.refresh()
 
     def _geomFromGeojson(self, geojson):
-        feats = QgsJsonUtils.stringToFeatureList(json.dumps(geojson))
-        geom = feats[0].geometry()
-        return geom
+        return geometryFromGeojson(geojson["geometry"])
 
     def _createLayers(self):
         if self.currentFeatureItem is not None:
             self._createFeatureDiffLayers()
         elif self.currentDatasetItem is not None:
-            oldLayer, newLayer = self.layerDiffLayers[self.currentDatasetItem.dataset]
+            dataset = self.currentDatasetItem.dataset
+            oldLayer, newLayer = self._datasetDiffLayers(dataset)
             self.oldLayer = oldLayer.clone()
             self.newLayer = newLayer.clone()
 
@@ -579,23 +583,145 @@ class DiffViewerWidget(WIDGET, BASE):
         self.workingLayerChanged.emit()
 
 
-class FeatureItem(QTreeWidgetItem):
-    def __init__(self, fid, old, new, dataset):
-        QTreeWidgetItem.__init__(self)
-        self.setIcon(0, featureIcon)
-        self.setText(0, fid)
+class FeatureBatch:
+    # Adds features to a memory layer in large chunks, creating the spatial
+    # index once all of them have been added
+
+    def __init__(self, layer, chunkSize=FEATURE_CHUNK_SIZE):
+        self.provider = layer.dataProvider()
+        self.chunkSize = chunkSize
+        self.features = []
+
+    def addGeometry(self, geometry):
+        feature = QgsFeature()
+        feature.setGeometry(geometryFromGeojson(geometry))
+        self.features.append(feature)
+        if len(self.features) >= self.chunkSize:
+            self.flush()
+
+    def flush(self):
+        if self.features:
+            self.provider.addFeatures(self.features)
+            self.features = []
+
+    def close(self):
+        self.flush()
+        self.provider.createSpatialIndex()
+
+
+class DatasetItem:
+    def __init__(self, dataset, isTable, index, row):
+        self.parent = None
+        self.row = row
+        self.dataset = dataset
+        self.text = dataset
+        self.icon = tableIcon if isTable else vectorDatasetIcon
+        self.children = []
+        for changetype in CHANGE_TYPES:
+            if index.count(changetype):
+                bucket = BucketItem(self, len(self.children), changetype, index)
+                self.children.append(bucket)
+
+
+class BucketItem:
+    def __init__(self, parent, row, changetype, index):
+        self.parent = parent
+        self.row = row
+        self.changetype = changetype
+        self.text, self.icon = BUCKETS[changetype]
+        self.total = index.count(changetype)
+        self.children = []
+        self._changes = index.changes(changetype)
+
+    def canFetchMore(self):
+        return len(self.children) < self.total
+
+    def fetchMore(self, count):
+        dataset = self.parent.dataset
+        for changetype, fid, old, new in islice(self._changes, count):
+            row = len(self.children)
+            self.children.append(FeatureItem(self, row, fid, old, new, dataset))
+
+
+class FeatureItem:
+    def __init__(self, parent, row, fid, old, new, dataset):
+        self.parent = parent
+        self.row = row
+        self.text = fid
+        self.icon = featureIcon
+        self.children = []
         self.old = old
         self.new = new
         self.dataset = dataset
         self.fid = fid
 
 
-class DatasetItem(QTreeWidgetItem):
-    def __init__(self, dataset, isTable):
-        QTreeWidgetItem.__init__(self)
-        self.dataset = dataset
-        self.setIcon(0, tableIcon if isTable else vectorDatasetIcon)
-        self.setText(0, dataset)
+class DiffTreeModel(QAbstractItemModel):
+    # Datasets, with the added, modified and removed features of each of them.
+    # Features are created in batches, as the view requests them.
+
+    def __init__(self, datasetItems, parent=None):
+        super().__init__(parent)
+        self.datasetItems = datasetItems
+
+    def item(self, index):
+        return index.internalPointer() if index.isValid() else None
+
+    def _children(self, parent):
+        if parent.isValid():
+            return parent.internalPointer().children
+        return self.datasetItems
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        return self.createIndex(row, column, self._children(parent)[row])
+
+    def parent(self, index):
+        item = self.item(index)
+        if item is None or item.parent is None:
+            return QModelIndex()
+        return self.createIndex(item.parent.row, 0, item.parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self._children(parent))
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        item = self.item(parent)
+        if isinstance(item, BucketItem):
+            return item.total > 0
+        return item is None or bool(item.children)
+
+    def data(self, index, role=Qt.DisplayRole):
+        item = self.item(index)
+        if item is None:
+            return None
+        if role == Qt.DisplayRole:
+            return item.text
+        elif role == Qt.DecorationRole:
+            return item.icon
+        return None
+
+    def canFetchMore(self, parent):
+        item = self.item(parent)
+        return isinstance(item, BucketItem) and item.canFetchMore()
+
+    def fetchMore(self, parent):
+        item = self.item(parent)
+        if not isinstance(item, BucketItem):
+            return
+        count = min(FETCH_SIZE, item.total - len(item.children))
+        if count <= 0:
+            return
+        start = len(item.children)
+        self.beginInsertRows(parent, start, start + count - 1)
+        item.fetchMore(count)
+        self.endInsertRows()
 
 
 class DiffItem(QTableWidgetItem):
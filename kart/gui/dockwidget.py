@@ -30,6 +30,7 @@ from kart.kartapi import (
     removeRepo,
     Repository,
     executeskart,
+    executeExclusiveKartTask,
     KartException,
 )
 from kart.gui.diffviewer import DiffViewerDialog
@@ -43,6 +44,12 @@ from kart.gui.mergedialog import MergeDialog
 from kart.gui.switchdialog import SwitchDialog
 from kart.gui.repopropertiesdialog import RepoPropertiesDialog
 from kart.utils import layerFromSource
+from kart.conflicts import (
+    IDENTICAL,
+    ONE_SIDED,
+    ATTRIBUTES,
+    GEOMETRY_AND_ATTRIBUTES,
+)
 
 pluginPath = os.path.split(os.path.dirname(__file__))[0]
 
@@ -78,6 +85,22 @@ patchIcon = icon("patch.png")
 WIDGET, BASE = uic.loadUiType(os.path.join(os.path.dirname(__file__), "dockwidget.ui"))
 
 
+AUTO_MERGE_KINDS = {
+    IDENTICAL: "same changes on both sides",
+    ONE_SIDED: "changes on one side only",
+    ATTRIBUTES: "different attributes changed",
+    GEOMETRY_AND_ATTRIBUTES: "geometry and attributes changed separately",
+}
+
+
+def autoMergeDetails(summary):
+    return ", ".join(
+        f"{summary[kind]} with {text}"
+        for kind, text in AUTO_MERGE_KINDS.items()
+        if summary[kind]
+    )
+
+
 class KartDockWidget(BASE, WIDGET):
     def __init__(self):
         super(QDockWidget, self).__init__(iface.mainWindow())
@@ -266,6 +289,8 @@ class RepoItem(RefreshableItem):
         self.populated = False
 
     def setTitle(self):
+        # The current branch is normally read from the repository files, so
+        # this doesn't need to run Kart for each repository in the dock
         try:
             title = (
                 f"{self.repo.title() or os.path.normpath(self.repo.path)}"
@@ -418,21 +443,29 @@ class RepoItem(RefreshableItem):
     def mergeBranch(self):
         dialog = MergeDialog(self.repo)
         if dialog.exec() == dialog.Accepted:
-            conflicts = self.repo.mergeBranch(
-                dialog.ref, msg=dialog.message, noff=dialog.noff, ffonly=dialog.ffonly
+            future = executeExclusiveKartTask(
+                self.repo.mergeBranch,
+                dialog.ref,
+                msg=dialog.message,
+                noff=dialog.noff,
+                ffonly=dialog.ffonly,
+            )
+            future.finished.connect(self._mergeFinished)
+
+    def _mergeFinished(self, conflicts):
+        self.repo.updateCanvas()
+        if conflicts:
+            QMessageBox.warning(
+                iface.mainWindow(),
+                "Merge",
+                "There were conflicts during the merge operation.\n"
+                "Resolve them and then commit your changes to \n"
+                "complete the merge.",
+            )
+        else:
+            iface.messageBar().pushMessage(
+                "Merge", "Branch correctly merged", level=Qgis.Info
             )
-            if conflicts:
-                QMessageBox.warning(
-                    iface.mainWindow(),
-                    "Merge",
-                    "There were conflicts during the merge operation.\n"
-                    "Resolve them and then commit your changes to \n"
-                    "complete the merge.",
-                )
-            else:
-                iface.messageBar().pushMessage(
-                    "Merge", "Branch correctly merged", level=Qgis.Info
-                )
 
     @executeskart
     def discardChanges(self):
@@ -470,10 +503,34 @@ class RepoItem(RefreshableItem):
     def resolveConflicts(self):
         conflicts = self.repo.conflicts()
         if conflicts:
-            dialog = ConflictsDialog(conflicts)
-            dialog.exec()
-            if dialog.okToMerge:
-                self.repo.resolveConflicts(dialog.resolvedFeatures)
+            # Conflicts where each side changed different fields are merged
+            # automatically, and only the rest are shown in the dialog
+            resolved, summary = self.repo.autoMergeConflicts(conflicts)
+            remaining = conflicts.exclude(resolved)
+            if not remaining:
+                ret = QMessageBox.question(
+                    iface.mainWindow(),
+                    "Resolve conflicts",
+                    f"All {len(resolved)} conflicts can be merged automatically"
+                    f" ({autoMergeDetails(summary)}). Do you want to merge them"
+                    " and close the merge operation?",
+                    QMessageBox.Yes | QMessageBox.No,
+                )
+                okToMerge = ret == QMessageBox.Yes
+            else:
+                if resolved:
+                    iface.messageBar().pushMessage(
+                        "Resolve",
+                        f"{len(resolved)} conflicts were merged automatically"
+                        f" ({autoMergeDetails(summary)})",
+                        level=Qgis.Info,
+                    )
+                dialog = ConflictsDialog(remaining, resolved)
+                dialog.exec()
+                okToMerge = dialog.okToMerge
+                resolved = dialog.resolvedFeatures
+            if okToMerge:
+                self.repo.resolveConflicts(resolved)
                 self.repo.continueMerge()
                 iface.messageBar().pushMessage(
                     "Merge",
@@ -489,26 +546,39 @@ class RepoItem(RefreshableItem):
     def push(self):
         dialog = PushDialog(self.repo)
         if dialog.exec() == dialog.Accepted:
-            remote, branch, pushall = dialog.result
-            self.repo.push(dialog.remote, dialog.branch, dialog.pushall)
+            future = executeExclusiveKartTask(
+                self.repo.push, dialog.remote, dialog.branch, dialog.pushall
+            )
+            future.finished.connect(self._pushFinished)
+
+    def _pushFinished(self, result):
+        iface.messageBar().pushMessage(
+            "Push", "Push correctly performed", level=Qgis.Info
+        )
 
     @executeskart
     def pull(self):
         dialog = PullDialog(self.repo)
         if dialog.exec() == dialog.Accepted:
-            ret = self.repo.pull(dialog.remote, dialog.branch)
-            if not ret:
-                QMessageBox.warning(
-                    iface.mainWindow(),
-                    "Pull",
-                    "There were conflicts during the pull operation.\n"
-                    "Resolve them and then commit your changes to \n"
-                    "complete it.",
-                )
-            else:
-                iface.messageBar().pushMessage(
-                    "Pull", "Pull correctly performed", level=Qgis.Info
-                )
+            future = executeExclusiveKartTask(
+                self.repo.pull, dialog.remote, dialog.branch
+            )
+            future.finished.connect(self._pullFinished)
+
+    def _pullFinished(self, ret):
+        self.repo.updateCanvas()
+        if not ret:
+            QMessageBox.warning(
+                iface.mainWindow(),
+                "Pull",
+                "There were conflicts during the pull operation.\n"
+                "Resolve them and then commit your changes to \n"
+                "complete it.",
+            )
+        else:
+            iface.messageBar().pushMessage(
+                "Pull", "Pull correctly performed", level=Qgis.Info
+            )
 
     @executeskart
     def applyPatch(self):
@@ -1,5 +1,7 @@
 import os
 import json
+import threading
+from collections import deque
 
 from qgis.PyQt import uic
 from qgis.PyQt.QtCore import Qt
@@ -17,6 +19,7 @@ from qgis.core import (
     QgsSymbol,
     QgsSingleSymbolRenderer,
     QgsWkbTypes,
+    QgsFeature,
     QgsProject,
     QgsJsonUtils,
     QgsVectorLayer,
@@ -24,6 +27,21 @@ from qgis.core import (
 from qgis.gui import QgsMapCanvas, QgsMapToolPan, QgsMessageBar
 from qgis.utils import iface
 
+from kart.cache import LRUCache
+from kart.tasks import runInBackground
+
+# Commits around the current one whose features are decoded in advance
+PREFETCH_DISTANCE = 5
+MAX_DECODED_FEATURES = 1000
+
+# Decoded versions of features, shared by all dialogs and keyed by
+# (dataset, feature id, commit id)
+_decodedFeatures = LRUCache(MAX_DECODED_FEATURES)
+# Events for the features being decoded, set when they are done, so the same
+# feature is never decoded twice at the same time
+_decoding = {}
+_decodingLock = threading.Lock()
+
 
 WIDGET, BASE = uic.loadUiType(
     os.path.join(os.path.dirname(__file__), "featurehistorydialog.ui")
@@ -48,6 +66,12 @@ class FeatureHistoryDialog(BASE, WIDGET):
         self.bar.setSizePolicy(QSizePolicy.Minimum, QSizePolicy.Fixed)
         self.layout().insertWidget(0, self.bar)
 
+        # Features to decode in the background, nearest to the current row
+        # first. A single task per dialog takes them from the queue.
+        self.prefetchQueue = deque()
+        self.prefetching = False
+        self.prefetchLock = threading.Lock()
+
         self.listCommits.currentRowChanged.connect(self.currentCommitChanged)
         self.btnRecover.clicked.connect(self.recoverVersion)
 
@@ -61,8 +85,10 @@ class FeatureHistoryDialog(BASE, WIDGET):
         self.panTool = QgsMapToolPan(self.canvas)
         self.canvas.setMapTool(self.panTool)
 
+        diffs = repo.featureHistory(history, dataset, fid)
+        fields = workingCopyLayer.fields()
         for commit in history:
-            item = CommitListItem(commit, workingCopyLayer, dataset, fid, repo)
+            item = CommitListItem(commit, fields, dataset, fid, diffs)
             self.listCommits.addItem(item)
 
         self.listCommits.setCurrentRow(0)
@@ -88,6 +114,7 @@ class FeatureHistoryDialog(BASE, WIDGET):
         )
         self.commitDetails.setHtml(html)
 
+        self.prefetch(self.listCommits.currentRow())
         self.removeLayer()
         feature = self._currentCommitFeature()
         if feature is None:
@@ -119,7 +146,8 @@ class FeatureHistoryDialog(BASE, WIDGET):
         self.layer.dataProvider().addAttributes(self.workingCopyLayer.fields().toList())
         self.layer.updateFields()
         with edit(self.layer):
-            self.layer.addFeature(feature)
+            # Add a copy, since cached features are shared
+            self.layer.addFeature(QgsFeature(feature))
         self.layer.updateExtents()
         self.layer.selectAll()
         self.layer.setExtent(self.layer.boundingBoxOfSelected())
@@ -135,6 +163,33 @@ class FeatureHistoryDialog(BASE, WIDGET):
         self.canvas.setRenderFlag(True)
         self.canvas.refresh()
 
+    def prefetch(self, row):
+        # The queue is replaced, so features around rows that were left behind
+        # are not decoded anymore
+        start = max(0, row - PREFETCH_DISTANCE)
+        end = min(self.listCommits.count(), row + PREFETCH_DISTANCE + 1)
+        pending = deque()
+        for i in sorted(range(start, end), key=lambda i: abs(i - row)):
+            item = self.listCommits.item(i)
+            if item.key not in _decodedFeatures:
+                pending.append((item.key, item.diffs, item.fields))
+        with self.prefetchLock:
+            self.prefetchQueue = pending
+            startTask = bool(pending) and not self.prefetching
+            if startTask:
+                self.prefetching = True
+        if startTask:
+            runInBackground(self._prefetch)
+
+    def _prefetch(self):
+        while True:
+            with self.prefetchLock:
+                if not self.prefetchQueue:
+                    self.prefetching = False
+                    return
+                key, diffs, fields = self.prefetchQueue.popleft()
+            _decodeFeatures(key, diffs, fields)
+
     def recoverVersion(self):
         new = list(self.layer.getFeatures())[0]
         if self.workingCopyLayerIdField is None:
@@ -163,48 +218,65 @@ class FeatureHistoryDialog(BASE, WIDGET):
             QgsProject.instance().removeMapLayers([self.layer.id()])
 
     def closeEvent(self, evt):
+        with self.prefetchLock:
+            self.prefetchQueue.clear()
         self.removeLayer()
         evt.accept()
 
 
+def featureFromGeoJson(geojson, fields):
+    feature = QgsJsonUtils.stringToFeatureList(json.dumps(geojson))[0]
+    props = geojson["properties"]
+    feature.setFields(fields)
+    for prop in props:
+        feature[prop] = props[prop]
+    return feature
+
+
+def _decodeFeatures(key, diffs, fields):
+    # If the feature is being decoded in another thread, waits for it instead
+    with _decodingLock:
+        if key in _decodedFeatures:
+            return
+        event = _decoding.get(key)
+        decoding = event is None
+        if decoding:
+            event = _decoding[key] = threading.Event()
+    if not decoding:
+        event.wait()
+        return
+    try:
+        diff = diffs.get(key[-1])
+        if diff:
+            features = (
+                featureFromGeoJson(diff[0], fields),
+                featureFromGeoJson(diff[-1], fields),
+            )
+            _decodedFeatures.set(key, features)
+    finally:
+        with _decodingLock:
+            del _decoding[key]
+        event.set()
+
+
 class CommitListItem(QListWidgetItem):
-    def __init__(self, commit, layer, dataset, fid, repo):
+    def __init__(self, commit, fields, dataset, fid, diffs):
         QListWidgetItem.__init__(self)
         self.commit = commit
-        self.layer = layer
-        self.dataset = dataset
-        self.repo = repo
-        self.fid = fid
-        self._feature = None
-        self._oldFeature = None
+        self.fields = fields
+        self.diffs = diffs
+        self.key = (dataset, fid, commit["commit"])
         self.setText(f'{commit["message"].splitlines()[0]}')
 
     def feature(self):
-        self._createFeatures()
-        return self._feature
+        return self._features()[0]
 
     def oldFeature(self):
-        self._createFeatures()
-        return self._oldFeature
-
-    def _createFeatures(self):
-        if self._feature is None:
-            diff = self.repo.diff(
-                self.commit["parents"][0],
-                self.commit["commit"],
-                self.dataset,
-                self.fid,
-            )
-            geojson = diff[self.dataset][0]
-            self._feature = QgsJsonUtils.stringToFeatureList(json.dumps(geojson))[0]
-            props = geojson["properties"]
-            self._feature.setFields(self.layer.fields())
-            for prop in props:
-                self._feature[prop] = props[prop]
-            geojson = diff[self.dataset][-1]
-            self._oldFeature = QgsJsonUtils.stringToFeatureList(json.dumps(geojson))[0]
-            props = geojson["properties"]
-            self._oldFeature.setFields(self.layer.fields())
-            for prop in props:
-                self._oldFeature[prop] = props[prop]
-        return self._feature
+        return self._features()[1]
+
+    def _features(self):
+        features = _decodedFeatures.get(self.key)
+        if features is None:
+            _decodeFeatures(self.key, self.diffs, self.fields)
+            features = _decodedFeatures.get(self.key)
+        return features or (None, None)
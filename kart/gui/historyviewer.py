@@ -1,24 +1,33 @@
-import json
+import bisect
 import os
 
-from kart.kartapi import executeskart
+from functools import partial
+
+from kart.kartapi import executeskart, executeKartTask
 from kart.gui.diffviewer import DiffViewerDialog
+from kart.difflayers import diffLayers
+from kart.graph import GraphLayout, maxColumn
+from kart.historyfilter import HistoryFilterIndex
 from kart.utils import setting, DIFFSTYLES
 
-from qgis.core import Qgis, QgsProject, QgsVectorLayer, QgsWkbTypes
+from qgis.core import Qgis, QgsProject, QgsWkbTypes
 from qgis.utils import iface
 from qgis.gui import QgsMessageBar
 
 from qgis.PyQt import uic
 from qgis.PyQt.QtCore import (
     Qt,
-    QPoint,
-    QRectF,
+    QAbstractItemModel,
+    QModelIndex,
+    QPointF,
+    QRect,
+    QSize,
     QDateTime,
+    QTimer,
+    pyqtSignal,
 )
 from qgis.PyQt.QtGui import (
     QIcon,
-    QPixmap,
     QPainter,
     QColor,
     QPainterPath,
@@ -27,15 +36,14 @@ from qgis.PyQt.QtGui import (
 )
 
 from qgis.PyQt.QtWidgets import (
-    QTreeWidget,
+    QTreeView,
     QAbstractItemView,
     QAction,
     QMenu,
-    QTreeWidgetItem,
-    QWidget,
+    QStyle,
+    QStyledItemDelegate,
     QVBoxLayout,
     QSizePolicy,
-    QLabel,
     QInputDialog,
     QHeaderView,
     QFileDialog,
@@ -46,6 +54,13 @@ RADIUS = 4
 COL_SPACING = 20
 PEN_WIDTH = 2
 MARGIN = 50
+PAGE_SIZE = 200
+LABEL_PADDING = 6
+LABEL_MARGIN = 4
+FILTER_DELAY = 250
+# Pages loaded in a row without finding commits that pass the filter, before
+# waiting for the view to ask for more
+MAX_EMPTY_PAGES = 5
 
 COLORS = [
     QColor(Qt.red),
@@ -76,7 +91,7 @@ patchIcon = icon("patch.png")
 addtoQgisIcon = icon("openinqgis.png")
 
 
-class HistoryTree(QTreeWidget):
+class HistoryTree(QTreeView):
     def __init__(self, repo, dataset, parent):
         super(HistoryTree, self).__init__()
         self.repo = repo
@@ -89,14 +104,24 @@ class HistoryTree(QTreeWidget):
 
     def initGui(self):
         self.setContextMenuPolicy(Qt.CustomContextMenu)
-        # self.header().setStretchLastSection(True)
-        self.setHeaderLabels(
-            ["Graph", "Refs", "Description", "Author", "Date", "CommitID"]
-        )
+        self.setRootIsDecorated(False)
+        self.setUniformRowHeights(True)
+        self.setAllColumnsShowFocus(True)
+        self.historyModel = HistoryModel(self.repo, self.dataset, self)
+        self.historyModel.pageLoaded.connect(self._pageLoaded)
+        self.setModel(self.historyModel)
+        self.setItemDelegateForColumn(0, GraphDelegate(self))
+        self.setItemDelegateForColumn(1, RefsDelegate(self))
         self.customContextMenuRequested.connect(self._showPopupMenu)
         self.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.populate()
 
+    def selectedCommits(self):
+        return [
+            self.historyModel.commit(index)
+            for index in self.selectionModel().selectedRows()
+        ]
+
     def _showPopupMenu(self, point):
         def _f(f, *args):
             def wrapper():
@@ -105,16 +130,16 @@ class HistoryTree(QTreeWidget):
             return wrapper
 
         point = self.mapToGlobal(point)
-        selected = self.selectedItems()
+        selected = self.selectedCommits()
         if selected and len(selected) == 1:
-            item = self.currentItem()
+            commit = selected[0]
             actions = {}
-            parents = item.commit["parents"]
+            parents = commit["parents"]
             if len(parents) == 1:
                 actions["Show changes introduced by this commit..."] = (
                     _f(
                         self.showChangesBetweenCommits,
-                        item.commit["commit"],
+                        commit["commit"],
                         parents[0],
                     ),
                     diffIcon,
@@ -122,12 +147,12 @@ class HistoryTree(QTreeWidget):
                 actions["Save changes as patch..."] = (
                     _f(
                         self.savePatch,
-                        item.commit["commit"],
+                        commit["commit"],
                     ),
                     patchIcon,
                 )
                 actions["Add changes to current QGIS project as vector layer"] = (
-                    _f(self.saveAsLayer, item.commit["commit"], parents[0]),
+                    _f(self.saveAsLayer, commit["commit"], parents[0]),
                     addtoQgisIcon,
                 )
             elif len(parents) > 1:
@@ -137,7 +162,7 @@ class HistoryTree(QTreeWidget):
                     ] = (
                         _f(
                             self.showChangesBetweenCommits,
-                            item.commit["commit"],
+                            commit["commit"],
                             parent,
                         ),
                         diffIcon,
@@ -145,25 +170,25 @@ class HistoryTree(QTreeWidget):
             actions.update(
                 {
                     "Reset current branch to this commit": (
-                        _f(self.resetBranch, item),
+                        _f(self.resetBranch, commit),
                         resetIcon,
                     ),
                     "Create branch at this commit...": (
-                        _f(self.createBranch, item),
+                        _f(self.createBranch, commit),
                         createBranchIcon,
                     ),
                     "Create tag at this commit...": (
-                        _f(self.createTag, item),
+                        _f(self.createTag, commit),
                         createTagIcon,
                     ),
                     "Restore working tree datasets to this version...": (
-                        _f(self.restoreDatasets, item),
+                        _f(self.restoreDatasets, commit),
                         restoreIcon,
                     ),
                 }
             )
 
-            for ref in item.commit["refs"]:
+            for ref in commit["refs"]:
                 if "HEAD" in ref:
                     continue
                 elif "tag:" in ref:
@@ -182,14 +207,14 @@ class HistoryTree(QTreeWidget):
                         deleteIcon,
                     )
         elif selected and len(selected) == 2:
-            itema = selected[0]
-            itemb = selected[1]
+            commita = selected[0]
+            commitb = selected[1]
             actions = {
                 "Show changes between these commits...": (
                     _f(
                         self.showChangesBetweenCommits,
-                        itema.commit["commit"],
-                        itemb.commit["commit"],
+                        commita["commit"],
+                        commitb["commit"],
                     ),
                     diffIcon,
                 )
@@ -206,12 +231,12 @@ class HistoryTree(QTreeWidget):
             self.menu.popup(point)
 
     @executeskart
-    def createTag(self, item):
+    def createTag(self, commit):
         name, ok = QInputDialog.getText(
             self, "Create tag", "Enter name of tag to create"
         )
         if ok and name:
-            self.repo.createTag(name, item.commit["commit"])
+            self.repo.createTag(name, commit["commit"])
             self.message("Tag correctly created", Qgis.Info)
             self.populate()
 
@@ -234,18 +259,18 @@ class HistoryTree(QTreeWidget):
         self.populate()
 
     @executeskart
-    def createBranch(self, item):
+    def createBranch(self, commit):
         name, ok = QInputDialog.getText(
             self, "Create branch", "Enter name of branch to create"
         )
         if ok and name:
-            self.repo.createBranch(name, item.commit["commit"])
+            self.repo.createBranch(name, commit["commit"])
             self.message("Branch correctly created", Qgis.Info)
             self.populate()
 
     @executeskart
-    def showDiff(self, item, parent):
-        refa = item.commit["commit"]
+    def showDiff(self, commit, parent):
+        refa = commit["commit"]
         changes = self.repo.diff(refa, parent)
         dialog = DiffViewerDialog(self, changes, self.repo)
         dialog.exec()
@@ -268,12 +293,7 @@ class HistoryTree(QTreeWidget):
 
     @executeskart
     def saveAsLayer(self, refa, refb):
-        changes = self.repo.diff(refb, refa)
-        for dataset in changes:
-            geojson = {"type": "FeatureCollection", "features": changes[dataset]}
-            layer = QgsVectorLayer(
-                json.dumps(geojson), f"{dataset}_diff_{refa[:7]}", "ogr"
-            )
+        for layer in diffLayers(self.repo, refa, refb):
             styleName = setting(DIFFSTYLES) or "standard"
             typeString = QgsWkbTypes.geometryDisplayString(layer.geometryType()).lower()
             styleFolder = os.path.join(
@@ -287,13 +307,13 @@ class HistoryTree(QTreeWidget):
             QgsProject.instance().addMapLayer(layer)
 
     @executeskart
-    def resetBranch(self, item):
-        self.repo.reset(item.commit["commit"])
+    def resetBranch(self, commit):
+        self.repo.reset(commit["commit"])
         self.message("Branch correctly reset to selected commit", Qgis.Info)
         self.populate()
 
     @executeskart
-    def restoreDatasets(self, item):
+    def restoreDatasets(self, commit):
         ALL_DATASETS = "Restore all datasets"
         vectorLayers, tables = self.repo.datasets()
         datasets = [ALL_DATASETS]
@@ -309,7 +329,7 @@ class HistoryTree(QTreeWidget):
         if ok:
             if dataset == ALL_DATASETS:
                 dataset = None
-            self.repo.restore(item.commit["commit"], dataset)
+            self.repo.restore(commit["commit"], dataset)
             self.message(
                 "Selected dataset(s) correctly restored in working copy", Qgis.Info
             )
@@ -317,153 +337,249 @@ class HistoryTree(QTreeWidget):
     def message(self, text, level):
         self.parent.bar.pushMessage(text, level, duration=5)
 
-    @executeskart
     def populate(self):
-        commits = self.repo.log(dataset=self.dataset)
-
-        self.log = {c["commit"]: c for c in commits}
-        self.clear()
-
-        maxcol = max([c["commitColumn"] for c in commits])
-        width = COL_SPACING * maxcol + 2 * RADIUS
-
-        for i, commit in enumerate(commits):
-            item = CommitTreeItem(commit, self)
-            self.addTopLevelItem(item)
-            img = self.graphImage(commit, width)
-            w = GraphWidget(img)
-            w.setFixedHeight(COMMIT_GRAPH_HEIGHT)
-            self.setItemWidget(item, 0, w)
-
-        for i in range(1, 6):
-            self.resizeColumnToContents(i)
-        self.setColumnWidth(0, width + MARGIN)
-        self.header().setSectionResizeMode(0, QHeaderView.Fixed)
-        self.header().setSectionResizeMode(1, QHeaderView.Fixed)
-        self.filterCommits()
-
-    def graphImage(self, commit, width):
-        image = QPixmap(width, COMMIT_GRAPH_HEIGHT).toImage()
-        qp = QPainter(image)
-        palette = QWidget().palette()
-        qp.fillRect(
-            QRectF(0, 0, width, COMMIT_GRAPH_HEIGHT), palette.color(QPalette.Base)
-        )
-
-        path = QPainterPath()
-        for col in commit["graph"][0][r"\|"]:
-            x = RADIUS + COL_SPACING * col
-            path.moveTo(x, COMMIT_GRAPH_HEIGHT / 2)
-            path.lineTo(x, 0)
-        for col in commit["graph"][2][r"\|"]:
-            x = RADIUS + COL_SPACING * col
-            path.moveTo(x, COMMIT_GRAPH_HEIGHT / 2)
-            path.lineTo(x, COMMIT_GRAPH_HEIGHT)
-        for col in commit["graph"][0][r"/"]:
-            x = RADIUS + COL_SPACING * col
-            x2 = RADIUS + COL_SPACING * (col + 0.5)
-            path.moveTo(x, COMMIT_GRAPH_HEIGHT / 2)
-            path.lineTo(x2, 0)
-        for col in commit["graph"][2][r"/"]:
-            x = RADIUS + COL_SPACING * (col + 1)
-            x2 = RADIUS + COL_SPACING * (col + 0.5)
-            path.moveTo(x, COMMIT_GRAPH_HEIGHT / 2)
-            path.lineTo(x2, COMMIT_GRAPH_HEIGHT)
-        for col in commit["graph"][0][r"\\"]:
-            x = RADIUS + COL_SPACING * (col + 1)
-            x2 = RADIUS + COL_SPACING * (col + 0.5)
-            path.moveTo(x, COMMIT_GRAPH_HEIGHT / 2)
-            path.lineTo(x2, 0)
-        for col in commit["graph"][2][r"\\"]:
-            x = RADIUS + COL_SPACING * (col)
-            x2 = RADIUS + COL_SPACING * (col + 0.5)
-            path.moveTo(x, COMMIT_GRAPH_HEIGHT / 2)
-            path.lineTo(x2, COMMIT_GRAPH_HEIGHT)
-        pen = QPen()
-        pen.setWidth(PEN_WIDTH)
-        pen.setBrush(palette.color(QPalette.WindowText))
-        qp.setPen(pen)
-        qp.drawPath(path)
-
-        col = commit["commitColumn"]
-        y = int(COMMIT_GRAPH_HEIGHT / 2)
-        x = int(RADIUS + COL_SPACING * col)
-        color = COLORS[col]
-        qp.setPen(color)
-        qp.setBrush(color)
-        qp.drawEllipse(QPoint(x, y), RADIUS, RADIUS)
-        qp.end()
-
-        return image
+        self.setEnabled(False)
+        self.historyModel.reload()
+
+    def _pageLoaded(self, firstPage):
+        self.setEnabled(True)
+        width = 2 * RADIUS + COL_SPACING * self.historyModel.maxColumn
+        if firstPage:
+            for i in range(1, 6):
+                self.resizeColumnToContents(i)
+            self.header().setSectionResizeMode(0, QHeaderView.Fixed)
+            self.header().setSectionResizeMode(1, QHeaderView.Fixed)
+        self.setColumnWidth(0, max(self.columnWidth(0), width + MARGIN))
 
     def filterCommits(self, text=None, startDate=None, endDate=None):
-        self.filterText = text or self.filterText
+        self.filterText = text if text is not None else self.filterText
         self.startDate = startDate or self.startDate
         self.endDate = endDate or self.endDate
-        self.filterText = self.filterText.strip(" ").lower()
-        print(self.filterText)
-        root = self.invisibleRootItem()
-        for i in range(root.childCount()):
-            item = root.child(i)
-            values = [
-                item.commit["message"],
-                item.commit["authorName"],
-                item.commit["commit"],
-            ]
-            hide = bool(self.filterText) and not any(
-                self.filterText in t.lower() for t in values
+        self.historyModel.setFilter(
+            self.filterText, self.startDate.toPyDate(), self.endDate.toPyDate()
+        )
+
+
+COLUMNS = ["Graph", "Refs", "Description", "Author", "Date", "CommitID"]
+CommitRole = Qt.UserRole + 1
+
+
+class HistoryModel(QAbstractItemModel):
+
+    pageLoaded = pyqtSignal(bool)
+
+    def __init__(self, repo, dataset, parent=None):
+        super().__init__(parent)
+        self.repo = repo
+        self.dataset = dataset
+        self.generation = 0
+        self.filter = ("", None, None)
+        self._clear()
+
+    def _clear(self):
+        self.commits = []
+        self.filterIndex = HistoryFilterIndex()
+        # Positions in self.commits of the commits that pass the filter
+        self.rows = []
+        self.maxColumn = 0
+        self.layout = GraphLayout(simplify=self.dataset is not None)
+        self.hasMore = True
+        self.loading = False
+        self.emptyPages = 0
+
+    def reload(self):
+        self.beginResetModel()
+        self.generation += 1
+        self._clear()
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    def commit(self, index):
+        return self.commits[self.rows[index.row()]]
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return COLUMNS[section]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        commit = self.commit(index)
+        if role == CommitRole:
+            return commit
+        if role == Qt.DisplayRole:
+            column = index.column()
+            if column == 2:
+                lines = commit["message"].splitlines()
+                return lines[0] if lines else ""
+            elif column == 3:
+                return commit["authorName"]
+            elif column == 4:
+                return commit["authorTime"]
+            elif column == 5:
+                return commit["abbrevCommit"]
+        return None
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self.hasMore and not self.loading
+
+    def fetchMore(self, parent):
+        if not self.canFetchMore(parent):
+            return
+        self.loading = True
+        future = executeKartTask(
+            self.repo.log,
+            dataset=self.dataset,
+            limit=PAGE_SIZE,
+            skip=len(self.commits),
+            layout=self.layout,
+        )
+        future.finished.connect(partial(self._addCommits, self.generation))
+        future.failed.connect(partial(self._fetchFailed, self.generation))
+
+    def _fetchFailed(self, generation, ex):
+        if generation == self.generation:
+            self.loading = False
+            self.hasMore = False
+            self.pageLoaded.emit(not self.commits)
+
+    def _addCommits(self, generation, commits):
+        if generation != self.generation:
+            # A page requested before the history was reloaded
+            return
+        self.loading = False
+        self.hasMore = len(commits) == PAGE_SIZE
+        firstPage = not self.commits
+        start = len(self.commits)
+        self.commits.extend(commits)
+        self.filterIndex.add(commits)
+        self.maxColumn = max(self.maxColumn, maxColumn(commits))
+        rows = self.filterIndex.matches(*self.filter)
+        rows = rows[bisect.bisect_left(rows, start) :]
+        if rows:
+            self.beginInsertRows(
+                QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1
             )
-            date = QDateTime.fromString(item.commit["authorTime"], Qt.ISODate).date()
-            withinDates = date >= self.startDate and date <= self.endDate
-            hide = hide or not withinDates
-            item.setHidden(hide)
-
-
-class GraphWidget(QWidget):
-    def __init__(self, img):
-        QWidget.__init__(self)
-        self.setFixedWidth(img.width())
-        self.img = img
-
-    def paintEvent(self, e):
-        painter = QPainter(self)
-        # painter.begin(self);
-        painter.drawImage(0, 0, self.img)
-        painter.end()
-
-
-class CommitTreeItem(QTreeWidgetItem):
-    def __init__(self, commit, parent):
-        QTreeWidgetItem.__init__(self, parent)
-        self.commit = commit
-        if commit["refs"]:
-            labelslist = []
-            for label in commit["refs"]:
-                if "HEAD ->" in label:
-                    labelslist.append(
-                        '<span style="background-color:crimson; color:white"> '
-                        f'&nbsp;&nbsp;{label.split("->")[-1].strip()}&nbsp;&nbsp;</span>'
-                    )
-                elif "tag:" in label:
-                    labelslist.append(
-                        '<span style="background-color:yellow; color:black"> '
-                        f"&nbsp;&nbsp;{label[4:].strip()}&nbsp;&nbsp;</span>"
-                    )
-                else:
-                    labelslist.append(
-                        '<span style="background-color:salmon; color:white"> '
-                        f"&nbsp;&nbsp;{label}&nbsp;&nbsp;</span>"
-                    )
-            labels = " ".join(labelslist) + "&nbsp;&nbsp;"
+            self.rows.extend(rows)
+            self.endInsertRows()
+        self.pageLoaded.emit(firstPage)
+        self.emptyPages = 0 if rows else self.emptyPages + 1
+        if not rows and self.emptyPages < MAX_EMPTY_PAGES:
+            # Nothing new to show, so the view won't ask for more
+            self.fetchMore(QModelIndex())
+
+    def setFilter(self, text, startDate, endDate):
+        self.beginResetModel()
+        self.filter = (text, startDate, endDate)
+        self.rows = self.filterIndex.matches(text, startDate, endDate)
+        self.emptyPages = 0
+        self.endResetModel()
+        if not self.rows:
+            self.fetchMore(QModelIndex())
+
+
+def paintGraph(painter, commit, rect, palette):
+    height = rect.height()
+    middle = rect.top() + height / 2
+
+    def x(col):
+        return rect.left() + 2 * RADIUS + COL_SPACING * col
+
+    path = QPainterPath()
+    for start, end in commit["graph"]["top"]:
+        path.moveTo(x(start), rect.top())
+        path.lineTo(x(end), middle)
+    for start, end in commit["graph"]["bottom"]:
+        path.moveTo(x(start), middle)
+        path.lineTo(x(end), rect.top() + height)
+    pen = QPen()
+    pen.setWidth(PEN_WIDTH)
+    pen.setBrush(palette.color(QPalette.WindowText))
+    painter.setPen(pen)
+    painter.setBrush(Qt.NoBrush)
+    painter.drawPath(path)
+
+    col = commit["commitColumn"]
+    color = COLORS[col % len(COLORS)]
+    painter.setPen(color)
+    painter.setBrush(color)
+    painter.drawEllipse(QPointF(x(col), middle), RADIUS, RADIUS)
+
+
+class GraphDelegate(QStyledItemDelegate):
+    def paint(self, painter, option, index):
+        commit = index.data(CommitRole)
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setClipRect(option.rect)
+        paintGraph(painter, commit, option.rect, option.palette)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        commit = index.data(CommitRole)
+        width = 4 * RADIUS + COL_SPACING * commit["commitColumn"]
+        return QSize(width, COMMIT_GRAPH_HEIGHT)
+
+
+def refLabels(commit):
+    labels = []
+    for label in commit["refs"]:
+        if "HEAD ->" in label:
+            labels.append((label.split("->")[-1].strip(), "crimson", "white"))
+        elif "tag:" in label:
+            labels.append((label[4:].strip(), "yellow", "black"))
         else:
-            labels = ""
-        qlabel = QLabel(labels)
-        qlabel.setStyleSheet("QLabel {padding-left: 15px;}")
-        parent.setItemWidget(self, 1, qlabel)
-        self.setText(2, commit["message"].splitlines()[0])
-        self.setText(3, commit["authorName"])
-        self.setText(4, commit["authorTime"])
-        self.setText(5, commit["abbrevCommit"])
+            labels.append((label, "salmon", "white"))
+    return labels
+
+
+def textWidth(metrics, text):
+    # QFontMetrics.horizontalAdvance is not available before Qt 5.11
+    if hasattr(metrics, "horizontalAdvance"):
+        return metrics.horizontalAdvance(text)
+    return metrics.width(text)
+
+
+class RefsDelegate(QStyledItemDelegate):
+    def paint(self, painter, option, index):
+        commit = index.data(CommitRole)
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        metrics = option.fontMetrics
+        x = option.rect.left() + LABEL_MARGIN
+        for text, background, foreground in refLabels(commit):
+            width = textWidth(metrics, text) + 2 * LABEL_PADDING
+            rect = QRect(x, option.rect.top() + 1, width, option.rect.height() - 2)
+            painter.fillRect(rect, QColor(background))
+            painter.setPen(QColor(foreground))
+            painter.drawText(rect, Qt.AlignCenter, text)
+            x += width + LABEL_MARGIN
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        commit = index.data(CommitRole)
+        metrics = option.fontMetrics
+        width = LABEL_MARGIN
+        for text, background, foreground in refLabels(commit):
+            width += textWidth(metrics, text) + 2 * LABEL_PADDING + LABEL_MARGIN
+        return QSize(width, COMMIT_GRAPH_HEIGHT)
 
 
 WIDGET, BASE = uic.loadUiType(
@@ -488,15 +604,20 @@ class HistoryDialog(WIDGET, BASE):
         self.history = HistoryTree(repo, dataset, self)
         layout.addWidget(self.history)
         self.frameHistory.setLayout(layout)
-        self.history.currentItemChanged.connect(self.commitSelected)
-        self.txtFilter.textChanged.connect(self._filterCommmits)
+        self.history.selectionModel().currentChanged.connect(self.commitSelected)
+        # Wait for the user to stop typing before filtering
+        self.filterTimer = QTimer(self)
+        self.filterTimer.setSingleShot(True)
+        self.filterTimer.setInterval(FILTER_DELAY)
+        self.filterTimer.timeout.connect(self._filterCommmits)
+        self.txtFilter.textChanged.connect(lambda text: self.filterTimer.start())
         self.dateEditStart.valueChanged.connect(self._filterCommmits)
         self.dateEditEnd.valueChanged.connect(self._filterCommmits)
         self.resize(1024, 768)
 
     def commitSelected(self, new, old):
-        if new is not None:
-            commit = new.commit
+        if new.isValid():
+            commit = self.history.historyModel.commit(new)
             html = (
                 f"<b>SHA-1:</b> {commit['commit']} <br>"
                 f"<b>Message:</b> {commit['message']} <br>"
@@ -506,7 +627,7 @@ class HistoryDialog(WIDGET, BASE):
             html = ""
         self.commitDetails.setHtml(html)
 
-    def _filterCommmits(self, value):
+    def _filterCommmits(self, value=None):
         startDate = self.dateEditStart.date()
         endDate = self.dateEditEnd.date()
         self.history.filterCommits(self.txtFilter.text(), startDate, endDate)
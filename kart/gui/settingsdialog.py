@@ -6,7 +6,21 @@ from qgis.gui import QgsMessageBar
 from qgis.PyQt import uic
 from qgis.PyQt.QtWidgets import QDialog, QSizePolicy, QFileDialog
 
-from kart.utils import setting, setSetting, KARTPATH, AUTOCOMMIT, DIFFSTYLES
+from kart.workers import closeWorkers
+from kart.utils import (
+    setting,
+    setSetting,
+    KARTPATH,
+    AUTOCOMMIT,
+    DIFFSTYLES,
+    KARTWORKERS,
+    DIFFCACHEFOLDER,
+    DIFFCACHESIZE,
+    DIFFLAYERSCACHESIZE,
+    cacheFolder,
+)
+from kart.diffcache import DEFAULT_MAX_SIZE_MB
+from kart import difflayers
 
 WIDGET, BASE = uic.loadUiType(
     os.path.join(os.path.dirname(__file__), "settingsdialog.ui")
@@ -25,6 +39,9 @@ class SettingsDialog(BASE, WIDGET):
         self.layout().addWidget(self.bar)
 
         self.btnBrowsePath.clicked.connect(lambda: self.browse(self.txtKartPath))
+        self.btnBrowseDiffCacheFolder.clicked.connect(
+            lambda: self.browse(self.txtDiffCacheFolder)
+        )
 
         self.buttonBox.accepted.connect(self.okClicked)
         self.buttonBox.rejected.connect(self.reject)
@@ -37,6 +54,15 @@ class SettingsDialog(BASE, WIDGET):
         self.comboDiffStyles.setCurrentText(setting(DIFFSTYLES))
         self.chkAutoCommit.setChecked(setting(AUTOCOMMIT))
         self.txtKartPath.setText(setting(KARTPATH))
+        self.chkKartWorkers.setChecked(setting(KARTWORKERS))
+        folder = setting(DIFFCACHEFOLDER) or cacheFolder("diffs")
+        self.txtDiffCacheFolder.setText(folder)
+        size = setting(DIFFCACHESIZE)
+        self.spinDiffCacheSize.setValue(DEFAULT_MAX_SIZE_MB if size is None else size)
+        size = setting(DIFFLAYERSCACHESIZE)
+        if size is None:
+            size = difflayers.DEFAULT_MAX_SIZE_MB
+        self.spinDiffLayersCacheSize.setValue(size)
 
     def browse(self, textbox):
         folder = QFileDialog.getExistingDirectory(
@@ -49,4 +75,10 @@ class SettingsDialog(BASE, WIDGET):
         setSetting(KARTPATH, self.txtKartPath.text())
         setSetting(AUTOCOMMIT, self.chkAutoCommit.isChecked())
         setSetting(DIFFSTYLES, self.comboDiffStyles.currentText())
+        setSetting(KARTWORKERS, self.chkKartWorkers.isChecked())
+        setSetting(DIFFCACHEFOLDER, self.txtDiffCacheFolder.text())
+        setSetting(DIFFCACHESIZE, self.spinDiffCacheSize.value())
+        setSetting(DIFFLAYERSCACHESIZE, self.spinDiffLayersCacheSize.value())
+        # Running workers might belong to a different executable or be unwanted now
+        closeWorkers()
         self.accept()
@@ -0,0 +1,82 @@
+import bisect
+import datetime
+
+from collections import defaultdict
+
+# Index of the commits of a log used to filter them by text and date without
+# walking the whole log on every change. Commits are referred to by their
+# position in the log, and can be added page by page.
+
+NGRAM = 3
+
+
+def ngrams(text):
+    return {text[i : i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def commitDate(commit):
+    timestamp = commit["authorTime"].replace("Z", "+00:00")
+    try:
+        return datetime.datetime.fromisoformat(timestamp).date()
+    except ValueError:
+        return None
+
+
+class HistoryFilterIndex:
+    def __init__(self):
+        self.texts = []
+        self.ngrams = defaultdict(set)
+        self.dates = []
+        self._sorted = True
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, commits):
+        for commit in commits:
+            position = len(self.texts)
+            text = "\n".join(
+                [commit["message"], commit["authorName"], commit["commit"]]
+            ).casefold()
+            self.texts.append(text)
+            for ngram in ngrams(text):
+                self.ngrams[ngram].add(position)
+            date = commitDate(commit)
+            if date is not None:
+                self.dates.append((date.toordinal(), position))
+                self._sorted = False
+
+    def _withinDates(self, startDate, endDate):
+        if not self._sorted:
+            self.dates.sort()
+            self._sorted = True
+        start = 0
+        end = len(self.dates)
+        if startDate is not None:
+            start = bisect.bisect_left(self.dates, (startDate.toordinal(), -1))
+        if endDate is not None:
+            end = bisect.bisect_left(self.dates, (endDate.toordinal() + 1, -1))
+        return {position for ordinal, position in self.dates[start:end]}
+
+    def _containing(self, text):
+        if len(text) < NGRAM:
+            return {i for i, t in enumerate(self.texts) if text in t}
+        sets = sorted((self.ngrams.get(g, set()) for g in ngrams(text)), key=len)
+        candidates = set.intersection(*sets)
+        # Having all the n-grams doesn't mean they are in the right order
+        return {i for i in candidates if text in self.texts[i]}
+
+    def matches(self, text="", startDate=None, endDate=None):
+        # Returns the sorted positions of the commits containing the text in
+        # their message, author or id, and authored within the given dates
+        text = text.strip().casefold()
+        if startDate is None and endDate is None:
+            positions = None
+        else:
+            positions = self._withinDates(startDate, endDate)
+        if text:
+            containing = self._containing(text)
+            positions = containing if positions is None else positions & containing
+        if positions is None:
+            return list(range(len(self.texts)))
+        return sorted(positions)
@@ -0,0 +1,157 @@
+import json
+import re
+
+# Incremental decoding of the elements of a JSON array, either the top-level
+# value or an array stored under a key of the top-level object (for instance
+# the "features" of a GeoJSON FeatureCollection). Text can be fed in chunks of
+# any size and each element is returned as soon as it is complete.
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_STRUCTURE = re.compile(r'[\[\]{}"]')
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+# The part of a string that can be consumed before its closing quote. A
+# backslash at the end of the text is left out, since its escape is incomplete.
+_STRING_BODY = re.compile(r'(?:[^"\\]|\\.)*', re.DOTALL)
+_SCALAR_END = re.compile(r"[,\]}\s]")
+
+SEEK, KEY, COLON, VALUE, ITEMS, DONE = range(6)
+
+
+class JsonStreamError(ValueError):
+    pass
+
+
+class JsonArrayParser:
+    def __init__(self, key=None):
+        self.key = key
+        self._buf = ""
+        self._pos = 0
+        self._state = SEEK
+        self._currentKey = None
+        self._scan = None
+
+    def done(self):
+        return self._state == DONE
+
+    def feed(self, text):
+        trimmed = self._pos
+        self._buf = self._buf[trimmed:] + text
+        self._pos = 0
+        if self._scan is not None:
+            self._scan = (self._scan[0] - trimmed,) + self._scan[1:]
+        items = []
+        while self._state != DONE and self._step(items):
+            pass
+        return items
+
+    def close(self):
+        if self._state != DONE:
+            raise JsonStreamError("Incomplete JSON document")
+
+    def _skipWhitespace(self):
+        self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+        return self._pos < len(self._buf)
+
+    def _step(self, items):
+        if not self._skipWhitespace():
+            return False
+        char = self._buf[self._pos]
+        if self._state == SEEK:
+            expected = "[" if self.key is None else "{"
+            if char != expected:
+                raise JsonStreamError(f"Expected '{expected}' but found '{char}'")
+            self._pos += 1
+            self._state = ITEMS if self.key is None else KEY
+        elif self._state == KEY:
+            if char == ",":
+                self._pos += 1
+            elif char == "}":
+                raise JsonStreamError(f"Key '{self.key}' not found")
+            else:
+                match = _STRING.match(self._buf, self._pos)
+                if match is None:
+                    return False
+                self._currentKey = json.loads(match.group())
+                self._pos = match.end()
+                self._state = COLON
+        elif self._state == COLON:
+            if char != ":":
+                raise JsonStreamError(f"Expected ':' but found '{char}'")
+            self._pos += 1
+            self._state = VALUE
+        elif self._state == VALUE:
+            if self._currentKey == self.key:
+                if char != "[":
+                    raise JsonStreamError(f"'{self.key}' is not an array")
+                self._pos += 1
+                self._state = ITEMS
+            else:
+                end = self._valueEnd()
+                if end is None:
+                    return False
+                self._pos = end
+                self._state = KEY
+        elif self._state == ITEMS:
+            if char == ",":
+                self._pos += 1
+            elif char == "]":
+                self._pos += 1
+                self._state = DONE
+            else:
+                end = self._valueEnd()
+                if end is None:
+                    return False
+                items.append(json.loads(self._buf[self._pos : end]))
+                self._pos = end
+        return True
+
+    def _valueEnd(self):
+        # Returns the position after the value starting at the current position,
+        # or None if it is not complete yet. Progress is kept between calls,
+        # including inside unfinished strings, so large values are only
+        # scanned once.
+        char = self._buf[self._pos]
+        if char not in '"[{':
+            match = _SCALAR_END.search(self._buf, self._pos)
+            return None if match is None else match.start()
+        if self._scan is None:
+            self._scan = (self._pos, 0, False)
+        scan, depth, inString = self._scan
+        buf = self._buf
+        while True:
+            if inString:
+                end = _STRING_BODY.match(buf, scan).end()
+                if end == len(buf) or buf[end] != '"':
+                    self._scan = (end, depth, True)
+                    return None
+                scan = end + 1
+                inString = False
+                if depth == 0:
+                    self._scan = None
+                    return scan
+                continue
+            match = _STRUCTURE.search(buf, scan)
+            if match is None:
+                self._scan = (len(buf), depth, False)
+                return None
+            char = match.group()
+            scan = match.end()
+            if char == '"':
+                inString = True
+                continue
+            depth += 1 if char in "[{" else -1
+            if depth == 0:
+                self._scan = None
+                return scan
+
+
+def iterJsonArray(chunks, key=None):
+    parser = JsonArrayParser(key)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    parser.close()
+
+
+def iterJsonArrayFromFile(path, key=None, chunkSize=64 * 1024):
+    with open(path, encoding="utf-8") as f:
+        yield from iterJsonArray(iter(lambda: f.read(chunkSize), ""), key)
@@ -1,3 +1,4 @@
+import codecs
 import json
 import locale
 import math
@@ -6,6 +7,7 @@ import re
 import subprocess
 import sys
 import tempfile
+import threading
 
 from functools import partial
 
@@ -17,6 +19,7 @@ from qgis.PyQt.QtWidgets import (
 )
 
 from qgis.core import (
+    Qgis,
     QgsDataSourceUri,
     QgsMessageOutput,
     QgsProject,
@@ -29,8 +32,51 @@ from qgis.core import (
 from kart.gui.userconfigdialog import UserConfigDialog
 from kart.gui.installationwarningdialog import InstallationWarningDialog
 
-from kart.utils import progressBar, setting, setSetting, KARTPATH
-from kart import logging
+from kart.utils import (
+    iface,
+    progressBar,
+    setting,
+    setSetting,
+    cacheFolder,
+    KARTPATH,
+    KARTWORKERS,
+    DIFFCACHEFOLDER,
+    DIFFCACHESIZE,
+)
+from kart.workers import (
+    workerPool,
+    disableWorkers,
+    KartWorkerCommandError,
+    KartWorkerError,
+    KartWorkerNotSupportedError,
+)
+from kart.cache import cachedQuery, invalidatesQueryCache, queryCache, repoState
+from kart.changetracker import changeTracker, fileStamp
+from kart.conflicts import (
+    ConflictStore,
+    ConflictsNotSupportedError,
+    MultipleLabelsNotSupportedError,
+    autoMerge,
+    parseConflictSummary,
+    resolveAll,
+)
+from kart.jsonstream import (
+    iterJsonArray,
+    iterJsonArrayFromFile,
+    JsonStreamError,
+)
+from kart.diffcache import diffCache, diffKey, DEFAULT_MAX_SIZE_MB
+from kart.diffstore import DiffStore
+from kart.graph import GraphLayout
+from kart.metadata import metadataIndex, metadataStore
+from kart.tasks import (
+    isBusy,
+    isMainThread,
+    runExclusive,
+    runInBackground,
+    MainThreadCallback,
+)
+from kart import logging, refs
 
 SUPPORTED_VERSION = "0.10.6"
 
@@ -43,34 +89,64 @@ class KartNotSupportedOperationException(Exception):
     pass
 
 
+def showKartError(ex):
+    dlg = QgsMessageOutput.createMessageOutput()
+    dlg.setTitle("Kart")
+    lines = str(ex).splitlines()
+    msglines = []
+    for line in lines:
+        if line.startswith("ERROR 1: Can't load"):
+            continue
+        if "The specified procedure could not be found" in line:
+            continue
+        if line.strip():
+            msglines.append(line)
+    errors = "<br>".join(msglines)
+    msg = f"""
+        <p><b>Kart failed with the following message:</b></p>
+        <p style="color:red">{errors}</p>
+        """
+    dlg.setMessage(msg, QgsMessageOutput.MessageHtml)
+    dlg.showMessage()
+
+
 def executeskart(f):
     def inner(*args):
+        if isBusy():
+            iface.messageBar().pushMessage(
+                "Kart",
+                "Another Kart operation is running. Wait until it finishes",
+                level=Qgis.Warning,
+            )
+            return
         try:
             if checkKartInstalled():
                 return f(*args)
         except KartException as ex:
-            dlg = QgsMessageOutput.createMessageOutput()
-            dlg.setTitle("Kart")
-            lines = str(ex).splitlines()
-            msglines = []
-            for line in lines:
-                if line.startswith("ERROR 1: Can't load"):
-                    continue
-                if "The specified procedure could not be found" in line:
-                    continue
-                if line.strip():
-                    msglines.append(line)
-            errors = "<br>".join(msglines)
-            msg = f"""
-                <p><b>Kart failed with the following message:</b></p>
-                <p style="color:red">{errors}</p>
-                """
-            dlg.setMessage(msg, QgsMessageOutput.MessageHtml)
-            dlg.showMessage()
+            showKartError(ex)
 
     return inner
 
 
+def _reportTaskError(ex):
+    if isinstance(ex, KartException):
+        showKartError(ex)
+    else:
+        logging.error(str(ex))
+
+
+def executeKartTask(func, *args, **kwargs):
+    future = runInBackground(func, *args, **kwargs)
+    future.failed.connect(_reportTaskError)
+    return future
+
+
+def executeExclusiveKartTask(func, *args, **kwargs):
+    # For operations that change the repo, so no other action can start until
+    # they finish
+    return runExclusive(executeKartTask(func, *args, **kwargs))
+
+
 def kartExecutable():
     if os.name == "nt":
         defaultFolder = os.path.join(os.environ["PROGRAMFILES"], "Kart")
@@ -164,59 +240,203 @@ def kartVersionDetails():
         return errtxt
 
 
-def executeKart(commands, path=None, jsonoutput=False, feedback=None):
+def _kartEnv():
+    # The env PYTHONHOME from QGIS can interfere with Kart.
+    if not hasattr(_kartEnv, "env"):
+        _kartEnv.env = os.environ.copy()
+        if "PYTHONHOME" in _kartEnv.env:
+            _kartEnv.env.pop("PYTHONHOME")
+    return _kartEnv.env
+
+
+def _executeKartInWorker(commands, path, timeout=None):
+    # Returns None if the command couldn't be sent to a worker, so it can be run
+    # directly instead. Once sent, the command might have run (and changed the
+    # repo), so it's never run a second time.
+    executable = commands[0]
+    pool = workerPool(executable, _kartEnv())
+    if pool is None:
+        return None
+    try:
+        return pool.execute(commands[1:], path, timeout)
+    except KartWorkerNotSupportedError as e:
+        disableWorkers(executable)
+        logging.debug(f"Kart worker mode not supported: {e}")
+        return None
+    except KartWorkerCommandError as e:
+        raise KartException(str(e))
+    except KartWorkerError as e:
+        logging.debug(f"Kart worker not available, running command directly: {e}")
+        return None
+
+
+# Output kept in memory while a command runs before spilling to disk
+MAX_OUTPUT_IN_MEMORY = 16 * 1024 * 1024
+READ_SIZE = 64 * 1024
+
+
+def _communicateWithFeedback(proc, feedback, encoding):
+    # stdout is drained in a separate thread while progress lines from stderr
+    # are processed as they arrive, so neither pipe can fill up and block Kart
+    output = tempfile.SpooledTemporaryFile(
+        max_size=MAX_OUTPUT_IN_MEMORY, mode="w+", encoding=encoding
+    )
+
+    def readStdout():
+        for chunk in iter(partial(proc.stdout.read, READ_SIZE), ""):
+            output.write(chunk)
+
+    reader = threading.Thread(target=readStdout, daemon=True)
+    reader.start()
+    err = []
+    for line in proc.stderr:
+        feedback(line)
+        err.append(line)
+    reader.join()
+    proc.wait()
+    output.seek(0)
+    stdout = output.read()
+    output.close()
+    return stdout, "".join(err)
+
+
+def _executeKartOneShot(commands, path, feedback=None, timeout=None):
+    encoding = locale.getdefaultlocale()[1] or "utf-8"
+    with subprocess.Popen(
+        commands,
+        shell=os.name == "nt",
+        env=_kartEnv(),
+        stdout=subprocess.PIPE,
+        stdin=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        encoding=encoding,
+        cwd=path,
+    ) as proc:
+        if feedback is not None:
+            stdout, stderr = _communicateWithFeedback(proc, feedback, encoding)
+        else:
+            try:
+                stdout, stderr = proc.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                raise KartException(f"Kart did not finish in {timeout} seconds")
+    return proc.returncode, stdout, stderr
+
+
+def executeKart(commands, path=None, jsonoutput=False, feedback=None, timeout=None):
+    # Commands are not interrupted unless a timeout (in seconds) is given.
+    # Commands run with feedback can't time out.
     commands.insert(0, kartExecutable())
     if jsonoutput:
         commands.append("-ojson")
 
-    # The env PYTHONHOME from QGIS can interfere with Kart.
-    if not hasattr(executeKart, "env"):
-        executeKart.env = os.environ.copy()
-        if "PYTHONHOME" in executeKart.env:
-            executeKart.env.pop("PYTHONHOME")
-
+    mainThread = isMainThread()
     try:
-        encoding = locale.getdefaultlocale()[1] or "utf-8"
-        QApplication.setOverrideCursor(Qt.WaitCursor)
+        if mainThread:
+            QApplication.setOverrideCursor(Qt.WaitCursor)
         logging.debug(f"Command: {' '.join(commands)}")
+        result = None
+        if feedback is None and setting(KARTWORKERS):
+            result = _executeKartInWorker(commands, path, timeout)
+        if result is None:
+            result = _executeKartOneShot(commands, path, feedback, timeout)
+        returncode, stdout, stderr = result
+        logging.debug(f"Command output: {stdout}")
+        if returncode:
+            raise Exception(stderr)
+        if jsonoutput:
+            return json.loads(stdout)
+        else:
+            return stdout
+    except Exception as e:
+        logging.error(str(e))
+        raise KartException(str(e))
+    finally:
+        if mainThread:
+            QApplication.restoreOverrideCursor()
 
-        with subprocess.Popen(
+
+def executeKartStreaming(commands, path=None):
+    # Yields the output of Kart in chunks while the command is still running.
+    # stderr is collected in a separate thread so it can't block the process.
+    commands.insert(0, kartExecutable())
+    logging.debug(f"Command: {' '.join(commands)}")
+    encoding = locale.getdefaultlocale()[1] or "utf-8"
+    try:
+        proc = subprocess.Popen(
             commands,
             shell=os.name == "nt",
-            env=executeKart.env,
+            env=_kartEnv(),
             stdout=subprocess.PIPE,
             stdin=subprocess.DEVNULL,
             stderr=subprocess.PIPE,
-            universal_newlines=True,
-            encoding=encoding,
             cwd=path,
-        ) as proc:
-            if feedback is not None:
-                output = []
-                err = []
-                for line in proc.stderr:
-                    feedback(line)
-                    err.append(line)
-                for line in proc.stdout:
-                    output.append(line)
-                stdout = "".join(output)
-                stderr = "".join(err)
-            else:
-                stdout, stderr = proc.communicate()
-            logging.debug(f"Command output: {stdout}")
-            if proc.returncode:
-                raise Exception(stderr)
-            if jsonoutput:
-                return json.loads(stdout)
-            else:
-                return stdout
+        )
     except Exception as e:
         logging.error(str(e))
         raise KartException(str(e))
+    with proc:
+        err = []
+        reader = threading.Thread(target=lambda: err.extend(proc.stderr), daemon=True)
+        reader.start()
+        # os.read returns whatever is available instead of waiting for a full
+        # chunk. Characters split between chunks are completed by the decoder.
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        fd = proc.stdout.fileno()
+        try:
+            for data in iter(partial(os.read, fd, READ_SIZE), b""):
+                text = decoder.decode(data)
+                if text:
+                    yield text
+            text = decoder.decode(b"", final=True)
+            if text:
+                yield text
+        except BaseException:
+            # The consumer stopped early, so there is no point in letting Kart finish
+            proc.kill()
+            raise
+        finally:
+            reader.join()
+            proc.wait()
+        if proc.returncode:
+            stderr = b"".join(err).decode(encoding, errors="replace")
+            logging.error(stderr)
+            raise KartException(stderr)
+
+
+def executeKartJsonStreaming(commands, path=None, key=None):
+    try:
+        yield from iterJsonArray(executeKartStreaming(commands, path), key)
+    except JsonStreamError as e:
+        raise KartException(str(e))
+
+
+def _inBackground(func, *args):
+    if not isMainThread():
+        return func(*args)
+    QApplication.setOverrideCursor(Qt.WaitCursor)
+    try:
+        return runInBackground(func, *args).result()
     finally:
         QApplication.restoreOverrideCursor()
 
 
+def executeKartInBackground(commands, path=None, jsonoutput=False, feedback=None):
+    if feedback is not None and isMainThread():
+        feedback = MainThreadCallback(feedback)
+    return _inBackground(executeKart, commands, path, jsonoutput, feedback)
+
+
+def currentDiffCache():
+    folder = setting(DIFFCACHEFOLDER) or cacheFolder("diffs")
+    size = setting(DIFFCACHESIZE)
+    if size is None:
+        size = DEFAULT_MAX_SIZE_MB
+    return diffCache(folder, size * 1024 * 1024)
+
+
 _repos = None
 
 
@@ -286,7 +506,13 @@ class Repository:
         self.path = path
 
     def executeKart(self, commands, jsonoutput=False):
-        return executeKart(commands, self.path, jsonoutput)
+        return executeKartInBackground(commands, self.path, jsonoutput)
+
+    def queryCache(self):
+        return queryCache(self.path)
+
+    def invalidateQueryCache(self):
+        queryCache(self.path).invalidate()
 
     @staticmethod
     def clone(src, dst, location=None, extent=None):
@@ -301,7 +527,9 @@ class Repository:
 
         with progressBar("Clone") as bar:
             bar.setText("Cloning repository")
-            executeKart(commands, feedback=partial(_processProgressLine, bar))
+            executeKartInBackground(
+                commands, feedback=partial(_processProgressLine, bar)
+            )
 
         return Repository(dst)
 
@@ -345,6 +573,7 @@ class Repository:
         else:
             return None
 
+    @invalidatesQueryCache
     def setSpatialFilter(self, extent=None):
         if extent is not None:
             kartExtent = f"{extent.crs().authid()};{extent.asWktPolygon()}"
@@ -357,12 +586,14 @@ class Repository:
     def isInitialized(self):
         return os.path.exists(os.path.join(self.path, ".kart"))
 
+    @invalidatesQueryCache
     def init(self, location=None):
         if location is not None:
             self.executeKart(["init", "--workingcopy", location])
         else:
             self.executeKart(["init"])
 
+    @invalidatesQueryCache
     def importGpkg(self, path):
         self.executeKart(["import", f"GPKG:{path}"])
 
@@ -381,6 +612,7 @@ class Repository:
         self.executeKart(["config", "--global", "user.name", name])
         self.executeKart(["config", "--global", "user.email", email])
 
+    @invalidatesQueryCache
     def commit(self, msg, dataset=None):
         if self.checkUserConfigured():
             commands = ["commit", "-m", msg]
@@ -391,71 +623,86 @@ class Repository:
         else:
             return False
 
+    @invalidatesQueryCache
     def reset(self, ref="HEAD"):
         self.executeKart(["reset", ref, "-f"])
         self.updateCanvas()
 
-    def log(self, ref="HEAD", dataset=None, featureid=None):
+    def iterLog(self, ref="HEAD", dataset=None, featureid=None, limit=None, skip=0):
+        commands = ["log", "-ojson"]
+        if limit is not None:
+            commands.append(f"--max-count={limit}")
+        if skip:
+            commands.append(f"--skip={skip}")
+        commands.append(ref)
         if dataset is not None:
-            commands = ["log", "-ojson", ref, "--", "--", dataset]
-        else:
-            commands = ["log", "-ojson", ref]
-        ret = self.executeKart(commands)
-        jsonRet = json.loads(ret)
-        log = {c["commit"]: c for c in jsonRet}
-        if dataset is not None:
-            commands = [
-                "log",
-                ref,
-                "--graph",
-                "--format=format:%H%n ",
-                "--",
-                "--",
-                dataset,
-            ]
-        else:
-            commands = ["log", ref, "--graph", "--format=format:%H%n "]
-        logb = self.executeKart(commands)
-        lines = logb.splitlines()
-        lines.insert(0, "")
-        lines.append("")
-        commits = []
-        for i in range(len(log)):
-            commitline = lines[i * 2 + 1]
-            commitid = commitline.split(" ")[-1]
-            log[commitid]["commitColumn"] = (commitline.index("*")) // 2
-            graph = []
-            for j in range(3):
-                graph.append({})
-                for char in [r"\|", "/", r"\\"]:
-                    line = lines[i * 2 + j]
-                    matches = re.finditer(char, line)
-                    positions = [match.start() // 2 for match in matches]
-                    graph[j][char] = positions
-            log[commitid]["graph"] = graph
-            commits.append(log[commitid])
-        return commits
+            if featureid is not None:
+                commands.extend(["--", "--", f"{dataset}:{featureid}"])
+            else:
+                commands.extend(["--", "--", dataset])
+        return executeKartJsonStreaming(commands, self.path)
+
+    def log(
+        self, ref="HEAD", dataset=None, featureid=None, limit=None, skip=0, layout=None
+    ):
+        # Pass the layout used for the previous page when paginating, so the
+        # graph lanes continue across pages
+        if layout is None:
+            layout = GraphLayout(simplify=dataset is not None)
+
+        def _log():
+            # Each commit is laid out as soon as it is parsed, instead of
+            # waiting for the whole output
+            commits = self.iterLog(ref, dataset, featureid, limit, skip)
+            return [layout.add(c) for c in commits]
+
+        return _inBackground(_log)
 
     def datasets(self):
         vectorLayers = []
         tables = []
-        meta = self.executeKart(["meta", "get"], True)
-        for name, dataset in meta.items():
-            crsProps = [k for k in dataset.keys() if k.startswith("crs/")]
-            if crsProps:
+        for name, info in self.metadata().items():
+            if info["crs"] is not None:
                 vectorLayers.append(name)
             else:
                 tables.append(name)
         return vectorLayers, tables
 
+    @cachedQuery
+    def _metadataFromKart(self, ref):
+        return metadataIndex(self.executeKart(["meta", "get", "--ref", ref], True))
+
+    def metadata(self, ref="HEAD"):
+        commit = refs.resolve(self.path, ref)
+        if commit is None:
+            return self._metadataFromKart(ref)
+        store = metadataStore(cacheFolder("metadata"))
+        index = store.get(commit)
+        if index is None:
+            index = self._metadataFromKart(commit)
+            store.set(commit, index)
+        return index
+
+    def datasetInfo(self, dataset, ref="HEAD"):
+        return self.metadata(ref).get(dataset)
+
+    @cachedQuery
     def branches(self):
+        branches = refs.branches(self.path)
+        if branches is not None:
+            return branches
         branches = list(self.executeKart(["branch"], True).values())[0]["branches"]
         return list(b.split("->")[-1].strip() for b in branches.keys())
 
+    @cachedQuery
     def currentBranch(self):
+        branch = refs.currentBranch(self.path)
+        if branch is not None:
+            return branch
         branch = list(self.executeKart(["branch"], True).values())[0]["current"]
         return branch
 
+    @invalidatesQueryCache
     def checkoutBranch(self, branch, force=False):
         if force:
             commands = ["checkout", "--force", branch]
@@ -464,12 +711,15 @@ class Repository:
         self.executeKart(commands)
         self.updateCanvas()
 
+    @invalidatesQueryCache
     def createBranch(self, branch, commit="HEAD"):
         return self.executeKart(["branch", branch, commit])
 
+    @invalidatesQueryCache
     def deleteBranch(self, branch):
         return self.executeKart(["branch", "-d", branch])
 
+    @invalidatesQueryCache
     def mergeBranch(self, branch, msg="", noff=False, ffonly=False):
         commands = ["merge", branch]
         if msg:
@@ -482,61 +732,127 @@ class Repository:
         self.updateCanvas()
         return list(ret.values())[0].get("conflicts", [])
 
+    @invalidatesQueryCache
     def abortMerge(self):
         return self.executeKart(["merge", "--abort"])
 
+    @invalidatesQueryCache
     def continueMerge(self):
         return self.executeKart(["merge", "--continue", "-m", self.mergeMessage()])
 
+    @cachedQuery
     def tags(self):
+        tags = refs.tags(self.path)
+        if tags is not None:
+            return tags
         return self.executeKart(["tag"]).splitlines()
 
+    @invalidatesQueryCache
     def createTag(self, tag, ref):
         return self.executeKart(["tag", tag, ref])
 
+    @invalidatesQueryCache
     def deleteTag(self, tag):
         return self.executeKart(["tag", "-d", tag])
 
-    def diff(self, refa=None, refb=None, dataset=None, featureid=None):
-        changes = {}
-        try:
-            commands = ["diff", "-ogeojson", "--json-style", "extracompact"]
-            if refa and refb:
-                commands.append(f"{refb}...{refa}")
-            elif refa:
-                commands.append(refa)
-            else:
-                commands.append("HEAD")
-            if dataset is not None:
-                if featureid is not None:
-                    commands.append(f"{dataset}:{featureid}")
-                else:
-                    commands.append(dataset)
-            if dataset is not None and featureid is not None:
-                ret = self.executeKart(commands)
-                changes[dataset] = json.loads(ret)["features"]
+    def _diffCommands(self, refa=None, refb=None, dataset=None, featureid=None):
+        commands = ["diff", "-ogeojson", "--json-style", "extracompact"]
+        if refa and refb:
+            commands.append(f"{refb}...{refa}")
+        elif refa:
+            commands.append(refa)
+        else:
+            commands.append("HEAD")
+        if dataset is not None:
+            if featureid is not None:
+                commands.append(f"{dataset}:{featureid}")
             else:
-                tmpdirname = tempfile.TemporaryDirectory()
-                commands.extend(["--output", tmpdirname.name])
-                self.executeKart(commands)
-                for filename in os.listdir(tmpdirname.name):
-                    path = os.path.join(tmpdirname.name, filename)
+                commands.append(dataset)
+        return commands
+
+    def iterDiff(self, refa=None, refb=None, dataset=None, featureid=None):
+        commands = self._diffCommands(refa, refb, dataset, featureid)
+        if dataset is not None and featureid is not None:
+            for feature in executeKartJsonStreaming(commands, self.path, "features"):
+                yield dataset, feature
+        else:
+            with tempfile.TemporaryDirectory() as tmpdirname:
+                commands.extend(["--output", tmpdirname])
+                executeKart(commands, self.path)
+                for filename in os.listdir(tmpdirname):
+                    path = os.path.join(tmpdirname, filename)
                     name = os.path.splitext(filename)[0]
-                    with open(path) as f:
-                        changes[name] = json.load(f)["features"]
-                tmpdirname.cleanup()
-        except Exception:
-            pass
-        return changes
+                    for feature in iterJsonArrayFromFile(path, "features"):
+                        yield name, feature
 
+    def diff(self, refa=None, refb=None, dataset=None, featureid=None):
+        # Returns a DiffStore, which works as a dict with the list of changed
+        # features of each dataset, but keeps them on disk. Diffs between two
+        # commits are cached.
+        cache = None
+        if refa and refb:
+            commita = refs.resolve(self.path, refa)
+            commitb = refs.resolve(self.path, refb)
+            if commita and commitb:
+                cache = currentDiffCache()
+                key = diffKey(commita, commitb, dataset, featureid)
+                store = cache.get(key)
+                if store is not None:
+                    return store
+
+        def _diff():
+            if cache is not None:
+                changes = self.iterDiff(commita, commitb, dataset, featureid)
+                return cache.put(key, changes)
+            store = DiffStore()
+            try:
+                store.addAll(self.iterDiff(refa, refb, dataset, featureid))
+            except Exception:
+                store.close()
+                raise
+            return store
+
+        try:
+            return _inBackground(_diff)
+        except Exception:
+            return {}
+
+    def featureHistory(self, commits, dataset, featureid):
+        # Returns the changes to a feature introduced by each of the given
+        # commits, keyed by commit id, so stepping through its history doesn't
+        # run Kart. Kart 0.10.6 has no command that outputs the versions of a
+        # feature across several commits, so they are all read upfront, in a
+        # single pass with a diff for each commit. The commits should come from
+        # the log of the feature, so there is one for each change. The diffs
+        # run one after another and reuse a Kart worker when enabled.
+        withParents = [c for c in commits if c["parents"]]
+        with progressBar("Feature history") as bar:
+            bar.setText(f"Reading {len(withParents)} versions of the feature")
+            feedback = MainThreadCallback(bar.setValue)
+
+            def _featureHistory():
+                diffs = {}
+                for i, commit in enumerate(withParents):
+                    commands = self._diffCommands(
+                        commit["parents"][0], commit["commit"], dataset, featureid
+                    )
+                    output = json.loads(executeKart(commands, self.path))
+                    diffs[commit["commit"]] = output.get("features", [])
+                    feedback((i + 1) * 100 // len(withParents))
+                return diffs
+
+            return _inBackground(_featureHistory)
+
+    @invalidatesQueryCache
     def restore(self, ref, dataset=None):
         if dataset is not None:
             self.executeKart(["restore", "-s", ref, dataset])
         else:
             self.executeKart(["restore", "-s", ref])
+        self.changeTracker().invalidate()
         self.updateCanvas()
 
-    def changes(self):
+    def _status(self):
         return (
             list(self.executeKart(["status"], True).values())[0]
             .get("workingCopy", {})
@@ -544,6 +860,32 @@ class Repository:
             or {}
         )
 
+    def changeTracker(self):
+        return changeTracker(self.path)
+
+    def workingCopyFile(self):
+        # Returns None for working copies that are not a file, like PostgreSQL
+        path = os.path.join(self.path, self.workingCopyLocation())
+        return path if os.path.isfile(path) else None
+
+    def workingCopyStamp(self):
+        # Changes whenever the repo or the working copy file is modified
+        stamp = repoState(self.path)
+        path = self.workingCopyFile()
+        if path is not None:
+            stamp += (fileStamp(path),)
+        return stamp
+
+    def changes(self):
+        if self.workingCopyFile() is None:
+            # Changes made by other clients of the database can't be detected
+            return self._status()
+        tracker = self.changeTracker()
+        stamp = self.workingCopyStamp()
+        if not tracker.isValid(stamp):
+            tracker.reset(self._status(), stamp)
+        return tracker.changes()
+
     def isWorkingTreeClean(self):
         return not bool(self.changes())
 
@@ -558,38 +900,58 @@ class Repository:
                 msg = f.read()
         return msg
 
-    def conflicts(self):
+    def iterConflicts(self, filters=None):
         commands = ["conflicts", "-ogeojson", "--json-style", "extracompact"]
-        features = json.loads(self.executeKart(commands)).get("features", [])
-        conflicts = {}
-        for feature in features:
-            dataset, elementtype, fid, version = feature["id"].split(":")
-            if elementtype != "feature":
-                raise KartNotSupportedOperationException()
-            if dataset not in conflicts:
-                conflicts[dataset] = {}
-            if fid not in conflicts[dataset]:
-                conflicts[dataset][fid] = {
-                    "ancestor": None,
-                    "theirs": None,
-                    "ours": None,
-                }
-            conflicts[dataset][fid][version] = feature
-        return conflicts
+        if filters:
+            commands.extend(filters)
+        return executeKartJsonStreaming(commands, self.path, "features")
 
+    def conflictVersions(self, label):
+        def _conflictVersions():
+            return list(self.iterConflicts([label]))
+
+        return _inBackground(_conflictVersions)
+
+    def conflicts(self):
+        # Returns a ConflictStore with the ids of the conflicting features in
+        # each dataset. Their versions are fetched when requested.
+        summary = self.executeKart(["conflicts", "-s", "-ojson"], True)
+        try:
+            conflicts = parseConflictSummary(summary)
+        except ConflictsNotSupportedError:
+            raise KartNotSupportedOperationException()
+        return ConflictStore(conflicts, self.conflictVersions)
+
+    def autoMergeConflicts(self, conflicts=None):
+        # Returns the resolutions of the conflicts that can be merged
+        # automatically, and a summary with the number of each kind. The
+        # versions of the rest are kept in the given ConflictStore.
+        def _autoMerge():
+            return autoMerge(self.iterConflicts(), conflicts)
+
+        return _inBackground(_autoMerge)
+
+    @invalidatesQueryCache
     def resolveConflicts(self, resolved):
-        for fid, feature in resolved.items():
-            if feature is not None:
-                fc = {"type": "FeatureCollection", "features": [feature]}
-                tmpfile = tempfile.NamedTemporaryFile("w+t", delete=False)
-                json.dump(fc, tmpfile)
-                tmpfile.close()
-                self.executeKart(["resolve", "--with-file", tmpfile.name, fid])
-                os.unlink(tmpfile.name)
-            else:
-                self.executeKart(["resolve", "--with", "delete", fid])
+        # Resolutions are the name of the version to use for each conflict,
+        # None to delete the feature, or a new feature
+        with progressBar("Resolve conflicts") as bar:
+            bar.setText(f"Resolving {len(resolved)} conflicts")
+            feedback = MainThreadCallback(bar.setValue)
+
+            def _resolve(args):
+                try:
+                    executeKart(["resolve"] + args, self.path)
+                except KartException as e:
+                    # Usage error of Kart versions that take a single label
+                    if "unexpected extra argument" in str(e):
+                        raise MultipleLabelsNotSupportedError(str(e))
+                    raise
+
+            _inBackground(resolveAll, resolved, _resolve, feedback)
         self.updateCanvas()
 
+    @cachedQuery
     def remotes(self):
         remotes = {}
         ret = self.executeKart(["remote", "-v"], False)
@@ -598,9 +960,11 @@ class Repository:
             remotes[name] = url.split(" ")[0]
         return remotes
 
+    @invalidatesQueryCache
     def addRemote(self, name, url):
         self.executeKart(["remote", "add", name, "url"])
 
+    @invalidatesQueryCache
     def removeRemote(self, name):
         self.executeKart(["remote", "remove", name])
 
@@ -610,6 +974,7 @@ class Repository:
         else:
             self.executeKart(["push", remote, branch])
 
+    @invalidatesQueryCache
     def pull(self, remote, branch):
         ret = self.executeKart(["pull", remote, branch])
         self.updateCanvas()
@@ -648,18 +1013,14 @@ class Repository:
             return layer
 
     def workingCopyLayerIdField(self, dataset):
-        schema = self.executeKart(["meta", "get", dataset, "schema.json"], True)[
-            dataset
-        ]["schema.json"]
-        for attr in schema:
-            if attr.get("primaryKeyIndex") == 0:
-                return attr["name"]
+        info = self.datasetInfo(dataset)
+        if info is not None:
+            return info["primaryKey"]
 
     def workingCopyLayerCrs(self, dataset):
-        meta = self.executeKart(["meta", "get", dataset], True)[dataset]
-        for k in meta.keys():
-            if k.startswith("crs/"):
-                return k[4:-4]
+        info = self.datasetInfo(dataset)
+        if info is not None:
+            return info["crs"]
 
     def datasetNameFromLayer(self, layer):
         location = self.workingCopyLocation()
@@ -669,16 +1030,21 @@ class Repository:
         else:
             return layer.source().split("|")[-1].split("=")[-1]
 
+    @invalidatesQueryCache
     def deleteDataset(self, dataset):
         self.executeKart(["data", "rm", "-m", f"Removed dataset {dataset}", dataset])
 
     def createPatch(self, ref, filename):
         self.executeKart(["show", "-ojson", "--output", filename, ref])
 
+    @invalidatesQueryCache
     def applyPatch(self, filename):
         self.executeKart(["apply", "--no-commit", filename])
 
     def updateCanvas(self):
+        if not isMainThread():
+            # Operations run in the background update the canvas when finished
+            return
         for layer in QgsProject.instance().mapLayers().values():
             if self.layerBelongsToRepo(layer):
                 layer.triggerRepaint()
@@ -4,20 +4,22 @@ from functools import partial
 from qgis.utils import iface
 from qgis.core import (
     Qgis,
+    QgsFeatureRequest,
     QgsMapLayer,
     QgsVectorLayer,
-    QgsFeatureRequest,
     QgsRectangle,
     QgsWkbTypes,
 )
 from qgis.gui import QgsMapToolEmitPoint
 
 from qgis.PyQt.QtGui import QIcon
-from qgis.PyQt.QtWidgets import QAction, QInputDialog
+from qgis.PyQt.QtCore import QPoint
+from qgis.PyQt.QtWidgets import QAction, QInputDialog, QMenu
 
 from kart.gui.historyviewer import HistoryDialog
 from kart.gui.diffviewer import DiffViewerDialog
 from kart.gui.featurehistorydialog import FeatureHistoryDialog
+from kart.featureindex import FeatureIndex
 from kart.kartapi import repoForLayer, executeskart
 from kart.utils import setting, AUTOCOMMIT
 
@@ -63,6 +65,8 @@ class LayerTracker:
         self.mapTool = QgsMapToolEmitPoint(iface.mapCanvas())
         self.mapTool.canvasClicked.connect(self.canvasClicked)
         self.mapToolLayer = None
+        # Spatial indexes of the layers used with the map tool, by layer id
+        self.featureIndexes = {}
 
         self.showLogAction = QAction(logIcon, "Show Log...", iface)
         self.showLogAction.triggered.connect(_f(self.showLog))
@@ -129,9 +133,16 @@ class LayerTracker:
         if isinstance(layer, QgsVectorLayer):
             repo = repoForLayer(layer)
             if repo is not None:
+                connections = self.trackEdits(layer, repo)
+                dropIndex = _f(self.dropStaleFeatureIndex, layer, repo)
+                restampIndex = _f(self.restampFeatureIndex, layer, repo)
+                connections.append((layer.beforeCommitChanges, dropIndex))
+                connections.append((layer.afterCommitChanges, restampIndex))
                 func = _f(partial(self.commitLayerChanges, layer))
-                layer.afterCommitChanges.connect(func)
-                self.connected[layer] = func
+                connections.append((layer.afterCommitChanges, func))
+                for signal, slot in connections:
+                    signal.connect(slot)
+                self.connected[layer] = connections
                 iface.addCustomActionForLayer(self.showLogAction, layer)
                 iface.addCustomActionForLayer(self.showWorkingTreeChangesAction, layer)
                 iface.addCustomActionForLayer(
@@ -143,40 +154,146 @@ class LayerTracker:
                 if layer.wkbType() != QgsWkbTypes.NoGeometry:
                     iface.addCustomActionForLayer(self.setMapToolAction, layer)
 
+    def trackEdits(self, layer, repo):
+        # Saved edits are added to the changes known by the change tracker of
+        # the repo. If the tracker was up to date before saving, it still is.
+        tracker = repo.changeTracker()
+        dataset = repo.datasetNameFromLayer(layer)
+        idField = repo.workingCopyLayerIdField(dataset)
+        upToDate = []
+        # Primary keys of the saved features, read before they are deleted
+        keys = {}
+
+        def primaryKeys(fids):
+            if idField is None:
+                return {}
+            fields = layer.fields()
+            request = (
+                QgsFeatureRequest()
+                .setFilterFids(list(fids))
+                .setSubsetOfAttributes([idField], fields)
+                .setFlags(QgsFeatureRequest.NoGeometry)
+            )
+            features = layer.dataProvider().getFeatures(request)
+            return {f.id(): f[idField] for f in features}
+
+        def beforeCommit(*args):
+            if idField is None:
+                # Edits can't be identified, so the status is read again
+                tracker.invalidate()
+            upToDate[:] = [tracker.isValid(repo.workingCopyStamp())]
+            buffer = layer.editBuffer()
+            fids = set(buffer.deletedFeatureIds())
+            fids.update(buffer.changedAttributeValues().keys())
+            fids.update(buffer.changedGeometries().keys())
+            # New features have negative ids until they are saved
+            keys.update(primaryKeys(fid for fid in fids if fid >= 0))
+
+        def afterCommit(*args):
+            if upToDate and upToDate[0]:
+                tracker.restamp(repo.workingCopyStamp())
+            upToDate.clear()
+            keys.clear()
+
+        def featuresAdded(layerId, features):
+            added = primaryKeys(f.id() for f in features)
+            tracker.featuresAdded(dataset, added.values())
+
+        def attributesChanged(layerId, values):
+            tracker.featuresChanged(dataset, [keys[f] for f in values if f in keys])
+
+        def geometriesChanged(layerId, geometries):
+            changed = [keys[f] for f in geometries if f in keys]
+            tracker.featuresChanged(dataset, changed)
+
+        def featuresRemoved(layerId, fids):
+            tracker.featuresRemoved(dataset, [keys[f] for f in fids if f in keys])
+
+        return [
+            (layer.beforeCommitChanges, beforeCommit),
+            (layer.committedFeaturesAdded, featuresAdded),
+            (layer.committedAttributeValuesChanges, attributesChanged),
+            (layer.committedGeometriesChanges, geometriesChanged),
+            (layer.committedFeaturesRemoved, featuresRemoved),
+            (layer.afterCommitChanges, afterCommit),
+        ]
+
     def setMapTool(self):
         layer, repo = self._kartActiveLayerAndRepo()
         if layer is not None:
             iface.mapCanvas().setMapTool(self.mapTool)
             self.mapToolLayer = layer
             self.mapToolRepo = repo
+            # Built now, so it's likely ready by the first click
+            self.featureIndex(layer, repo)
+
+    def featureIndex(self, layer, repo):
+        # Edits made in the layer are updated in the index, but it is built
+        # again if the working copy was changed in other ways, like by Kart
+        index = self.featureIndexes.get(layer.id())
+        stamp = repo.workingCopyStamp()
+        if index is None or index.stamp != stamp:
+            if index is not None:
+                index.disconnect()
+            dataset = repo.datasetNameFromLayer(layer)
+            idField = repo.workingCopyLayerIdField(dataset)
+            index = FeatureIndex(layer, idField, stamp)
+            self.featureIndexes[layer.id()] = index
+        return index
+
+    def dropStaleFeatureIndex(self, layer, repo):
+        index = self.featureIndexes.get(layer.id())
+        if index is not None and index.stamp != repo.workingCopyStamp():
+            index.disconnect()
+            del self.featureIndexes[layer.id()]
+
+    def restampFeatureIndex(self, layer, repo):
+        # Saved edits are already in the index
+        index = self.featureIndexes.get(layer.id())
+        if index is not None:
+            index.stamp = repo.workingCopyStamp()
 
     def canvasClicked(self, pt, btn):
         searchRadius = iface.mapCanvas().extent().width() * 0.005
         r = QgsRectangle(pt, pt)
         r.grow(searchRadius)
         r = self.mapTool.toLayerCoordinates(self.mapToolLayer, r)
+        point = self.mapTool.toLayerCoordinates(self.mapToolLayer, pt)
 
-        feats = self.mapToolLayer.getFeatures(
-            QgsFeatureRequest()
-            .setFilterRect(r)
-            .setFlags(QgsFeatureRequest.ExactIntersect)
-        )
-        dataset = self.mapToolRepo.datasetNameFromLayer(self.mapToolLayer)
-        idField = self.mapToolRepo.workingCopyLayerIdField(dataset)
-        try:
-            feature = next(feats)
-            fid = feature[idField]
-            history = self.mapToolRepo.log(dataset=dataset, featureid=fid)
-            dlg = FeatureHistoryDialog(
-                history, self.mapToolLayer, dataset, fid, self.mapToolRepo
-            )
-            dlg.exec()
-        except StopIteration:
+        index = self.featureIndex(self.mapToolLayer, self.mapToolRepo)
+        fids = index.nearest(point, r.width() / 2)
+        if not fids:
             iface.pushMessage(
                 "Kart",
                 "No feature was found at the selected point.",
                 level=Qgis.Warning,
             )
+            return
+        keys = index.primaryKeys(fids)
+        if len(fids) > 1:
+            fid = self.chooseFeature([keys[f] for f in fids if f in keys], pt)
+        else:
+            fid = keys.get(fids[0])
+        if fid is None:
+            return
+        dataset = self.mapToolRepo.datasetNameFromLayer(self.mapToolLayer)
+        history = self.mapToolRepo.log(dataset=dataset, featureid=fid)
+        dlg = FeatureHistoryDialog(
+            history, self.mapToolLayer, dataset, fid, self.mapToolRepo
+        )
+        dlg.exec()
+
+    def chooseFeature(self, keys, pt):
+        # For features at the same distance from the clicked point
+        menu = QMenu()
+        for key in keys:
+            action = menu.addAction(f"Feature {key}")
+            action.setData(key)
+        canvas = iface.mapCanvas()
+        pixel = canvas.getCoordinateTransform().transform(pt)
+        action = menu.exec_(canvas.mapToGlobal(QPoint(int(pixel.x()), int(pixel.y()))))
+        if action is not None:
+            return action.data()
 
     @executeskart
     def showLog(self):
@@ -191,7 +308,10 @@ class LayerTracker:
         layer, repo = self._kartActiveLayerAndRepo()
         if layer is not None:
             dataset = repo.datasetNameFromLayer(layer)
-            changes = repo.diff(dataset=dataset)
+            if repo.changes().get(dataset):
+                changes = repo.diff(dataset=dataset)
+            else:
+                changes = {}
             if changes.get(dataset):
                 dialog = DiffViewerDialog(iface.mainWindow(), changes, repo)
                 dialog.exec()
@@ -240,13 +360,25 @@ class LayerTracker:
                     "Commit", "Nothing to commit", level=Qgis.Warning
                 )
 
-    def layerRemoved(self, layer):
-        pass
+    def layerRemoved(self, layerId):
+        # Called before the layer is deleted, so it can still be disconnected
+        index = self.featureIndexes.pop(layerId, None)
+        if index is not None:
+            index.disconnect()
+        for layer in list(self.connected):
+            if layer.id() == layerId:
+                for signal, slot in self.connected.pop(layer):
+                    signal.disconnect(slot)
+        if self.mapToolLayer is not None and self.mapToolLayer.id() == layerId:
+            iface.mapCanvas().unsetMapTool(self.mapTool)
+            self.mapToolLayer = None
+            self.mapToolRepo = None
 
     @executeskart
     def commitLayerChanges(self, layer):
         repo = repoForLayer(layer)
         if repo is not None:
+            repo.invalidateQueryCache()
             auto = setting(AUTOCOMMIT)
             if auto:
                 dataset = repo.datasetNameFromLayer(layer)
@@ -256,5 +388,9 @@ class LayerTracker:
                 )
 
     def disconnectLayers(self):
-        for layer, f in self.connected.items():
-            layer.afterCommitChanges.disconnect(f)
+        for layer, connections in self.connected.items():
+            for signal, slot in connections:
+                signal.disconnect(slot)
+        for index in self.featureIndexes.values():
+            index.disconnect()
+        self.featureIndexes = {}
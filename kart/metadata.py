@@ -0,0 +1,127 @@
+import copy
+import json
+import os
+import tempfile
+import threading
+
+from kart.cache import LRUCache
+
+# Index of the metadata of the datasets in a commit, built from the output of
+# a single 'kart meta get' call. Commits are immutable, so entries are keyed by
+# commit id and kept on disk, to be reused across sessions and repositories.
+# When there are more files than the limit, the least recently used ones are
+# removed.
+
+MAX_CACHED_COMMITS = 64
+MAX_STORED_COMMITS = 1000
+EXTENSION = ".json"
+
+
+def datasetInfo(meta):
+    info = {
+        "primaryKey": None,
+        "crs": None,
+        "geometryField": None,
+        "geometryType": None,
+        "fields": [],
+    }
+    for attr in meta.get("schema.json", []):
+        info["fields"].append({"name": attr["name"], "dataType": attr.get("dataType")})
+        if attr.get("primaryKeyIndex") == 0:
+            info["primaryKey"] = attr["name"]
+        if attr.get("dataType") == "geometry" and info["geometryField"] is None:
+            info["geometryField"] = attr["name"]
+            info["geometryType"] = attr.get("geometryType")
+    for k in meta.keys():
+        if k.startswith("crs/"):
+            info["crs"] = k[4:-4]
+            break
+    return info
+
+
+def metadataIndex(meta):
+    return {name: datasetInfo(dataset) for name, dataset in meta.items()}
+
+
+class MetadataStore:
+    def __init__(self, folder, maxSize=MAX_CACHED_COMMITS, maxFiles=MAX_STORED_COMMITS):
+        self.folder = folder
+        self.maxFiles = maxFiles
+        self.entries = LRUCache(maxSize)
+        self._lock = threading.Lock()
+
+    def _filename(self, commit):
+        return os.path.join(self.folder, commit + EXTENSION)
+
+    def get(self, commit):
+        # Returns a copy, so callers can't modify the cached index
+        index = self.entries.get(commit)
+        if index is not None:
+            return copy.deepcopy(index)
+        path = self._filename(commit)
+        try:
+            with open(path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            # Used files are the most recent ones when evicting
+            os.utime(path)
+        except OSError:
+            pass
+        self.entries.set(commit, index)
+        return copy.deepcopy(index)
+
+    def set(self, commit, index):
+        self.entries.set(commit, copy.deepcopy(index))
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            # Write to a temporary file first, so a partially written index is
+            # never read
+            fd, tmpname = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(tmpname, self._filename(commit))
+        except OSError:
+            # The index is still available in memory for this session
+            return
+        self.evict()
+
+    def _files(self):
+        files = []
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return files
+        for name in names:
+            if name.endswith(EXTENSION):
+                try:
+                    mtime = os.stat(os.path.join(self.folder, name)).st_mtime
+                except OSError:
+                    continue
+                files.append((mtime, name))
+        return files
+
+    def evict(self):
+        with self._lock:
+            files = sorted(self._files())
+            for mtime, name in files[: max(0, len(files) - self.maxFiles)]:
+                try:
+                    os.remove(os.path.join(self.folder, name))
+                except OSError:
+                    pass
+
+    def clear(self):
+        self.entries.clear()
+
+
+_stores = {}
+_storesLock = threading.Lock()
+
+
+def metadataStore(folder):
+    key = os.path.normcase(os.path.abspath(folder))
+    with _storesLock:
+        if key not in _stores:
+            _stores[key] = MetadataStore(folder)
+        return _stores[key]
@@ -9,7 +9,8 @@ from qgis.PyQt.QtGui import QIcon
 
 from kart.gui.dockwidget import KartDockWidget
 from kart.gui.settingsdialog import SettingsDialog
-from kart.kartapi import checkKartInstalled, kartVersionDetails
+from kart.kartapi import checkKartInstalled, kartVersionDetails, currentDiffCache
+from kart.workers import closeWorkers
 from kart.layers import LayerTracker
 
 pluginPath = os.path.dirname(__file__)
@@ -73,6 +74,11 @@ class KartPlugin(object):
         pluginVersion = self.pluginVersion()
         kartVersion = kartVersionDetails().replace("\n", "<br>")
         qgisVersion = Qgis.QGIS_VERSION
+        stats = currentDiffCache().stats()
+        diffCacheDetails = (
+            f"{stats['entries']} diffs, {stats['size'] / (1024 * 1024):.1f} MB<br>"
+            f"{stats['hits']} hits, {stats['misses']} misses in this session"
+        )
         html = (
             "<style>body, "
             "table {padding:0px; margin:0px; font-family:verdana; font-size: 1.1em;}"
@@ -81,6 +87,7 @@ class KartPlugin(object):
             f"<h3>QGIS version</h3> <p>{qgisVersion}</p>"
             f"<h3>Kart version details</h3> <p>{kartVersion}</p>"
             f"<h3>Plugin version</h3> <p>{pluginVersion}</p>"
+            f"<h3>Diff cache</h3> <p>{diffCacheDetails}</p>"
             "</td></tr></table>"
             "</body>"
         )
@@ -98,3 +105,5 @@ class KartPlugin(object):
 
         QgsProject.instance().layerWillBeRemoved.disconnect(self.tracker.layerRemoved)
         QgsProject.instance().layerWasAdded.disconnect(self.tracker.layerAdded)
+
+        closeWorkers()
@@ -0,0 +1,124 @@
+import os
+import re
+
+# Reads HEAD and refs straight from the .kart folder of a repository, so the
+# most common queries don't need a Kart process. All functions return None
+# when the answer cannot be determined from the files alone, in which case
+# the caller should ask Kart instead.
+
+_OID = re.compile(r"^[0-9a-f]{40}$")
+
+HEADS = "refs/heads/"
+TAGS = "refs/tags/"
+
+
+def kartFolder(path):
+    return os.path.join(path, ".kart")
+
+
+def _readFile(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def isOid(ref):
+    return bool(_OID.match(ref or ""))
+
+
+def head(path):
+    # Returns the ref that HEAD points to, or the commit id if detached
+    content = _readFile(os.path.join(kartFolder(path), "HEAD"))
+    if content is None:
+        return None
+    if content.startswith("ref:"):
+        return content[4:].strip()
+    if isOid(content):
+        return content
+    return None
+
+
+def packedRefs(path):
+    refs = {}
+    content = _readFile(os.path.join(kartFolder(path), "packed-refs"))
+    if content is None:
+        return refs
+    for line in content.splitlines():
+        if not line or line.startswith("#") or line.startswith("^"):
+            continue
+        tokens = line.split(" ", 1)
+        if len(tokens) == 2 and isOid(tokens[0]):
+            refs[tokens[1]] = tokens[0]
+    return refs
+
+
+def looseRefs(path, prefix):
+    refs = {}
+    folder = os.path.join(kartFolder(path), *prefix.strip("/").split("/"))
+    for root, dirs, files in os.walk(folder):
+        for name in files:
+            if name.endswith(".lock"):
+                continue
+            filepath = os.path.join(root, name)
+            oid = _readFile(filepath)
+            if isOid(oid):
+                relpath = os.path.relpath(filepath, folder).replace(os.sep, "/")
+                refs[prefix + relpath] = oid
+    return refs
+
+
+def allRefs(path, prefix):
+    if not os.path.isdir(kartFolder(path)):
+        return None
+    refs = {k: v for k, v in packedRefs(path).items() if k.startswith(prefix)}
+    # Loose refs take precedence over packed ones
+    refs.update(looseRefs(path, prefix))
+    return refs
+
+
+def _names(path, prefix):
+    refs = allRefs(path, prefix)
+    if refs is None:
+        return None
+    return sorted(ref[len(prefix) :] for ref in refs)
+
+
+def branches(path):
+    return _names(path, HEADS)
+
+
+def tags(path):
+    return _names(path, TAGS)
+
+
+def currentBranch(path):
+    ref = head(path)
+    if ref is None or not ref.startswith(HEADS):
+        # Detached HEAD or unreadable repository, let Kart decide
+        return None
+    if resolve(path, ref) is None:
+        # Branch without commits yet
+        return None
+    return ref[len(HEADS) :]
+
+
+def resolve(path, ref="HEAD"):
+    # Returns the commit id for HEAD, a branch or a commit id. Tags might be
+    # annotated and can't be peeled without reading objects, so they are left
+    # to Kart.
+    if isOid(ref):
+        return ref
+    if ref == "HEAD":
+        ref = head(path)
+        if ref is None or isOid(ref):
+            return ref
+    if not ref.startswith("refs/"):
+        ref = HEADS + ref
+    if not ref.startswith(HEADS):
+        return None
+    oid = _readFile(os.path.join(kartFolder(path), *ref.split("/")))
+    if oid is None:
+        oid = packedRefs(path).get(ref)
+    return oid if isOid(oid) else None
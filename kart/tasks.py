@@ -0,0 +1,150 @@
+import threading
+
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    QEventLoop,
+    QObject,
+    QRunnable,
+    QThread,
+    QThreadPool,
+    pyqtSignal,
+)
+
+MAX_THREADS = 4
+
+_threadPool = None
+_pending = set()
+_pendingLock = threading.Lock()
+# Number of commands the GUI is waiting for, or that must not overlap with
+# others. User actions are not started while there are any.
+_busy = 0
+
+
+def threadPool():
+    global _threadPool
+    if _threadPool is None:
+        _threadPool = QThreadPool()
+        _threadPool.setMaxThreadCount(MAX_THREADS)
+    return _threadPool
+
+
+def isMainThread():
+    app = QCoreApplication.instance()
+    return app is None or QThread.currentThread() == app.thread()
+
+
+def isBusy():
+    return _busy > 0
+
+
+def _setBusy(busy):
+    global _busy
+    _busy += 1 if busy else -1
+
+
+class KartFuture(QObject):
+
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        self._event = threading.Event()
+        self._result = None
+        self._exception = None
+
+    def _setResult(self, result):
+        self._result = result
+        self._event.set()
+        self.finished.emit(result)
+
+    def _setException(self, exception):
+        self._exception = exception
+        self._event.set()
+        self.failed.emit(exception)
+
+    def done(self):
+        return self._event.is_set()
+
+    def result(self):
+        if not self.done():
+            if isMainThread():
+                # Keep the GUI painted while waiting, but don't process user
+                # input, so no other action can start or close the window that
+                # is waiting
+                loop = QEventLoop()
+                self.finished.connect(loop.quit)
+                self.failed.connect(loop.quit)
+                if not self.done():
+                    _setBusy(True)
+                    try:
+                        loop.exec_(QEventLoop.ExcludeUserInputEvents)
+                    finally:
+                        _setBusy(False)
+            self._event.wait()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+class KartRunnable(QRunnable):
+    def __init__(self, future, func, args, kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.future = future
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        try:
+            result = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            self.future._setException(e)
+        else:
+            self.future._setResult(result)
+        finally:
+            with _pendingLock:
+                _pending.discard(self)
+
+
+def runExclusive(future):
+    # Marks the GUI as busy until a command running in the background finishes
+    _setBusy(True)
+    done = []
+
+    def release(result):
+        if not done:
+            done.append(True)
+            _setBusy(False)
+
+    future.finished.connect(release)
+    future.failed.connect(release)
+    if future.done():
+        release(None)
+    return future
+
+
+def runInBackground(func, *args, **kwargs):
+    future = KartFuture()
+    runnable = KartRunnable(future, func, args, kwargs)
+    with _pendingLock:
+        _pending.add(runnable)
+    threadPool().start(runnable)
+    return future
+
+
+class MainThreadCallback(QObject):
+
+    called = pyqtSignal(object)
+
+    def __init__(self, func):
+        super().__init__()
+        self.func = func
+        self.called.connect(self._call)
+
+    def _call(self, args):
+        self.func(*args)
+
+    def __call__(self, *args):
+        self.called.emit(args)
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import time
+import unittest
+
+from kart.cache import (
+    LRUCache,
+    QueryCache,
+    queryCache,
+    cachedQuery,
+    invalidatesQueryCache,
+)
+
+
+def createKartFolder(path):
+    os.makedirs(os.path.join(path, ".kart", "refs", "heads"))
+    with open(os.path.join(path, ".kart", "HEAD"), "w") as f:
+        f.write("ref: refs/heads/main\n")
+
+
+def touch(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+    # Make sure the change is visible even on filesystems with coarse mtimes
+    future = time.time() + 10
+    os.utime(path, (future, future))
+
+
+class FakeRepo:
+    def __init__(self, path):
+        self.path = path
+        self.calls = 0
+
+    @cachedQuery
+    def branches(self, prefix=""):
+        self.calls += 1
+        return [f"{prefix}main"]
+
+    @invalidatesQueryCache
+    def createBranch(self, name):
+        pass
+
+
+class TestLRUCache(unittest.TestCase):
+    def testEviction(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert "b" not in cache
+        assert "a" in cache
+        assert "c" in cache
+
+    def testStats(self):
+        cache = LRUCache()
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("b")
+        assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        createKartFolder(self.folder.name)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def testInvalidatedByHeadChange(self):
+        cache = QueryCache(self.folder.name)
+        cache.set("key", "value")
+        assert cache.get("key") == "value"
+        touch(os.path.join(self.folder.name, ".kart", "HEAD"), "ref: refs/heads/b\n")
+        assert cache.get("key") is None
+
+    def testInvalidatedByNewRef(self):
+        cache = QueryCache(self.folder.name)
+        assert cache.get("key") is None
+        cache.set("key", "value")
+        heads = os.path.join(self.folder.name, ".kart", "refs", "heads")
+        touch(os.path.join(heads, "newbranch"), "0" * 40)
+        future = time.time() + 20
+        os.utime(heads, (future, future))
+        assert cache.get("key") is None
+
+    def testSharedPerRepository(self):
+        assert queryCache(self.folder.name) is queryCache(self.folder.name + os.sep)
+
+    def testCachedQuery(self):
+        repo = FakeRepo(self.folder.name)
+        assert repo.branches() == ["main"]
+        assert repo.branches() == ["main"]
+        assert repo.calls == 1
+        assert repo.branches(prefix="x") == ["xmain"]
+        assert repo.calls == 2
+        repo.branches().append("modified")
+        assert repo.branches() == ["main"]
+        repo.createBranch("new")
+        assert repo.branches() == ["main"]
+        assert repo.calls == 3
+        stats = queryCache(self.folder.name).stats()
+        assert stats["hits"] == 3
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+from kart.changetracker import ChangeTracker, changeTracker, fileStamp
+
+STATUS = {"layer": {"feature": {"updates": 2}}}
+
+
+class TestChangeTracker(unittest.TestCase):
+    def testBaseline(self):
+        tracker = ChangeTracker()
+        assert tracker.changes() is None
+        assert tracker.isClean() is None
+        assert not tracker.isValid("a")
+        tracker.reset(STATUS, "a")
+        assert tracker.isValid("a")
+        assert not tracker.isValid("b")
+        assert tracker.changes() == STATUS
+        assert tracker.isClean() is False
+        tracker.reset({}, "b")
+        assert tracker.isClean()
+        tracker.invalidate()
+        assert not tracker.isValid("b")
+
+    def testEdits(self):
+        tracker = ChangeTracker()
+        tracker.reset(STATUS, "a")
+        tracker.featuresAdded("table", [10, 11])
+        tracker.featuresChanged("table", [10, 1])
+        tracker.featuresRemoved("table", [11, 1, 2])
+        tracker.featuresChanged("other", [5])
+        changes = tracker.changes()
+        assert changes["layer"] == STATUS["layer"]
+        assert changes["table"]["feature"] == {"inserts": 1, "deletes": 2}
+        assert changes["other"]["feature"] == {"updates": 1}
+        # The baseline itself is not modified
+        assert tracker.baseline == STATUS
+        assert tracker.datasetChanges("missing") is None
+        tracker.restamp("b")
+        assert tracker.isValid("b")
+        assert tracker.changes() == changes
+        tracker.reset({}, "c")
+        assert tracker.isClean()
+
+    def testDeletedAndAdded(self):
+        tracker = ChangeTracker()
+        tracker.reset({}, "a")
+        tracker.featuresRemoved("table", ["1"])
+        tracker.featuresAdded("table", ["1"])
+        assert tracker.datasetChanges("table") == {"feature": {"updates": 1}}
+
+    def testEditsToChangedDataset(self):
+        # Features changed in the baseline are not known, so edits to the same
+        # dataset can't be counted
+        tracker = ChangeTracker()
+        tracker.reset(STATUS, "a")
+        tracker.featuresChanged("layer", [1])
+        assert not tracker.isValid("a")
+        assert tracker.changes() is None
+
+    def testFileStamp(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            stamp = fileStamp(path)
+            assert stamp[1] is None
+            with open(path, "w") as f:
+                f.write("changed")
+            assert fileStamp(path) != stamp
+        finally:
+            os.remove(path)
+
+    def testRegistry(self):
+        folder = tempfile.gettempdir()
+        assert changeTracker(folder) is changeTracker(os.path.join(folder, "."))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,261 @@
+import gc
+import json
+import os
+import time
+import unittest
+
+from kart.conflicts import (
+    ANCESTOR,
+    ATTRIBUTES,
+    GEOMETRY_AND_ATTRIBUTES,
+    IDENTICAL,
+    ONE_SIDED,
+    OURS,
+    THEIRS,
+    UNRESOLVED,
+    autoMerge,
+    mergeConflict,
+    ConflictStore,
+    ConflictsNotSupportedError,
+    MultipleLabelsNotSupportedError,
+    conflictVersions,
+    groupResolutions,
+    labelBatches,
+    parseConflictSummary,
+    resolveAll,
+)
+
+# Timing tests are only run when KART_BENCHMARK is set, since their results
+# depend on the machine and its load
+BENCHMARK = bool(os.environ.get("KART_BENCHMARK"))
+
+
+def label(i):
+    return f"layer:feature:{i}"
+
+
+def resolutions(n):
+    strategies = [OURS, THEIRS, ANCESTOR, None]
+    return {label(i): strategies[i % 4] for i in range(n)}
+
+
+class Resolver:
+    def __init__(self, multiple=True):
+        self.multiple = multiple
+        self.calls = []
+        self.files = []
+
+    def __call__(self, args):
+        labels = args[2:]
+        if len(labels) > 1 and not self.multiple:
+            raise MultipleLabelsNotSupportedError("Got unexpected extra arguments")
+        if args[0] == "--with-file":
+            with open(args[1]) as f:
+                self.files.append(json.load(f))
+        self.calls.append(args)
+
+
+def version(label, name):
+    return {"type": "Feature", "id": f"{label}:{name}", "geometry": None}
+
+
+POINT = {"type": "Point", "coordinates": [0, 0]}
+MOVED = {"type": "Point", "coordinates": [1, 1]}
+
+
+def versions(ancestor, ours, theirs, fid=1):
+    # Each version is (properties, geometry), or None if it's missing
+    features = []
+    for name, value in [(ANCESTOR, ancestor), (OURS, ours), (THEIRS, theirs)]:
+        if value is not None:
+            feature = version(label(fid), name)
+            feature["properties"], feature["geometry"] = value
+            features.append(feature)
+    return features
+
+
+class TestConflicts(unittest.TestCase):
+    def testMergeConflict(self):
+        def merge(*args):
+            return mergeConflict(label(1), conflictVersions(versions(*args)))
+
+        base = ({"a": 1, "b": 1}, POINT)
+        changed = ({"a": 2, "b": 1}, POINT)
+        kind, merged = merge(base, changed, ({"a": 1, "b": 3}, POINT))
+        assert kind == ATTRIBUTES
+        assert merged["properties"] == {"a": 2, "b": 3}
+        assert merged["geometry"] == POINT
+        assert merged["id"] == label(1)
+        kind, merged = merge(base, changed, ({"a": 1, "b": 1}, MOVED))
+        assert kind == GEOMETRY_AND_ATTRIBUTES
+        assert merged["properties"] == {"a": 2, "b": 1}
+        assert merged["geometry"] == MOVED
+        assert merge(base, changed, changed) == (IDENTICAL, OURS)
+        assert merge(base, base, changed) == (ONE_SIDED, THEIRS)
+        assert merge(base, changed, base) == (ONE_SIDED, OURS)
+        assert merge(base, changed, ({"a": 3, "b": 1}, POINT)) == (UNRESOLVED, None)
+        assert merge(base, changed, None) == (UNRESOLVED, None)
+        # A property added on one side
+        kind, merged = merge(base, ({"a": 1, "b": 1, "c": 1}, POINT), changed)
+        assert merged["properties"] == {"a": 2, "b": 1, "c": 1}
+
+    def testAutoMerge(self):
+        base = ({"a": 1, "b": 1}, POINT)
+        changed = ({"a": 2, "b": 1}, POINT)
+        features = versions(base, changed, ({"a": 1, "b": 2}, POINT), 1)
+        features += versions(base, changed, ({"a": 3, "b": 1}, POINT), 2)
+        features += versions(base, ({"a": 1, "b": 1}, MOVED), changed, 3)
+        resolved, summary = autoMerge(features)
+        assert sorted(resolved) == [label(1), label(3)]
+        assert resolved[label(3)]["geometry"] == MOVED
+        assert summary[ATTRIBUTES] == 1
+        assert summary[GEOMETRY_AND_ATTRIBUTES] == 1
+        assert summary[UNRESOLVED] == 1
+        # Versions of a conflict that are not together are left to the user
+        features.append(version(label(1), THEIRS))
+        resolved, summary = autoMerge(features)
+        assert sorted(resolved) == [label(3)]
+        assert summary[ATTRIBUTES] == 0
+        assert summary[UNRESOLVED] == 2
+        resolved, summary = autoMerge([])
+        assert resolved == {}
+        assert not any(summary.values())
+
+    def testAutoMergeSeedsStore(self):
+        def fetch(conflictLabel):
+            raise AssertionError("Versions should not be fetched again")
+
+        base = ({"a": 1}, POINT)
+        features = versions(base, ({"a": 2}, POINT), ({"a": 3}, POINT), 1)
+        features += versions(base, ({"a": 2}, POINT), base, 2)
+        store = ConflictStore({"layer": ["1", "2"]}, fetch)
+        resolved, summary = autoMerge(features, store)
+        assert list(resolved) == [label(2)]
+        remaining = store.exclude(resolved)
+        assert remaining.versions("layer", "1")[THEIRS]["properties"] == {"a": 3}
+
+    def testParseConflictSummary(self):
+        summary = {"kart.conflicts/v1": {"layer": {"feature": [1, 2]}, "table": {}}}
+        assert parseConflictSummary(summary) == {"layer": ["1", "2"]}
+        assert parseConflictSummary({"kart.conflicts/v1": {}}) == {}
+        summary = {"kart.conflicts/v1": {"layer": {"meta": ["schema.json"]}}}
+        with self.assertRaises(ConflictsNotSupportedError):
+            parseConflictSummary(summary)
+
+    def testConflictVersions(self):
+        features = [version(label(1), ANCESTOR), version(label(1), OURS)]
+        versions = conflictVersions(features)
+        assert versions[ANCESTOR] == features[0]
+        assert versions[OURS] == features[1]
+        assert versions[THEIRS] is None
+
+    def testConflictStore(self):
+        fetched = []
+
+        def fetch(conflictLabel):
+            fetched.append(conflictLabel)
+            return [version(conflictLabel, v) for v in [ANCESTOR, OURS, THEIRS]]
+
+        conflicts = {"layer": [str(i) for i in range(100000)]}
+        store = ConflictStore(conflicts, fetch, maxSize=2)
+        assert len(store) == 100000
+        assert store
+        assert not ConflictStore({}, fetch)
+        assert not fetched
+        versions = store.versions("layer", "1")
+        assert versions[THEIRS]["id"] == f"{label(1)}:theirs"
+        assert store.versions("layer", "1") == versions
+        assert fetched == [label(1)]
+        store.versions("layer", "2")
+        store.versions("layer", "3")
+        store.versions("layer", "1")
+        # Only the most recently used conflicts are kept
+        assert fetched == [label(1), label(2), label(3), label(1)]
+        assert len(store.cache) == 2
+        remaining = store.exclude([label(i) for i in range(1, 100000)])
+        assert remaining.conflicts == {"layer": ["0"]}
+        assert remaining.versions("layer", "1") == versions
+        assert not store.exclude([label(i) for i in range(100000)])
+
+    def testGroupResolutions(self):
+        feature = {"type": "Feature", "properties": {}, "geometry": None}
+        resolved = {"a": OURS, "b": None, "c": feature, "d": OURS}
+        groups, features = groupResolutions(resolved)
+        assert groups[OURS] == ["a", "d"]
+        assert groups["delete"] == ["b"]
+        assert groups[THEIRS] == []
+        assert features == [("c", feature)]
+
+    def testLabelBatches(self):
+        labels = [label(i) for i in range(1000)]
+        batches = list(labelBatches(labels, 1000))
+        assert sum(batches, []) == labels
+        assert all(len(" ".join(b)) < 1000 for b in batches)
+        assert list(labelBatches([])) == []
+
+    def testResolveAll(self):
+        feature = {"type": "Feature", "properties": {"a": 1}, "geometry": None}
+        resolved = resolutions(8)
+        resolved["layer:feature:new"] = feature
+        resolver = Resolver()
+        progress = []
+        calls = resolveAll(resolved, resolver, progress.append)
+        assert calls == 5
+        assert resolver.calls[0] == ["--with", OURS, label(0), label(4)]
+        assert resolver.calls[3] == ["--with", "delete", label(3), label(7)]
+        assert resolver.calls[4][2] == "layer:feature:new"
+        assert resolver.files == [{"type": "FeatureCollection", "features": [feature]}]
+        assert progress[-1] == 100
+        assert progress == sorted(progress)
+
+    def testSingleLabelFallback(self):
+        resolver = Resolver(multiple=False)
+        calls = resolveAll(resolutions(8), resolver)
+        assert calls == 8
+        assert sorted(args[2] for args in resolver.calls) == sorted(
+            label(i) for i in range(8)
+        )
+
+    def testOtherErrors(self):
+        def failing(args):
+            raise ValueError("Kart failed")
+
+        with self.assertRaises(ValueError):
+            resolveAll(resolutions(8), failing)
+
+    def testBatchedCalls(self):
+        n = 20000
+        resolver = Resolver()
+        calls = resolveAll(resolutions(n), resolver)
+        assert sum(len(args) - 2 for args in resolver.calls) == n
+        # A call for each batch of labels, instead of one for each conflict
+        assert calls < n / 100
+
+    @unittest.skipUnless(BENCHMARK, "KART_BENCHMARK is not set")
+    def testScaling(self):
+        size = 250000
+        # Both with batches and resolving one conflict in each call, as Kart
+        # 0.10.6 requires
+        for multiple in [True, False]:
+            timings = []
+            for n in [size, size * 4]:
+                resolved = resolutions(n)
+                best = None
+                for i in range(3):
+                    resolver = Resolver(multiple)
+                    gc.disable()
+                    try:
+                        start = time.perf_counter()
+                        resolveAll(resolved, resolver)
+                        elapsed = time.perf_counter() - start
+                    finally:
+                        gc.enable()
+                    best = elapsed if best is None else min(best, elapsed)
+                timings.append(best)
+                assert sum(len(args) - 2 for args in resolver.calls) == n
+            # Linear growth would be a ratio of 4, quadratic growth 16
+            assert timings[1] / timings[0] < 8
+
+
+if __name__ == "__main__":
+    unittest.main()
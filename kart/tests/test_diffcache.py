@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from kart.diffcache import DiffCache, diffCache, diffKey
+
+
+def changes(n, dataset="layer"):
+    return [
+        (dataset, {"id": f"I::{i}", "geometry": None, "properties": {"v": "x" * 100}})
+        for i in range(n)
+    ]
+
+
+class TestDiffCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = DiffCache(self.folder, 1024 * 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def testDiffKey(self):
+        key = diffKey("a" * 40, "b" * 40)
+        assert key == diffKey("a" * 40, "b" * 40)
+        assert key != diffKey("b" * 40, "a" * 40)
+        assert key != diffKey("a" * 40, "b" * 40, "layer")
+        assert diffKey("a", "b", "layer") != diffKey("a", "b", "layer", "1")
+
+    def testGetPut(self):
+        key = diffKey("a", "b")
+        assert self.cache.get(key) is None
+        store = self.cache.put(key, changes(10))
+        assert len(store["layer"]) == 10
+        store.close()
+        store = self.cache.get(key)
+        assert store is not None
+        assert [f["id"] for f in store["layer"]][:2] == ["I::0", "I::1"]
+        store.close()
+        stats = self.cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
+        assert stats["size"] > 0
+        assert not [f for f in os.listdir(self.folder) if f.endswith(".tmp")]
+
+    def testFailedPut(self):
+        def failing():
+            yield from changes(10)
+            raise ValueError("Kart failed")
+
+        with self.assertRaises(ValueError):
+            self.cache.put(diffKey("a", "b"), failing())
+        assert os.listdir(self.folder) == []
+
+    def testEviction(self):
+        keys = [diffKey("a", str(i)) for i in range(4)]
+        for i, key in enumerate(keys):
+            self.cache.put(key, changes(100)).close()
+            os.utime(self.cache._path(key), (i, i))
+        self.cache.get(keys[0]).close()
+        entrySize = os.path.getsize(self.cache._path(keys[1]))
+        self.cache.maxSize = entrySize * 2
+        self.cache.evict(keep=keys[3])
+        # The least recently used ones are removed first
+        assert self.cache.get(keys[1]) is None
+        assert self.cache.get(keys[2]) is None
+        assert self.cache.stats()["entries"] == 2
+        self.cache.maxSize = 0
+        self.cache.evict(keep=keys[3])
+        assert self.cache.stats()["entries"] == 1
+        self.cache.clear()
+        assert self.cache.stats()["entries"] == 0
+
+    def testRegistry(self):
+        cache = diffCache(self.folder, 100)
+        assert diffCache(self.folder, 200) is cache
+        assert cache.maxSize == 200
+
+
+if __name__ == "__main__":
+    unittest.main()
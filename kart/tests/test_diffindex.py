@@ -0,0 +1,81 @@
+import gc
+import os
+import time
+import unittest
+
+from kart.diffindex import ChangeIndex, indexChanges, splitFeatureId
+from kart.tests.utils import feature
+
+# Timing tests are only run when KART_BENCHMARK is set, since their results
+# depend on the machine and its load
+BENCHMARK = bool(os.environ.get("KART_BENCHMARK"))
+
+
+def changes(n):
+    features = []
+    for i in range(n):
+        kind = i % 3
+        if kind == 0:
+            features.append(feature(f"I::{i}"))
+        elif kind == 1:
+            features.append(feature(f"U-::{i}", "old"))
+            features.append(feature(f"U+::{i}", "new"))
+        else:
+            features.append(feature(f"D::{i}"))
+    return features
+
+
+class TestChangeIndex(unittest.TestCase):
+    def testSplitFeatureId(self):
+        assert splitFeatureId("U-::12") == ("U-", "12")
+        assert splitFeatureId("I::a::b") == ("I", "a::b")
+
+    def testPairing(self):
+        index = ChangeIndex(changes(6))
+        assert len(index) == 6
+        assert index.fids("I") == ["0", "3"]
+        assert index.fids("U") == ["1", "4"]
+        assert index.fids("D") == ["2", "5"]
+        changetype, old, new = index.get("4")
+        assert changetype == "U"
+        assert old["properties"]["value"] == "old"
+        assert new["properties"]["value"] == "new"
+        assert index.get("0")[1] == {}
+        assert index.get("2")[2] == {}
+        assert index.get("6") is None
+
+    def testUnorderedHalves(self):
+        index = ChangeIndex([feature("U+::1", "new"), feature("U-::1", "old")])
+        assert list(index.changes()) == [
+            ("U", "1", feature("U-::1", "old"), feature("U+::1", "new"))
+        ]
+
+    def testIndexChanges(self):
+        index = indexChanges({"a": changes(3), "b": []})
+        assert len(index["a"]) == 3
+        assert len(index["b"]) == 0
+
+    @unittest.skipUnless(BENCHMARK, "KART_BENCHMARK is not set")
+    def testScaling(self):
+        size = 250000
+        timings = []
+        for n in [size, size * 4]:
+            features = changes(n)
+            best = None
+            for i in range(3):
+                gc.disable()
+                try:
+                    start = time.perf_counter()
+                    index = ChangeIndex(features)
+                    elapsed = time.perf_counter() - start
+                finally:
+                    gc.enable()
+                best = elapsed if best is None else min(best, elapsed)
+            timings.append(best)
+            assert len(index) == n
+        # Linear growth would be a ratio of 4, quadratic growth 16
+        assert timings[1] / timings[0] < 8
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import unittest
+
+from kart.diffindex import indexChanges
+from kart.diffstore import DiffStore
+from kart.tests.utils import feature
+
+FEATURES = [
+    feature("U-::1", "old"),
+    feature("U+::1", "new"),
+    feature("I::2", "added"),
+    feature("D::3", "removed"),
+]
+
+
+class TestDiffStore(unittest.TestCase):
+    def setUp(self):
+        self.store = DiffStore()
+        changes = [("layer", f) for f in FEATURES]
+        changes.append(("table", feature("I::1")))
+        self.store.addAll(changes)
+
+    def tearDown(self):
+        self.store.close()
+
+    def testMapping(self):
+        assert list(self.store) == ["layer", "table"]
+        assert len(self.store) == 2
+        assert "layer" in self.store
+        assert self.store.get("missing") is None
+        features = self.store["layer"]
+        assert len(features) == 4
+        assert list(features) == FEATURES
+        assert features == FEATURES
+        assert features[0] == FEATURES[0]
+        assert features[-1] == FEATURES[-1]
+
+    def testChangeIndex(self):
+        index = indexChanges(self.store)["layer"]
+        assert len(index) == 3
+        assert index.count("U") == 1
+        assert index.fids("I") == ["2"]
+        changetype, old, new = index.get("1")
+        assert changetype == "U"
+        assert old == FEATURES[0]
+        assert new == FEATURES[1]
+        assert index.get("3") == ("D", FEATURES[3], {})
+        assert index.get("4") is None
+        assert [c[1] for c in index.changes()] == ["2", "1", "3"]
+
+    def testLargeDiff(self):
+        store = DiffStore()
+        features = [feature(f"I::{i}") for i in range(5000)]
+        store.addAll(("layer", f) for f in features)
+        index = store.changeIndex("layer")
+        assert len(index) == 5000
+        assert [c[1] for c in index.changes("I")] == [str(i) for i in range(5000)]
+        store.close()
+
+    def testTemporaryFileRemoved(self):
+        store = DiffStore()
+        path = store.path
+        assert os.path.exists(path)
+        store.close()
+        assert not os.path.exists(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from kart.graph import GraphLayout, maxColumn
+
+
+def commit(oid, *parents):
+    return {"commit": oid, "parents": list(parents)}
+
+
+class TestGraphLayout(unittest.TestCase):
+    def testLinear(self):
+        commits = [commit("c", "b"), commit("b", "a"), commit("a")]
+        commits = GraphLayout().layout(commits)
+        assert [c["commitColumn"] for c in commits] == [0, 0, 0]
+        assert commits[0]["graph"] == {"top": [], "bottom": [[0, 0]]}
+        assert commits[1]["graph"] == {"top": [[0, 0]], "bottom": [[0, 0]]}
+        assert commits[2]["graph"] == {"top": [[0, 0]], "bottom": []}
+
+    def testMerge(self):
+        # d merges c into b, both coming from a
+        commits = GraphLayout().layout(
+            [
+                commit("d", "b", "c"),
+                commit("c", "a"),
+                commit("b", "a"),
+                commit("a"),
+            ]
+        )
+        assert [c["commitColumn"] for c in commits] == [0, 1, 0, 0]
+        assert commits[0]["graph"]["bottom"] == [[0, 0], [0, 1]]
+        for c in commits[1:3]:
+            assert c["graph"] == {"top": [[0, 0], [1, 1]], "bottom": [[0, 0], [1, 1]]}
+        # Both lanes converge into the common parent
+        assert commits[3]["graph"] == {"top": [[0, 0], [1, 0]], "bottom": []}
+        assert maxColumn(commits) == 1
+
+    def testConnectedRows(self):
+        commits = GraphLayout().layout(
+            [
+                commit("f", "e", "d"),
+                commit("e", "c"),
+                commit("d", "c", "b"),
+                commit("c", "a"),
+                commit("b", "a"),
+                commit("a"),
+            ]
+        )
+        for upper, lower in zip(commits, commits[1:]):
+            ends = sorted(end for start, end in upper["graph"]["bottom"])
+            starts = sorted(start for start, end in lower["graph"]["top"])
+            assert sorted(set(ends)) == sorted(set(starts))
+
+    def testIncremental(self):
+        commits = [
+            commit("d", "b", "c"),
+            commit("c", "a"),
+            commit("b", "a"),
+            commit("a"),
+        ]
+        expected = GraphLayout().layout([dict(c) for c in commits])
+        layout = GraphLayout()
+        paged = layout.layout([dict(c) for c in commits[:2]])
+        paged += layout.layout([dict(c) for c in commits[2:]])
+        assert paged == expected
+
+    def testSimplify(self):
+        # Parents of a filtered log might not be part of it
+        commits = [commit("d", "c"), commit("b", "a")]
+        assert [c["commitColumn"] for c in GraphLayout().layout(commits)] == [0, 1]
+        commits = [commit("d", "c"), commit("b", "a")]
+        commits = GraphLayout(simplify=True).layout(commits)
+        assert [c["commitColumn"] for c in commits] == [0, 0]
+        assert commits[1]["graph"]["top"] == [[0, 0]]
+
+
+if __name__ == "__main__":
+    unittest.main()
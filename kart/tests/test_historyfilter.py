@@ -0,0 +1,62 @@
+import datetime
+import unittest
+
+from kart.historyfilter import HistoryFilterIndex
+
+
+def commit(i, message, author, time):
+    return {
+        "commit": f"{i:040x}",
+        "message": message,
+        "authorName": author,
+        "authorTime": time,
+    }
+
+
+COMMITS = [
+    commit(0xABC, "Deleted feature", "Alice", "2021-06-14T08:33:21Z"),
+    commit(2, "Modified feature", "Bob", "2021-06-10T23:30:00+02:00"),
+    commit(3, "Modified geometry", "alice", "2021-05-01T10:00:00Z"),
+    commit(4, "Added testlayer", "Bob", "2020-12-31T12:00:00Z"),
+]
+
+
+class TestHistoryFilterIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = HistoryFilterIndex()
+        self.index.add(COMMITS[:2])
+        self.index.add(COMMITS[2:])
+
+    def testNoFilter(self):
+        assert self.index.matches() == [0, 1, 2, 3]
+
+    def testText(self):
+        assert self.index.matches("modified") == [1, 2]
+        assert self.index.matches("ALICE") == [0, 2]
+        assert self.index.matches("abc") == [0]
+        assert self.index.matches("al") == [0, 2]
+        assert self.index.matches("feature modified") == []
+        assert self.index.matches("nothing") == []
+
+    def testDates(self):
+        date = datetime.date
+        assert self.index.matches(startDate=date(2021, 6, 10)) == [0, 1]
+        assert self.index.matches(endDate=date(2021, 5, 1)) == [2, 3]
+        matches = self.index.matches(
+            "bob", startDate=date(2021, 1, 1), endDate=date(2021, 6, 30)
+        )
+        assert matches == [1]
+
+    def testLargeIndex(self):
+        index = HistoryFilterIndex()
+        commits = [
+            commit(i, f"Commit number {i}", "Someone", "2021-01-01T00:00:00Z")
+            for i in range(20000)
+        ]
+        index.add(commits)
+        assert index.matches("number 19999") == [19999]
+        assert len(index.matches("number 1234")) == 11
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import json
+import os
+import tempfile
+import unittest
+
+from kart.jsonstream import (
+    JsonArrayParser,
+    JsonStreamError,
+    iterJsonArray,
+    iterJsonArrayFromFile,
+)
+
+
+def chunked(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+FEATURES = [
+    {
+        "type": "Feature",
+        "id": f"U-::{i}",
+        "geometry": {"type": "Point", "coordinates": [i, i + 0.5]},
+        "properties": {"fid": i, "name": 'quoted "[{name}]" \\ ' + str(i)},
+    }
+    for i in range(50)
+]
+
+
+class TestJsonStream(unittest.TestCase):
+    def testTopLevelArray(self):
+        commits = [{"commit": str(i), "parents": [str(i + 1)]} for i in range(20)]
+        text = json.dumps(commits)
+        for size in (1, 7, 64, len(text)):
+            assert list(iterJsonArray(chunked(text, size))) == commits
+
+    def testFeatureCollection(self):
+        fc = {"type": "FeatureCollection", "features": FEATURES}
+        text = json.dumps(fc, indent=2)
+        for size in (1, 13, 1024):
+            assert list(iterJsonArray(chunked(text, size), "features")) == FEATURES
+
+    def testKeyAfterOtherValues(self):
+        doc = {"type": "x", "meta": {"a": [1, {"b": "]"}]}, "n": 3, "features": [1]}
+        text = json.dumps(doc)
+        assert list(iterJsonArray(chunked(text, 3), "features")) == [1]
+
+    def testScalarItems(self):
+        values = [1, 2.5, "a,]", True, None, -3e5]
+        text = json.dumps(values)
+        assert list(iterJsonArray(chunked(text, 2))) == values
+
+    def testEscapedStrings(self):
+        values = ['a\\"]}', {"k": 'x\\\\"{[', "n": ["\\", '"']}, "\u00e9" * 1000]
+        text = json.dumps(values)
+        for size in (1, 2, 5):
+            assert list(iterJsonArray(chunked(text, size))) == values
+
+    def testEmpty(self):
+        assert list(iterJsonArray(["[", "]"])) == []
+        assert list(iterJsonArray(['{"features": []}'], "features")) == []
+
+    def testItemsReturnedAsSoonAsComplete(self):
+        parser = JsonArrayParser()
+        assert parser.feed('[{"a": 1}, {"b"') == [{"a": 1}]
+        assert parser.feed(": 2}") == [{"b": 2}]
+        assert not parser.done()
+        assert parser.feed("]") == []
+        assert parser.done()
+
+    def testIncomplete(self):
+        with self.assertRaises(JsonStreamError):
+            list(iterJsonArray(['[{"a": 1}']))
+
+    def testMissingKey(self):
+        with self.assertRaises(JsonStreamError):
+            list(iterJsonArray(['{"type": "FeatureCollection"}'], "features"))
+
+    def testFromFile(self):
+        fc = {"type": "FeatureCollection", "features": FEATURES}
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "diff.geojson")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(fc, f)
+            features = list(iterJsonArrayFromFile(path, "features", chunkSize=10))
+        assert features == FEATURES
+
+
+if __name__ == "__main__":
+    unittest.main()
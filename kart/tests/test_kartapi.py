@@ -12,6 +12,7 @@ from qgis.core import (
     QgsPointXY,
 )
 from qgis.testing import unittest, start_app
+from qgis.PyQt.QtCore import QCoreApplication
 
 from kart.kartapi import (
     kartVersionDetails,
@@ -20,13 +21,21 @@ from kart.kartapi import (
     Repository,
     readReposFromSettings,
     installedVersion,
+    executeKart,
+    kartExecutable,
+    KartException,
 )
-from kart.utils import setSetting, KARTPATH
+from kart.utils import setSetting, KARTPATH, KARTWORKERS
+from kart.workers import workerPool, closeWorkers
+from kart.tasks import isBusy, runExclusive, runInBackground
+from kart.graph import GraphLayout
+from kart.difflayers import diffLayers, diffLayersFile
 from kart.tests.utils import patch_iface
 
 start_app()
 
 testRepoPath = os.path.join(os.path.dirname(__file__), "data", "testrepo")
+fakeKartPath = os.path.join(os.path.dirname(__file__), "data", "fakekart")
 
 
 def createRepoCopy():
@@ -52,6 +61,8 @@ class TestKartapi(unittest.TestCase):
 
     def setUp(self):
         setSetting(KARTPATH, "")
+        setSetting(KARTWORKERS, False)
+        closeWorkers()
 
     def testErrorWrongKartPath(self):
         setSetting(KARTPATH, "wrongpath")
@@ -62,6 +73,42 @@ class TestKartapi(unittest.TestCase):
         version = installedVersion()
         assert version == "0.10.6"
 
+    def testWorkerMode(self):
+        setSetting(KARTPATH, fakeKartPath)
+        setSetting(KARTWORKERS, True)
+        assert executeKart(["echo", "hello"]).strip() == "hello"
+        assert workerPool(kartExecutable()).idleCount() == 1
+
+    def testWorkerModeFallback(self):
+        setSetting(KARTWORKERS, True)
+        version = installedVersion()
+        assert version == "0.10.6"
+        assert workerPool(kartExecutable()) is None
+
+    def testFeedbackWithLargeOutput(self):
+        setSetting(KARTPATH, fakeKartPath)
+        lines = []
+        output = executeKart(["progress", "50000"], feedback=lines.append)
+        assert len(output.splitlines()) == 50000
+        assert len(lines) == 50000
+
+    def testRunInBackground(self):
+        future = runInBackground(self.testRepo.currentBranch)
+        assert future.result() == self.testRepo.currentBranch()
+        assert future.done()
+
+    def testRunInBackgroundError(self):
+        future = runInBackground(self.testRepo.executeKart, ["wrongcommand"])
+        with self.assertRaises(KartException):
+            future.result()
+
+    def testExclusiveTask(self):
+        future = runExclusive(runInBackground(self.testRepo.currentBranch))
+        assert isBusy()
+        future.result()
+        QCoreApplication.processEvents()
+        assert not isBusy()
+
     def testStoreReposInSettings(self):
         repositories = repos()
         assert not bool(repositories)
@@ -123,6 +170,60 @@ class TestKartapi(unittest.TestCase):
         assert "Modified" in log[2]["message"]
         assert "Added" in log[3]["message"]
 
+    def testIterLog(self):
+        commits = self.testRepo.iterLog()
+        first = next(commits)
+        assert "Deleted" in first["message"]
+        assert len(list(commits)) == 4
+
+    def testLogPages(self):
+        log = self.testRepo.log()
+        layout = GraphLayout()
+        pages = self.testRepo.log(limit=3, layout=layout)
+        assert len(pages) == 3
+        pages += self.testRepo.log(limit=3, skip=3, layout=layout)
+        assert len(pages) == 5
+        assert [c["commit"] for c in pages] == [c["commit"] for c in log]
+        assert [c["graph"] for c in pages] == [c["graph"] for c in log]
+
+    def testLogForFeature(self):
+        feature = self.testRepo.diff("HEAD", "HEAD~1")["testlayer"][0]
+        fid = feature["id"].split(":")[-1]
+        log = self.testRepo.log(dataset="testlayer", featureid=fid)
+        assert log
+        assert "Deleted" in log[0]["message"]
+
+    def testFeatureHistory(self):
+        feature = self.testRepo.diff("HEAD", "HEAD~1")["testlayer"][0]
+        fid = feature["id"].split(":")[-1]
+        log = self.testRepo.log(dataset="testlayer", featureid=fid)
+        history = self.testRepo.featureHistory(log, "testlayer", fid)
+        for commit in log:
+            if commit["parents"]:
+                expected = self.testRepo.diff(
+                    commit["parents"][0], commit["commit"], "testlayer", fid
+                )
+                diff = history.get(commit["commit"])
+                assert diff == list(expected.get("testlayer", []))
+                assert diff
+            else:
+                assert history.get(commit["commit"]) is None
+
+    def testDiffLayers(self):
+        log = self.testRepo.log()
+        refa = log[0]["commit"]
+        refb = log[0]["parents"][0]
+        path, datasets = diffLayersFile(self.testRepo, refa, refb)
+        assert datasets == ["testlayer"]
+        layer = diffLayers(self.testRepo, refa, refb)[0]
+        assert layer.isValid()
+        assert layer.featureCount() == 1
+        feature = next(layer.getFeatures())
+        expected = self.testRepo.diff(refb, refa)["testlayer"][0]
+        assert feature["id"] == expected["id"]
+        # The file is reused for the same pair of commits
+        assert diffLayersFile(self.testRepo, refa, refb) == (path, datasets)
+
     def testLogForMissingDataset(self):
         log = self.testRepo.log(dataset="wronglayer")
         assert len(log) == 0
@@ -140,6 +241,11 @@ class TestKartapi(unittest.TestCase):
         assert len(features) == 2
         assert features[0]["geometry"] == features[1]["geometry"]
 
+    def testIterDiff(self):
+        changes = list(self.testRepo.iterDiff("HEAD~1", "HEAD~2", "testlayer"))
+        assert len(changes) == 2
+        assert all(dataset == "testlayer" for dataset, feature in changes)
+
     def testCreateAndDeleteBranch(self):
         self.testRepo.createBranch("mynewbranch")
         branches = self.testRepo.branches()
@@ -210,6 +316,12 @@ class TestKartapi(unittest.TestCase):
     def testWorkingCopyLayerCrs(self):
         assert "EPSG:4326" == self.testRepo.workingCopyLayerCrs("testlayer")
 
+    def testMetadata(self):
+        info = self.testRepo.datasetInfo("testlayer")
+        assert info["primaryKey"] == "fid"
+        assert info["geometryField"] is not None
+        assert self.testRepo.metadata() == self.testRepo.metadata("HEAD")
+
     def testDeleteDataset(self):
         folder, repo = createRepoCopy()
         ncommits = len(repo.log())
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+
+from kart.metadata import datasetInfo, metadataIndex, MetadataStore
+
+COMMIT = "a" * 40
+
+META = {
+    "testlayer": {
+        "title": "Test layer",
+        "schema.json": [
+            {"id": "1", "name": "fid", "dataType": "integer", "primaryKeyIndex": 0},
+            {
+                "id": "2",
+                "name": "geom",
+                "dataType": "geometry",
+                "geometryType": "POINT",
+                "geometryCRS": "EPSG:4326",
+            },
+            {"id": "3", "name": "name", "dataType": "text"},
+        ],
+        "crs/EPSG:4326.wkt": 'GEOGCS["WGS 84"]',
+    },
+    "testtable": {
+        "schema.json": [
+            {"id": "1", "name": "id", "dataType": "integer", "primaryKeyIndex": 0},
+            {"id": "2", "name": "value", "dataType": "float"},
+        ]
+    },
+}
+
+
+class TestMetadata(unittest.TestCase):
+    def testDatasetInfo(self):
+        info = datasetInfo(META["testlayer"])
+        assert info["primaryKey"] == "fid"
+        assert info["crs"] == "EPSG:4326"
+        assert info["geometryField"] == "geom"
+        assert info["geometryType"] == "POINT"
+        assert [f["name"] for f in info["fields"]] == ["fid", "geom", "name"]
+
+    def testTable(self):
+        info = datasetInfo(META["testtable"])
+        assert info["primaryKey"] == "id"
+        assert info["crs"] is None
+        assert info["geometryField"] is None
+
+    def testStore(self):
+        with tempfile.TemporaryDirectory() as folder:
+            index = metadataIndex(META)
+            store = MetadataStore(folder)
+            assert store.get(COMMIT) is None
+            store.set(COMMIT, index)
+            assert os.path.exists(os.path.join(folder, f"{COMMIT}.json"))
+            assert store.get(COMMIT) == index
+            # A new store reads the index persisted by the previous one
+            assert MetadataStore(folder).get(COMMIT) == index
+
+    def testGetReturnsCopy(self):
+        with tempfile.TemporaryDirectory() as folder:
+            store = MetadataStore(folder)
+            store.set(COMMIT, metadataIndex(META))
+            store.get(COMMIT)["testlayer"]["crs"] = None
+            assert store.get(COMMIT)["testlayer"]["crs"] == "EPSG:4326"
+
+    def testEviction(self):
+        with tempfile.TemporaryDirectory() as folder:
+            store = MetadataStore(folder, maxFiles=2)
+            for i, commit in enumerate(["a" * 40, "b" * 40, "c" * 40]):
+                store.set(commit, metadataIndex(META))
+                # Make sure modification times are ordered
+                path = os.path.join(folder, f"{commit}.json")
+                os.utime(path, (i, i))
+            store.evict()
+            assert sorted(os.listdir(folder)) == [
+                f"{'b' * 40}.json",
+                f"{'c' * 40}.json",
+            ]
+
+    def testCorruptedFile(self):
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, f"{COMMIT}.json"), "w") as f:
+                f.write('{"testlayer": ')
+            assert MetadataStore(folder).get(COMMIT) is None
+
+
+if __name__ == "__main__":
+    unittest.main()
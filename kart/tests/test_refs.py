@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from kart import refs
+
+testRepoPath = os.path.join(os.path.dirname(__file__), "data", "testrepo")
+
+OID_A = "a" * 40
+OID_B = "b" * 40
+OID_C = "c" * 40
+
+
+class TestRefs(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = self.folder.name
+        os.makedirs(os.path.join(self.path, ".kart", "refs", "heads", "feature"))
+        os.makedirs(os.path.join(self.path, ".kart", "refs", "tags"))
+        self.write("HEAD", "ref: refs/heads/main\n")
+        self.write("refs/heads/main", OID_A + "\n")
+        self.write("refs/heads/feature/one", OID_B + "\n")
+        self.write(
+            "packed-refs",
+            "# pack-refs with: peeled fully-peeled sorted \n"
+            f"{OID_C} refs/heads/packed\n"
+            f"{OID_C} refs/heads/main\n"
+            f"{OID_B} refs/tags/v1\n"
+            f"^{OID_A}\n",
+        )
+        self.write("refs/tags/v2", OID_A + "\n")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def write(self, name, content):
+        with open(os.path.join(self.path, ".kart", *name.split("/")), "w") as f:
+            f.write(content)
+
+    def testBranches(self):
+        assert refs.branches(self.path) == ["feature/one", "main", "packed"]
+
+    def testTags(self):
+        assert refs.tags(self.path) == ["v1", "v2"]
+
+    def testCurrentBranch(self):
+        assert refs.currentBranch(self.path) == "main"
+
+    def testDetachedHead(self):
+        self.write("HEAD", OID_B + "\n")
+        assert refs.currentBranch(self.path) is None
+        assert refs.resolve(self.path) == OID_B
+
+    def testUnbornBranch(self):
+        self.write("HEAD", "ref: refs/heads/newbranch\n")
+        assert refs.currentBranch(self.path) is None
+
+    def testResolve(self):
+        # Loose refs take precedence over packed ones
+        assert refs.resolve(self.path) == OID_A
+        assert refs.resolve(self.path, "main") == OID_A
+        assert refs.resolve(self.path, "packed") == OID_C
+        assert refs.resolve(self.path, "refs/heads/feature/one") == OID_B
+        assert refs.resolve(self.path, OID_C) == OID_C
+        assert refs.resolve(self.path, "v1") is None
+        assert refs.resolve(self.path, "HEAD~1") is None
+
+    def testNotARepository(self):
+        shutil.rmtree(os.path.join(self.path, ".kart"))
+        assert refs.branches(self.path) is None
+        assert refs.currentBranch(self.path) is None
+        assert refs.resolve(self.path) is None
+
+    def testTestRepo(self):
+        assert refs.branches(testRepoPath) == ["anotherbranch", "main"]
+        assert refs.currentBranch(testRepoPath) == "main"
+        assert refs.isOid(refs.resolve(testRepoPath))
+
+
+if __name__ == "__main__":
+    unittest.main()
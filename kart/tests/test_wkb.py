@@ -0,0 +1,56 @@
+import math
+import struct
+import unittest
+
+from kart.wkb import geojsonToWkb, WkbError
+
+
+class TestWkb(unittest.TestCase):
+    def testPoint(self):
+        wkb = geojsonToWkb({"type": "Point", "coordinates": [1, 2]})
+        assert wkb.hex().upper() == "0101000000000000000000F03F0000000000000040"
+
+    def testPointZ(self):
+        wkb = geojsonToWkb({"type": "Point", "coordinates": [1, 2, 3]})
+        assert struct.unpack("<BI3d", wkb) == (1, 1001, 1.0, 2.0, 3.0)
+
+    def testEmptyPoint(self):
+        wkb = geojsonToWkb({"type": "Point", "coordinates": []})
+        values = struct.unpack("<BI2d", wkb)
+        assert values[:2] == (1, 1)
+        assert all(math.isnan(v) for v in values[2:])
+
+    def testLineString(self):
+        wkb = geojsonToWkb({"type": "LineString", "coordinates": [[0, 0], [1, 1]]})
+        assert struct.unpack("<BII4d", wkb) == (1, 2, 2, 0.0, 0.0, 1.0, 1.0)
+
+    def testPolygon(self):
+        ring = [[0, 0], [1, 0], [1, 1], [0, 0]]
+        wkb = geojsonToWkb({"type": "Polygon", "coordinates": [ring]})
+        values = struct.unpack("<BIII8d", wkb)
+        assert values[:4] == (1, 3, 1, 4)
+        assert values[4:] == (0.0, 0.0, 1.0, 0.0, 1.0, 1.0, 0.0, 0.0)
+
+    def testMultiPolygon(self):
+        ring = [[0, 0], [1, 0], [1, 1], [0, 0]]
+        geometry = {"type": "MultiPolygon", "coordinates": [[ring], [ring]]}
+        wkb = geojsonToWkb(geometry)
+        assert struct.unpack("<BII", wkb[:9]) == (1, 6, 2)
+        polygon = geojsonToWkb({"type": "Polygon", "coordinates": [ring]})
+        assert wkb[9:] == polygon * 2
+
+    def testGeometryCollection(self):
+        point = {"type": "Point", "coordinates": [1, 2, 3]}
+        line = {"type": "LineString", "coordinates": [[0, 0, 0], [1, 1, 1]]}
+        geometry = {"type": "GeometryCollection", "geometries": [point, line]}
+        wkb = geojsonToWkb(geometry)
+        assert struct.unpack("<BII", wkb[:9]) == (1, 1007, 2)
+        assert wkb[9:] == geojsonToWkb(point) + geojsonToWkb(line)
+
+    def testUnsupported(self):
+        with self.assertRaises(WkbError):
+            geojsonToWkb({"type": "Circle", "coordinates": [0, 0]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import unittest
+
+from kart.workers import (
+    KartWorker,
+    KartWorkerPool,
+    KartWorkerCommandError,
+    KartWorkerNotSupportedError,
+    KartWorkerTimeoutError,
+    workerPool,
+    disableWorkers,
+    closeWorkers,
+)
+
+fakeKart = os.path.join(os.path.dirname(__file__), "data", "fakekart", "kart")
+
+
+class TestWorkers(unittest.TestCase):
+    def setUp(self):
+        self.pool = KartWorkerPool(fakeKart)
+
+    def tearDown(self):
+        self.pool.close()
+        closeWorkers()
+
+    def testExecute(self):
+        returncode, stdout, stderr = self.pool.execute(["--version"])
+        assert returncode == 0
+        assert stdout.startswith("Kart v")
+
+    def testErrorReturnCode(self):
+        returncode, stdout, stderr = self.pool.execute(["fail", "Wrong command"])
+        assert returncode == 1
+        assert "Wrong command" in stderr
+
+    def testWorkerIsReused(self):
+        pid = self.pool.execute(["pid"])[1]
+        assert self.pool.idleCount() == 1
+        assert self.pool.execute(["pid"])[1] == pid
+
+    def testWorkersArePerRepository(self):
+        folder = os.path.dirname(__file__)
+        pid = self.pool.execute(["pid"])[1]
+        assert self.pool.execute(["pid"], folder)[1] != pid
+        assert self.pool.idleCount() == 1
+        assert self.pool.idleCount(folder) == 1
+
+    def testDeadWorkerIsReplaced(self):
+        pid = self.pool.execute(["pid"])[1]
+        worker = self.pool._idle[None][0]
+        worker.proc.kill()
+        worker.proc.wait()
+        assert self.pool.execute(["pid"])[1] != pid
+
+    def testHungWorkerIsKilled(self):
+        self.pool.execute(["pid"])
+        worker = self.pool._idle[None][0]
+        with self.assertRaises(KartWorkerTimeoutError):
+            self.pool.execute(["sleep", "30"], timeout=0.5)
+        assert not worker.isAlive()
+        assert self.pool.idleCount() == 0
+
+    def testNoTimeoutByDefault(self):
+        returncode, stdout, stderr = self.pool.execute(["sleep", "0.5"])
+        assert returncode == 0
+
+    def testWorkerExitsDuringCommand(self):
+        # The command might have run, so it's not reported as a plain
+        # KartWorkerError that would make it run again
+        with self.assertRaises(KartWorkerCommandError):
+            self.pool.execute(["exit"])
+
+    def testNotSupported(self):
+        os.environ["FAKE_KART_NO_WORKER"] = "1"
+        try:
+            with self.assertRaises(KartWorkerNotSupportedError):
+                KartWorker(fakeKart)
+        finally:
+            del os.environ["FAKE_KART_NO_WORKER"]
+
+    def testDisableWorkers(self):
+        assert workerPool(fakeKart) is workerPool(fakeKart)
+        disableWorkers(fakeKart)
+        assert workerPool(fakeKart) is None
+        closeWorkers()
+        assert workerPool(fakeKart) is not None
+
+
+if __name__ == "__main__":
+    unittest.main()
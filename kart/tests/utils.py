@@ -1,5 +1,9 @@
-from kart import utils
-
-
 def patch_iface():
+    # Imported here, so tests that don't need QGIS can use the other helpers
+    from kart import utils
+
     utils.iface.messageTimeout.return_value = 5
+
+
+def feature(featureId, value=None):
+    return {"id": featureId, "geometry": None, "properties": {"value": value}}
@@ -2,7 +2,7 @@ import os
 
 from qgis.PyQt.QtCore import Qt, QCoreApplication, QSettings
 from qgis.PyQt.QtWidgets import QProgressBar, QLabel
-from qgis.core import QgsProject, Qgis
+from qgis.core import QgsApplication, QgsProject, Qgis
 from qgis.utils import iface as qgisiface
 from qgis.testing.mocked import get_iface
 
@@ -62,8 +62,17 @@ NAMESPACE = "kart"
 KARTPATH = "KartPath"
 AUTOCOMMIT = "AutoCommit"
 DIFFSTYLES = "DiffStyles"
+KARTWORKERS = "KartWorkers"
+DIFFCACHEFOLDER = "DiffCacheFolder"
+DIFFCACHESIZE = "DiffCacheSize"
+DIFFLAYERSCACHESIZE = "DiffLayersCacheSize"
 
-setting_types = {AUTOCOMMIT: bool}
+setting_types = {
+    AUTOCOMMIT: bool,
+    KARTWORKERS: bool,
+    DIFFCACHESIZE: int,
+    DIFFLAYERSCACHESIZE: int,
+}
 
 
 def setSetting(name, value):
@@ -74,5 +83,17 @@ def setting(name):
     v = QSettings().value(f"{NAMESPACE}/{name}", None)
     if setting_types.get(name, str) == bool:
         return str(v).lower() == str(True).lower()
+    elif setting_types.get(name, str) == int:
+        try:
+            return int(v)
+        except (TypeError, ValueError):
+            return None
     else:
         return v
+
+
+def cacheFolder(name=None):
+    folder = os.path.join(QgsApplication.qgisSettingsDirPath(), "kart", "cache")
+    if name is not None:
+        folder = os.path.join(folder, name)
+    return folder
@@ -0,0 +1,114 @@
+import struct
+
+# Conversion of GeoJSON geometries to ISO WKB, which QGIS can read directly,
+# avoiding the round trip through a JSON string and QgsJsonUtils.
+
+WKB_TYPES = {
+    "Point": 1,
+    "LineString": 2,
+    "Polygon": 3,
+    "MultiPoint": 4,
+    "MultiLineString": 5,
+    "MultiPolygon": 6,
+    "GeometryCollection": 7,
+}
+
+# Nesting depth of the coordinates of each geometry type
+DEPTHS = {
+    "Point": 0,
+    "LineString": 1,
+    "Polygon": 2,
+    "MultiPoint": 1,
+    "MultiLineString": 2,
+    "MultiPolygon": 3,
+}
+
+NAN = float("nan")
+
+
+class WkbError(ValueError):
+    pass
+
+
+def _dimension(geometry):
+    # Number of values per position, taken from the first one found
+    if geometry["type"] == "GeometryCollection":
+        for child in geometry["geometries"]:
+            dimension = _dimension(child)
+            if dimension:
+                return dimension
+        return 0
+    coords = geometry["coordinates"]
+    depth = DEPTHS.get(geometry.get("type"))
+    if depth is None:
+        raise WkbError(f"Unsupported geometry type: {geometry.get('type')}")
+    for i in range(depth):
+        if not coords:
+            return 0
+        coords = coords[0]
+    return len(coords)
+
+
+def _header(geometryType, dimension):
+    code = WKB_TYPES[geometryType]
+    if dimension == 3:
+        code += 1000
+    elif dimension >= 4:
+        code += 3000
+    return struct.pack("<BI", 1, code)
+
+
+def _position(coords, dimension):
+    if not coords:
+        # Empty point
+        return struct.pack(f"<{dimension}d", *([NAN] * dimension))
+    values = list(coords[:dimension])
+    values.extend([0.0] * (dimension - len(values)))
+    return struct.pack(f"<{dimension}d", *values)
+
+
+def _positions(coords, dimension):
+    pack = struct.Struct(f"<{dimension}d").pack
+    parts = [struct.pack("<I", len(coords))]
+    for position in coords:
+        if len(position) != dimension:
+            position = list(position[:dimension])
+            position.extend([0.0] * (dimension - len(position)))
+        parts.append(pack(*position))
+    return b"".join(parts)
+
+
+def _rings(rings, dimension):
+    parts = [struct.pack("<I", len(rings))]
+    parts.extend(_positions(ring, dimension) for ring in rings)
+    return b"".join(parts)
+
+
+def _toWkb(geometry, dimension):
+    geometryType = geometry.get("type")
+    if geometryType not in WKB_TYPES:
+        raise WkbError(f"Unsupported geometry type: {geometryType}")
+    header = _header(geometryType, dimension)
+    if geometryType == "GeometryCollection":
+        children = geometry["geometries"]
+        parts = [header, struct.pack("<I", len(children))]
+        parts.extend(_toWkb(child, dimension) for child in children)
+        return b"".join(parts)
+    coords = geometry["coordinates"]
+    if geometryType == "Point":
+        return header + _position(coords, dimension)
+    elif geometryType == "LineString":
+        return header + _positions(coords, dimension)
+    elif geometryType == "Polygon":
+        return header + _rings(coords, dimension)
+    childType = geometryType[5:]
+    parts = [header, struct.pack("<I", len(coords))]
+    for childCoords in coords:
+        child = {"type": childType, "coordinates": childCoords}
+        parts.append(_toWkb(child, dimension))
+    return b"".join(parts)
+
+
+def geojsonToWkb(geometry):
+    dimension = max(2, min(_dimension(geometry), 4))
+    return _toWkb(geometry, dimension)
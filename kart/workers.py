@@ -0,0 +1,199 @@
+import json
+import os
+import queue
+import subprocess
+import threading
+
+# Long-lived Kart processes that accept commands over stdin, one JSON
+# request per line, and answer with one JSON response per line.
+
+WORKER_COMMAND = "worker"
+MAX_IDLE_WORKERS = 2
+# Seconds to wait for a new worker to be ready. Commands have no timeout unless
+# the caller sets one, since some (like a pull) can legitimately run for long.
+STARTUP_TIMEOUT = 30
+
+
+class KartWorkerError(Exception):
+    # The command was not sent, so it can be run without a worker instead
+    pass
+
+
+class KartWorkerNotSupportedError(KartWorkerError):
+    pass
+
+
+class KartWorkerCommandError(KartWorkerError):
+    # The command was sent but its response wasn't received, so it might have
+    # run, and must not be run again
+    pass
+
+
+class KartWorkerTimeoutError(KartWorkerCommandError):
+    pass
+
+
+class KartWorker:
+    def __init__(self, executable, path=None, env=None):
+        self.path = path
+        try:
+            self.proc = subprocess.Popen(
+                [executable, WORKER_COMMAND],
+                shell=os.name == "nt",
+                env=env,
+                stdout=subprocess.PIPE,
+                stdin=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                universal_newlines=True,
+                encoding="utf-8",
+                cwd=path,
+            )
+        except OSError as e:
+            raise KartWorkerNotSupportedError(str(e))
+        # Lines are read in a separate thread, so waiting for them can time out
+        self._lines = queue.Queue()
+        self._reader = threading.Thread(target=self._readLines, daemon=True)
+        self._reader.start()
+        try:
+            line = self._readline(STARTUP_TIMEOUT)
+        except KartWorkerTimeoutError:
+            line = ""
+        try:
+            ready = json.loads(line).get("ready", False)
+        except (ValueError, AttributeError):
+            ready = False
+        if not ready:
+            self.close()
+            raise KartWorkerNotSupportedError(
+                "Kart executable does not support worker mode"
+            )
+
+    def _readLines(self):
+        try:
+            for line in self.proc.stdout:
+                self._lines.put(line)
+        except (OSError, ValueError):
+            pass
+        self._lines.put("")
+
+    def _readline(self, timeout=None):
+        try:
+            return self._lines.get(timeout=timeout)
+        except queue.Empty:
+            self.kill()
+            raise KartWorkerTimeoutError(
+                f"Kart worker did not answer in {timeout} seconds"
+            )
+
+    def execute(self, commands, timeout=None):
+        try:
+            self.proc.stdin.write(json.dumps({"args": commands}) + "\n")
+            self.proc.stdin.flush()
+        except (OSError, ValueError) as e:
+            raise KartWorkerError(str(e))
+        line = self._readline(timeout)
+        if not line:
+            raise KartWorkerCommandError("Kart worker exited unexpectedly")
+        try:
+            response = json.loads(line)
+            return response["returncode"], response["stdout"], response["stderr"]
+        except (ValueError, KeyError, TypeError):
+            raise KartWorkerCommandError(f"Invalid response from Kart worker: {line}")
+
+    def isAlive(self):
+        return self.proc.poll() is None
+
+    def kill(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+
+    def close(self):
+        if self.proc.poll() is None:
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=1)
+            except (OSError, subprocess.TimeoutExpired):
+                self.kill()
+
+
+class KartWorkerPool:
+    def __init__(self, executable, env=None, maxIdle=MAX_IDLE_WORKERS):
+        self.executable = executable
+        self.env = env
+        self.maxIdle = maxIdle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def execute(self, commands, path=None, timeout=None):
+        worker = self._acquire(path)
+        try:
+            result = worker.execute(commands, timeout)
+        except KartWorkerError:
+            worker.close()
+            raise
+        self._release(worker)
+        return result
+
+    def _acquire(self, path):
+        with self._lock:
+            idle = self._idle.get(path, [])
+            while idle:
+                worker = idle.pop()
+                if worker.isAlive():
+                    return worker
+                worker.close()
+        return KartWorker(self.executable, path, self.env)
+
+    def _release(self, worker):
+        with self._lock:
+            idle = self._idle.setdefault(worker.path, [])
+            if len(idle) < self.maxIdle:
+                idle.append(worker)
+                return
+        worker.close()
+
+    def idleCount(self, path=None):
+        with self._lock:
+            return len(self._idle.get(path, []))
+
+    def close(self):
+        with self._lock:
+            workers = [w for idle in self._idle.values() for w in idle]
+            self._idle = {}
+        for worker in workers:
+            worker.close()
+
+
+# Pools are shared by all repositories and keyed by executable path, so
+# changing the Kart folder in the settings starts a fresh set of workers.
+
+_pools = {}
+_unsupported = set()
+_poolsLock = threading.Lock()
+
+
+def workerPool(executable, env=None):
+    with _poolsLock:
+        if executable in _unsupported:
+            return None
+        if executable not in _pools:
+            _pools[executable] = KartWorkerPool(executable, env)
+        return _pools[executable]
+
+
+def disableWorkers(executable):
+    with _poolsLock:
+        _unsupported.add(executable)
+        pool = _pools.pop(executable, None)
+    if pool is not None:
+        pool.close()
+
+
+def closeWorkers():
+    with _poolsLock:
+        pools = list(_pools.values())
+        _pools.clear()
+        _unsupported.clear()
+    for pool in pools:
+        pool.close()